@@ -0,0 +1,47 @@
+"""Added is_ready flag for build tasks
+
+Revision ID: 3a1d7c5e9b42
+Revises: e4b4a298844b
+Create Date: 2023-11-02 12:41:08.315274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a1d7c5e9b42'
+down_revision = 'e4b4a298844b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'build_tasks',
+        sa.Column(
+            'is_ready',
+            sa.Boolean(),
+            server_default=sa.false(),
+            nullable=False,
+        ),
+    )
+    op.execute(
+        'UPDATE build_tasks SET is_ready = NOT EXISTS ('
+        'SELECT 1 FROM build_task_dependency '
+        'WHERE build_task_dependency.build_task_id = build_tasks.id)'
+    )
+    op.create_index(
+        'idx_build_tasks_is_ready_arch_status_ts',
+        'build_tasks',
+        ['is_ready', 'arch', 'status', 'ts'],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(
+        'idx_build_tasks_is_ready_arch_status_ts',
+        table_name='build_tasks',
+    )
+    op.drop_column('build_tasks', 'is_ready')
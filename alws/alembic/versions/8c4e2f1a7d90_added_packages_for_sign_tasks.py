@@ -0,0 +1,39 @@
+"""Added packages for sign tasks
+
+Revision ID: 8c4e2f1a7d90
+Revises: 3a1d7c5e9b42
+Create Date: 2023-11-09 15:22:47.104318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e2f1a7d90'
+down_revision = '3a1d7c5e9b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'sign_tasks',
+        sa.Column(
+            'packages',
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=True,
+        ),
+    )
+    op.create_index(
+        'idx_sign_tasks_status_ts',
+        'sign_tasks',
+        ['status', 'ts'],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('idx_sign_tasks_status_ts', table_name='sign_tasks')
+    op.drop_column('sign_tasks', 'packages')
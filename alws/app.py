@@ -5,13 +5,19 @@ import sentry_sdk
 from fastapi import FastAPI
 from starlette.middleware.exceptions import ExceptionMiddleware
 
-from alws import routers
+from alws import database, routers
 from alws.auth import AuthRoutes
 from alws.auth.backend import BearerBackend, CookieBackend
 from alws.auth.oauth.github import get_github_oauth_client
 from alws.auth.schemas import UserRead
 from alws.config import settings
+from alws.crud.build_node import (
+    start_build_tasks_pings_flush,
+    stop_build_tasks_pings_flush,
+)
 from alws.middlewares import handlers
+from alws.utils.beholder_client import close_beholder_session
+from alws.utils.pulp_client import close_pulp_session
 
 logging.basicConfig(level=settings.logging_level)
 
@@ -33,6 +39,11 @@ if settings.sentry_dsn:
 
 app = FastAPI()
 app.add_middleware(ExceptionMiddleware, handlers=handlers)
+app.add_event_handler('startup', start_build_tasks_pings_flush)
+app.add_event_handler('shutdown', stop_build_tasks_pings_flush)
+app.add_event_handler('shutdown', close_pulp_session)
+app.add_event_handler('shutdown', close_beholder_session)
+app.add_event_handler('shutdown', database.dispose_engines)
 
 for module in ROUTERS:
     for router_type in (
@@ -653,6 +653,7 @@ class BuildPlanner:
                 if not is_parallel:
                     for dep in arch_tasks:
                         build_task.dependencies.append(dep)
+                build_task.is_ready = not build_task.dependencies
                 if first_ref_dep is None:
                     first_ref_dep = build_task
                 arch_tasks.append(build_task)
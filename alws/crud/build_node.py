@@ -1,12 +1,14 @@
 import asyncio
 import datetime
 import logging
+import time
 import traceback
 import typing
 from collections import defaultdict
+from contextlib import asynccontextmanager
 
 import sqlalchemy
-from sqlalchemy import delete, insert, update
+from sqlalchemy import column, delete, insert, update, values
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -14,6 +16,8 @@ from sqlalchemy.orm import selectinload
 from alws import models
 from alws.config import settings
 from alws.constants import BuildTaskStatus, ErrataPackageStatus
+from alws.crud.sign_task import reset_sign_tasks_packages
+from alws.dependencies import get_db
 from alws.errors import (
     ArtifactChecksumError,
     ArtifactConversionError,
@@ -23,29 +27,46 @@ from alws.errors import (
 )
 from alws.schemas import build_node_schema
 from alws.schemas.build_node_schema import BuildDoneArtifact
+from alws.utils.asyncio_utils import limit_concurrency
+from alws.utils.long_poll import notify_task_available
 from alws.utils.modularity import IndexWrapper, RpmArtifact
 from alws.utils.multilib import MultilibProcessor
 from alws.utils.noarch import save_noarch_packages
 from alws.utils.parsing import clean_release, parse_rpm_nevra
 from alws.utils.pulp_client import PulpClient
+from alws.utils.pulp_utils import (
+    get_content_checksums_by_ids_async,
+    get_uuid_from_pulp_href,
+)
 from alws.utils.rpm_package import get_rpm_packages_info
 
+# Redis channel to notify waiting build nodes about ready tasks
+BUILD_TASKS_CHANNEL = "build_tasks:{arch}"
+# Last ping time of build tasks, buffered by this web worker
+# and flushed to the database in one bulk update
+PINGED_BUILD_TASKS: typing.Dict[int, datetime.datetime] = {}
+__pings_flush_task: typing.Optional[asyncio.Task] = None
+
 
 async def get_available_build_task(
     db: AsyncSession,
     request: build_node_schema.RequestTask,
 ) -> typing.Optional[models.BuildTask]:
     async with db.begin():
-        # TODO: here should be config value
+        # Pings can stay in web workers buffers for the flush interval,
+        # so tasks are expired only after it as well
         ts_expired = datetime.datetime.utcnow() - datetime.timedelta(
-            minutes=20
+            seconds=settings.build_task_ping_timeout
+            + settings.build_task_ping_flush_interval
         )
-        db_task = await db.execute(
-            select(models.BuildTask)
-            .where(~models.BuildTask.dependencies.any())
-            .with_for_update()
+        # Lock exactly one row and skip rows which are already locked
+        # by other pollers, so concurrent build nodes don't queue up
+        # on the same row locks
+        claimable_task_id = (
+            select(models.BuildTask.id)
             .filter(
                 sqlalchemy.and_(
+                    models.BuildTask.is_ready.is_(True),
                     models.BuildTask.status < BuildTaskStatus.COMPLETED,
                     models.BuildTask.arch.in_(request.supported_arches),
                     sqlalchemy.or_(
@@ -54,35 +75,51 @@ async def get_available_build_task(
                     ),
                 )
             )
-            .options(
-                selectinload(models.BuildTask.ref),
-                selectinload(models.BuildTask.build).selectinload(
-                    models.Build.repos
-                ),
-                selectinload(models.BuildTask.platform).selectinload(
-                    models.Platform.repos
-                ),
-                selectinload(models.BuildTask.build).selectinload(
-                    models.Build.owner
-                ),
-                selectinload(models.BuildTask.build)
-                .selectinload(models.Build.linked_builds)
-                .selectinload(models.Build.repos),
-                selectinload(models.BuildTask.build)
-                .selectinload(models.Build.platform_flavors)
-                .selectinload(models.PlatformFlavour.repos),
-                selectinload(models.BuildTask.artifacts),
-                selectinload(models.BuildTask.rpm_module),
-            )
             .order_by(models.BuildTask.id.asc())
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
         )
-        db_task = db_task.scalars().first()
-        if not db_task:
+        task_id = await db.execute(
+            update(models.BuildTask)
+            .where(models.BuildTask.id == claimable_task_id)
+            .values(
+                ts=datetime.datetime.utcnow(),
+                status=BuildTaskStatus.STARTED,
+            )
+            .returning(models.BuildTask.id)
+            .execution_options(synchronize_session=False)
+        )
+        task_id = task_id.scalars().first()
+        if not task_id:
             return
-        db_task.ts = datetime.datetime.utcnow()
-        db_task.status = BuildTaskStatus.STARTED
         await db.commit()
-    return db_task
+    # Heavy relationships are loaded only for the claimed task
+    db_task = await db.execute(
+        select(models.BuildTask)
+        .where(models.BuildTask.id == task_id)
+        .options(
+            selectinload(models.BuildTask.ref),
+            selectinload(models.BuildTask.build).selectinload(
+                models.Build.repos
+            ),
+            selectinload(models.BuildTask.platform).selectinload(
+                models.Platform.repos
+            ),
+            selectinload(models.BuildTask.build).selectinload(
+                models.Build.owner
+            ),
+            selectinload(models.BuildTask.build)
+            .selectinload(models.Build.linked_builds)
+            .selectinload(models.Build.repos),
+            selectinload(models.BuildTask.build)
+            .selectinload(models.Build.platform_flavors)
+            .selectinload(models.PlatformFlavour.repos),
+            selectinload(models.BuildTask.artifacts),
+            selectinload(models.BuildTask.rpm_module),
+        )
+    )
+    return db_task.scalars().first()
 
 
 def add_build_task_dependencies(
@@ -93,6 +130,53 @@ def add_build_task_dependencies(
     task.dependencies.append(last_task)
 
 
+async def update_build_tasks_readiness(
+    db: AsyncSession,
+    task_ids: typing.List[int],
+) -> typing.Set[str]:
+    """
+    Returns arches of the tasks which are ready to be built.
+    """
+    if not task_ids:
+        return set()
+    tasks = await db.execute(
+        update(models.BuildTask)
+        .where(models.BuildTask.id.in_(task_ids))
+        .values(is_ready=~models.BuildTask.dependencies.any())
+        .returning(models.BuildTask.arch, models.BuildTask.is_ready)
+        .execution_options(synchronize_session=False)
+    )
+    return {arch for arch, is_ready in tasks if is_ready}
+
+
+async def remove_build_tasks_dependencies(
+    db: AsyncSession,
+    dependency_ids: typing.List[int],
+) -> typing.Set[str]:
+    dependent_task_ids = await db.execute(
+        delete(models.BuildTaskDependency)
+        .where(
+            models.BuildTaskDependency.c.build_task_dependency.in_(
+                dependency_ids
+            ),
+        )
+        .returning(models.BuildTaskDependency.c.build_task_id)
+    )
+    return await update_build_tasks_readiness(
+        db, list(set(dependent_task_ids.scalars().all()))
+    )
+
+
+async def notify_build_tasks_ready(arches: typing.Iterable[str]):
+    """
+    Wakes up build nodes waiting for tasks of the arches,
+    must be called after the tasks are committed.
+    """
+    await notify_task_available(
+        *(BUILD_TASKS_CHANNEL.format(arch=arch) for arch in sorted(arches))
+    )
+
+
 async def get_failed_build_tasks_matrix(db: AsyncSession, build_id: int):
     build_tasks = await db.execute(
         select(models.BuildTask)
@@ -130,6 +214,7 @@ async def update_failed_build_items_in_parallel(
     async with db.begin():
         tasks_cache = await get_failed_build_tasks_matrix(db, build_id)
         tasks_indexes = list(tasks_cache.keys())
+        restarted_task_ids = []
         for task_index, index_dict in tasks_cache.items():
             current_idx = tasks_indexes.index(task_index)
             first_index_dep = None
@@ -158,6 +243,7 @@ async def update_failed_build_items_in_parallel(
                     task.built_srpm_url = None
                 task.status = BuildTaskStatus.IDLE
                 task.ts = None
+                restarted_task_ids.append(task.id)
                 if first_index_dep:
                     await db.run_sync(
                         add_build_task_dependencies, task, first_index_dep
@@ -177,7 +263,13 @@ async def update_failed_build_items_in_parallel(
                 # we shouldn't wait first task completion
                 if first_index_dep is None and not completed_index_tasks:
                     first_index_dep = task
+        await db.flush()
+        ready_arches = await update_build_tasks_readiness(
+            db, restarted_task_ids
+        )
+        await reset_sign_tasks_packages(db, build_id)
         await db.commit()
+    await notify_build_tasks_ready(ready_arches)
 
 
 async def update_failed_build_items(db: AsyncSession, build_id: int):
@@ -185,6 +277,7 @@ async def update_failed_build_items(db: AsyncSession, build_id: int):
         failed_tasks_matrix = await get_failed_build_tasks_matrix(db, build_id)
 
         last_task = None
+        restarted_task_ids = []
         for tasks_dicts in failed_tasks_matrix.values():
             failed_tasks = [
                 task
@@ -200,12 +293,19 @@ async def update_failed_build_items(db: AsyncSession, build_id: int):
                     task.built_srpm_url = None
                 task.status = BuildTaskStatus.IDLE
                 task.ts = None
+                restarted_task_ids.append(task.id)
                 if last_task is not None:
                     await db.run_sync(
                         add_build_task_dependencies, task, last_task
                     )
                 last_task = task
+        await db.flush()
+        ready_arches = await update_build_tasks_readiness(
+            db, restarted_task_ids
+        )
+        await reset_sign_tasks_packages(db, build_id)
         await db.commit()
+    await notify_build_tasks_ready(ready_arches)
 
 
 async def mark_build_tasks_as_cancelled(
@@ -273,12 +373,79 @@ async def create_build_log_repo(db: AsyncSession, task: models.BuildTask):
     await db.commit()
 
 
-async def ping_tasks(db: AsyncSession, task_list: typing.List[int]):
-    query = models.BuildTask.id.in_(task_list)
+def ping_tasks(task_list: typing.List[int]):
     now = datetime.datetime.utcnow()
-    async with db.begin():
-        await db.execute(update(models.BuildTask).where(query).values(ts=now))
-        await db.commit()
+    for task_id in task_list:
+        PINGED_BUILD_TASKS[task_id] = now
+
+
+async def flush_pinged_tasks(db: AsyncSession):
+    if not PINGED_BUILD_TASKS:
+        return
+    pings = list(PINGED_BUILD_TASKS.items())
+    PINGED_BUILD_TASKS.clear()
+    pinged_tasks = values(
+        column("id", sqlalchemy.Integer),
+        column("ts", sqlalchemy.DateTime),
+        name="pinged_tasks",
+    ).data(pings)
+    try:
+        async with db.begin():
+            # ts is never moved backwards, e.g. for tasks
+            # which are already waiting for build_done processing
+            await db.execute(
+                update(models.BuildTask)
+                .where(
+                    models.BuildTask.id == pinged_tasks.c.id,
+                    sqlalchemy.or_(
+                        models.BuildTask.ts.is_(None),
+                        models.BuildTask.ts < pinged_tasks.c.ts,
+                    ),
+                )
+                .values(ts=pinged_tasks.c.ts)
+                .execution_options(synchronize_session=False)
+            )
+    except BaseException:
+        # keep pings for the next flush unless newer ones arrived,
+        # including when the flush is cancelled on shutdown
+        for task_id, ts in pings:
+            PINGED_BUILD_TASKS.setdefault(task_id, ts)
+        raise
+
+
+async def flush_build_tasks_pings():
+    if not PINGED_BUILD_TASKS:
+        return
+    async with asynccontextmanager(get_db)() as db:
+        await flush_pinged_tasks(db)
+
+
+async def __flush_build_tasks_pings_periodically():
+    while True:
+        await asyncio.sleep(settings.build_task_ping_flush_interval)
+        try:
+            await flush_build_tasks_pings()
+        except Exception:
+            logging.exception("Cannot flush build tasks pings")
+
+
+async def start_build_tasks_pings_flush():
+    global __pings_flush_task
+    __pings_flush_task = asyncio.create_task(
+        __flush_build_tasks_pings_periodically()
+    )
+
+
+async def stop_build_tasks_pings_flush():
+    global __pings_flush_task
+    if __pings_flush_task is not None:
+        __pings_flush_task.cancel()
+        try:
+            await __pings_flush_task
+        except asyncio.CancelledError:
+            pass
+        __pings_flush_task = None
+    await flush_build_tasks_pings()
 
 
 async def get_build_task(db: AsyncSession, task_id: int) -> models.BuildTask:
@@ -306,6 +473,76 @@ def __verify_checksums(
         raise ArtifactChecksumError("\n".join(checksum_errors))
 
 
+async def __verify_entities(
+    pulp_client: PulpClient,
+    entities: typing.List[
+        typing.Tuple[str, str, build_node_schema.BuildDoneArtifact]
+    ],
+) -> typing.List[typing.Tuple[str, str, build_node_schema.BuildDoneArtifact]]:
+    # Checksums of created entities are taken from the Pulp DB
+    # in one query instead of a Pulp API request per entity
+    content_ids = [
+        get_uuid_from_pulp_href(href)
+        for href, sha256, _ in entities
+        if sha256 is None
+    ]
+    checksums = {}
+    if content_ids:
+        checksums = await get_content_checksums_by_ids_async(content_ids)
+    results = []
+    for href, sha256, artifact in entities:
+        if sha256 is None:
+            sha256 = checksums.get(get_uuid_from_pulp_href(href))
+        if sha256 is None:
+            info = await pulp_client.get_artifact(
+                href,
+                include_fields=["sha256"],
+            )
+            sha256 = info["sha256"]
+        results.append((href, sha256, artifact))
+    __verify_checksums(results)
+    return results
+
+
+async def __create_entities(
+    pulp_client: PulpClient,
+    artifacts: typing.List[build_node_schema.BuildDoneArtifact],
+) -> typing.List[typing.Tuple[str, str, build_node_schema.BuildDoneArtifact]]:
+    tasks = [
+        asyncio.ensure_future(coro)
+        for coro in limit_concurrency(
+            settings.build_done_artifacts_concurrency,
+            *(
+                pulp_client.create_entity(artifact, include_sha256=False)
+                for artifact in artifacts
+            ),
+        )
+    ]
+    unverified = dict(enumerate(tasks))
+    results = [None] * len(tasks)
+    try:
+        # Entities are verified as they are created, the ones completed
+        # while the previous batch was verified are checked together
+        for completed in asyncio.as_completed(tasks):
+            await completed
+            done = [i for i, task in unverified.items() if task.done()]
+            if not done:
+                continue
+            verified = await __verify_entities(
+                pulp_client,
+                [unverified.pop(i).result() for i in done],
+            )
+            for i, entity in zip(done, verified):
+                results[i] = entity
+    except BaseException:
+        # the first failed artifact fails the whole build task
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    return results
+
+
 async def get_srpm_artifact_by_build_task_id(
     db: AsyncSession,
     build_task_id: int,
@@ -320,17 +557,50 @@ async def get_srpm_artifact_by_build_task_id(
     return srpm_artifact.scalars().first()
 
 
-async def __process_rpms(
+async def __get_errata_packages_for_rpms(
     db: AsyncSession,
+    rpms_info: typing.Iterable[typing.Dict[str, typing.Any]],
+    module_index=None,
+) -> typing.DefaultDict[
+    typing.Tuple[str, str], typing.List[models.ErrataPackage]
+]:
+    name_versions = {(rpm["name"], rpm["version"]) for rpm in rpms_info}
+    errata_packages_by_key = defaultdict(list)
+    if not name_versions:
+        return errata_packages_by_key
+    query = (
+        select(models.ErrataPackage)
+        .where(
+            sqlalchemy.tuple_(
+                models.ErrataPackage.name,
+                models.ErrataPackage.version,
+            ).in_(name_versions)
+        )
+        .options(selectinload(models.ErrataPackage.albs_packages))
+    )
+    if module_index:
+        module = None
+        for mod in module_index.iter_modules():
+            if mod.name.endswith("-devel"):
+                continue
+            module = mod
+        build_task_module = f"{module.name}:{module.stream}"
+        query = query.join(models.ErrataRecord).filter(
+            models.ErrataRecord.module == build_task_module
+        )
+    for errata_package in (await db.execute(query)).scalars().all():
+        key = (errata_package.name, errata_package.version)
+        errata_packages_by_key[key].append(errata_package)
+    return errata_packages_by_key
+
+
+async def __convert_rpms(
     pulp_client: PulpClient,
-    task_id: int,
     task_arch: str,
     task_artifacts: list,
     repositories: list,
     built_srpm_url: str = None,
-    module_index=None,
-    task_excluded=False,
-):
+) -> typing.List[typing.Tuple[str, str, build_node_schema.BuildDoneArtifact]]:
     def get_repo(repo_arch, is_debug):
         return next(
             build_repo
@@ -340,64 +610,62 @@ async def __process_rpms(
             and build_repo.debug == is_debug
         )
 
-    rpms = []
     arch_repo = get_repo(task_arch, False)
     debug_repo = get_repo(task_arch, True)
     src_repo = get_repo("src", False)
-    arch_packages_tasks = []
-    src_packages_tasks = []
-    debug_packages_tasks = []
+    artifacts = []
     for artifact in task_artifacts:
+        if artifact.arch == "src" and built_srpm_url is not None:
+            continue
+        artifacts.append(artifact)
+    try:
+        processed_packages = await __create_entities(pulp_client, artifacts)
+    except ArtifactChecksumError:
+        raise
+    except Exception as e:
+        logging.exception("Cannot create RPM packages for %s", task_arch)
+        raise ArtifactConversionError(
+            f"Cannot put RPM packages into Pulp storage: {e}"
+        )
+
+    repo_hrefs = defaultdict(list)
+    for href, _, artifact in processed_packages:
         if artifact.arch == "src":
-            if built_srpm_url is None:
-                src_packages_tasks.append(pulp_client.create_entity(artifact))
+            repo = src_repo
         elif artifact.is_debuginfo:
-            debug_packages_tasks.append(pulp_client.create_entity(artifact))
+            repo = debug_repo
         else:
-            arch_packages_tasks.append(pulp_client.create_entity(artifact))
+            repo = arch_repo
+        repo_hrefs[repo].append(href)
+    # Modifications are applied on the Pulp transaction commit
+    for repo, hrefs in repo_hrefs.items():
+        await pulp_client.modify_repository(repo.pulp_href, add=hrefs)
+    return processed_packages
 
-    processed_packages = []
-    for tasks, repo in (
-        (src_packages_tasks, src_repo),
-        (arch_packages_tasks, arch_repo),
-        (debug_packages_tasks, debug_repo),
-    ):
-        if not tasks:
-            continue
-        try:
-            results = await asyncio.gather(*tasks)
-        except Exception as e:
-            logging.exception(
-                "Cannot create RPM packages for repo %s", str(repo)
-            )
-            raise ArtifactConversionError(
-                f"Cannot put RPM packages into Pulp storage: {e}"
-            )
-        processed_packages.extend(results)
-        hrefs = [item[0] for item in results]
-        __verify_checksums(processed_packages)
-        try:
-            await pulp_client.modify_repository(repo.pulp_href, add=hrefs)
-        except Exception:
-            logging.exception(
-                "Cannot add RPM packages to the repository: %s", str(repo)
-            )
-            raise RepositoryAddError(
-                f"Cannot add RPM packages to the repository {str(repo)}"
-            )
 
-    def append_errata_package(_, errata_package, artifact, rpm_info):
-        model = models.ErrataToALBSPackage(
-            status=ErrataPackageStatus.proposal,
-            name=rpm_info["name"],
-            version=rpm_info["version"],
-            release=rpm_info["release"],
-            epoch=int(rpm_info["epoch"]),
-            arch=rpm_info["arch"],
-        )
-        model.errata_package = errata_package
-        model.build_artifact = artifact
-        errata_package.albs_packages.append(model)
+async def __process_rpms(
+    db: AsyncSession,
+    task_id: int,
+    processed_packages: typing.List[
+        typing.Tuple[str, str, build_node_schema.BuildDoneArtifact]
+    ],
+    built_srpm_url: str = None,
+    module_index=None,
+    task_excluded=False,
+):
+    def append_errata_packages(_, matched_packages):
+        for errata_package, artifact, rpm_info in matched_packages:
+            model = models.ErrataToALBSPackage(
+                status=ErrataPackageStatus.proposal,
+                name=rpm_info["name"],
+                version=rpm_info["version"],
+                release=rpm_info["release"],
+                epoch=int(rpm_info["epoch"]),
+                arch=rpm_info["arch"],
+            )
+            model.errata_package = errata_package
+            model.build_artifact = artifact
+            errata_package.albs_packages.append(model)
 
     rpms = [
         models.BuildTaskArtifact(
@@ -409,7 +677,11 @@ async def __process_rpms(
         )
         for href, _, artifact in processed_packages
     ]
-    rpms_info = get_rpm_packages_info(rpms)
+    rpms_info = await get_rpm_packages_info(rpms)
+    errata_packages_by_key = await __get_errata_packages_for_rpms(
+        db, rpms_info.values(), module_index
+    )
+    matched_packages = []
     for build_task_artifact in rpms:
         rpm_info = rpms_info[build_task_artifact.href]
         if rpm_info["arch"] != "src":
@@ -417,29 +689,14 @@ async def __process_rpms(
         else:
             src_name = rpm_info["name"]
         clean_rpm_release = clean_release(rpm_info["release"])
-        conditions = [
-            models.ErrataPackage.name == rpm_info["name"],
-            models.ErrataPackage.version == rpm_info["version"],
-        ]
-        if rpm_info["arch"] != "noarch":
-            conditions.append(models.ErrataPackage.arch == rpm_info["arch"])
-
-        query = select(models.ErrataPackage).where(
-            sqlalchemy.and_(*conditions)
-        )
-
-        if module_index:
-            module = None
-            for mod in module_index.iter_modules():
-                if mod.name.endswith("-devel"):
-                    continue
-                module = mod
-            build_task_module = f"{module.name}:{module.stream}"
-            query = query.join(models.ErrataRecord).filter(
-                models.ErrataRecord.module == build_task_module
+        errata_packages = [
+            errata_package
+            for errata_package in errata_packages_by_key.get(
+                (rpm_info["name"], rpm_info["version"]), []
             )
-
-        errata_packages = (await db.execute(query)).scalars().all()
+            if rpm_info["arch"] == "noarch"
+            or errata_package.arch == rpm_info["arch"]
+        ]
 
         # We add ErrataToALBSPackage proposals for every matching package.
         # In case of an errata that involves a module, we only add those
@@ -448,12 +705,11 @@ async def __process_rpms(
             if clean_rpm_release != clean_release(errata_package.release):
                 continue
             errata_package.source_srpm = src_name
-            await db.run_sync(
-                append_errata_package,
-                errata_package,
-                build_task_artifact,
-                rpm_info,
+            matched_packages.append(
+                (errata_package, build_task_artifact, rpm_info)
             )
+    if matched_packages:
+        await db.run_sync(append_errata_packages, matched_packages)
 
     # we need to put source RPM in module as well, but it can be skipped
     # because it's built before
@@ -461,7 +717,7 @@ async def __process_rpms(
     if built_srpm_url is not None:
         db_srpm = await get_srpm_artifact_by_build_task_id(db, task_id)
         if db_srpm is not None:
-            srpms_info = get_rpm_packages_info([db_srpm])
+            srpms_info = await get_rpm_packages_info([db_srpm])
             module_artifacts.append(srpms_info[db_srpm.href])
     if module_index and module_artifacts:
         try:
@@ -486,19 +742,16 @@ async def __process_logs(
         logging.error("Log repository is absent, skipping logs processing")
         return
     logs = []
-    tasks = [
-        pulp_client.create_entity(artifact) for artifact in task_artifacts
-    ]
     try:
-        results = await asyncio.gather(*tasks)
+        results = await __create_entities(pulp_client, task_artifacts)
+    except ArtifactChecksumError:
+        raise
     except Exception as e:
         logging.exception("Cannot create log files for %s", str(repository))
         raise ArtifactConversionError(
             f"Cannot create log files for {str(repository)}, error: {str(e)}"
         )
 
-    __verify_checksums(results)
-
     hrefs = []
     for href, _, artifact in results:
         logs.append(
@@ -511,13 +764,8 @@ async def __process_logs(
             )
         )
         hrefs.append(href)
-    try:
-        await pulp_client.modify_repository(repository.pulp_href, add=hrefs)
-    except Exception as e:
-        logging.exception("Cannot add log files to the repository: %s", str(e))
-        raise RepositoryAddError(
-            "Cannot save build log into Pulp repository: %s", str(e)
-        )
+    # The modification is applied on the Pulp transaction commit
+    await pulp_client.modify_repository(repository.pulp_href, add=hrefs)
     return logs
 
 
@@ -633,31 +881,51 @@ async def __process_build_task_artifacts(
         message = "No source RPM was sent from build node"
         logging.error(message)
         raise SrpmProvisionError(message)
-    # Committing logs separately for UI to be able to fetch them
-    logging.info("Processing logs")
+
+    async def convert_logs():
+        start_time = datetime.datetime.utcnow()
+        logs = await __process_logs(
+            pulp_client, build_task.id, log_artifacts, log_repository
+        )
+        end_time = datetime.datetime.utcnow()
+        processing_stats["logs_processing"] = {
+            "start_ts": str(start_time),
+            "end_ts": str(end_time),
+            "delta": str(end_time - start_time),
+        }
+        logging.info("Logs conversion is finished")
+        return logs
+
+    async def convert_rpms():
+        if not rpm_artifacts:
+            return []
+        rpms = await __convert_rpms(
+            pulp_client,
+            build_task.arch,
+            rpm_artifacts,
+            rpm_repositories,
+            built_srpm_url=build_task.built_srpm_url,
+        )
+        logging.info("Packages conversion is finished")
+        return rpms
+
+    # Logs and packages are uploaded to Pulp concurrently, repository
+    # modifications are coalesced by the Pulp transaction from build_done
+    logging.info("Processing logs and packages")
     start_time = datetime.datetime.utcnow()
-    logs_entries = await __process_logs(
-        pulp_client, build_task.id, log_artifacts, log_repository
+    logs_entries, processed_packages = await asyncio.gather(
+        convert_logs(),
+        convert_rpms(),
     )
+    # Committing logs separately for UI to be able to fetch them
     if logs_entries:
         db.add_all(logs_entries)
         await db.flush()
-    end_time = datetime.datetime.utcnow()
-    processing_stats["logs_processing"] = {
-        "start_ts": str(start_time),
-        "end_ts": str(end_time),
-        "delta": str(end_time - start_time),
-    }
     logging.info("Logs processing is finished")
-    logging.info("Processing packages")
-    start_time = datetime.datetime.utcnow()
     rpm_entries = await __process_rpms(
         db,
-        pulp_client,
         build_task.id,
-        build_task.arch,
-        rpm_artifacts,
-        rpm_repositories,
+        processed_packages,
         built_srpm_url=build_task.built_srpm_url,
         module_index=module_index,
         task_excluded=status.value == BuildTaskStatus.EXCLUDED,
@@ -793,13 +1061,7 @@ async def __update_built_srpm_url(
             .values(status=BuildTaskStatus.FAILED, error=fast_fail_msg)
         )
         await db.execute(update_query)
-
-        remove_query = delete(models.BuildTaskDependency).where(
-            models.BuildTaskDependency.c.build_task_dependency.in_(
-                uncompleted_tasks_ids
-            ),
-        )
-        await db.execute(remove_query)
+        await remove_build_tasks_dependencies(db, uncompleted_tasks_ids)
         return
 
     # if SRPM built we need to download them
@@ -872,13 +1134,7 @@ async def fast_fail_other_tasks_by_ref(
         )
         .values(status=BuildTaskStatus.FAILED, error=fast_fail_msg)
     )
-    await db.execute(
-        delete(models.BuildTaskDependency).where(
-            models.BuildTaskDependency.c.build_task_dependency.in_(
-                uncompleted_tasks_ids
-            ),
-        )
-    )
+    await remove_build_tasks_dependencies(db, uncompleted_tasks_ids)
 
 
 async def safe_build_done(
@@ -898,6 +1154,15 @@ async def safe_build_done(
     try:
         async with db.begin(), pulp.begin():
             build_task, build_done_stats = await build_done(db, pulp, request)
+            # Pulp repositories are modified before the database commit,
+            # so a failed modification leaves the task uncompleted
+            try:
+                await pulp.commit()
+            except Exception as e:
+                logging.exception("Cannot modify Pulp repositories")
+                raise RepositoryAddError(
+                    f"Cannot add build artifacts to Pulp repositories: {e}"
+                ) from e
             await db.commit()
     except Exception:
         logging.exception("Build done failed:")
@@ -926,10 +1191,6 @@ async def safe_build_done(
             await __update_built_srpm_url(db, build_task, request)
             await db.commit()
     finally:
-        remove_dep_query = delete(models.BuildTaskDependency).where(
-            models.BuildTaskDependency.c.build_task_dependency
-            == request.task_id
-        )
         build_task_start_time = request.stats.get("build_node_task", {}).get(
             "start_ts"
         )
@@ -951,8 +1212,11 @@ async def safe_build_done(
                 statistics=build_task_stats,
             ),
         )
-        await db.execute(remove_dep_query)
+        ready_arches = await remove_build_tasks_dependencies(
+            db, [request.task_id]
+        )
         await db.commit()
+        await notify_build_tasks_ready(ready_arches)
     logging.info("Build task: %d, processing is finished", request.task_id)
     return success
 
@@ -980,6 +1244,8 @@ async def build_done(
         .where(models.BuildTask.id == request.task_id)
         .values(status=status)
     )
+    # artifacts of the build are changed
+    await reset_sign_tasks_packages(db, build_task.build_id)
 
     start_time = datetime.datetime.utcnow()
     binary_rpms = await save_noarch_packages(db, pulp, build_task)
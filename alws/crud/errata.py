@@ -1,12 +1,25 @@
 import asyncio
 import collections
 import datetime
+import hashlib
+import json
 import logging
 import re
 import uuid
 from contextlib import asynccontextmanager
-from typing import Any, Awaitable, DefaultDict, Dict, List, Optional, Tuple
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    DefaultDict,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
 
+import aioredis
 import createrepo_c as cr
 import jinja2
 from sqlalchemy import and_, or_, select, update
@@ -30,6 +43,8 @@ from alws.pulp_models import (
 )
 from alws.schemas import errata_schema
 from alws.schemas.errata_schema import BaseErrataRecord
+from alws.utils.asyncio_utils import gather_with_concurrency
+from alws.utils.cache import LRUCache
 from alws.utils.errata import (
     clean_errata_title,
     debrand_affected_cpe_list,
@@ -44,11 +59,12 @@ from alws.utils.errata import (
 from alws.utils.parsing import clean_release, parse_rpm_nevra
 from alws.utils.pulp_client import PulpClient
 from alws.utils.pulp_utils import (
-    get_rpm_module_packages_from_repository,
-    get_rpm_packages_by_ids,
-    get_rpm_packages_from_repository,
+    get_rpm_module_packages_from_repository_async,
+    get_rpm_packages_by_ids_async,
+    get_rpm_packages_from_repository_async,
     get_uuid_from_pulp_href,
 )
+from alws.utils.rpm_package import get_rpm_packages_metadata
 
 try:
     # FIXME: ovallib dependency should stay optional
@@ -107,283 +123,534 @@ class CriteriaNode:
         return False
 
 
-async def get_oval_xml(db: AsyncSession, platform_name: str):
-    platform = await db.execute(
-        select(models.Platform).where(models.Platform.name == platform_name)
+# Converted records are reused until their revision
+# is bumped by invalidate_oval_cache
+OVAL_RECORDS_CACHE = LRUCache(settings.oval_records_cache_size)
+OVAL_DOCUMENT_CHUNK_SIZE = 1024 * 1024
+OVAL_EPOCH_FIELD = "epoch"
+
+
+def get_oval_cache_keys(platform_id: int) -> Tuple[str, str]:
+    return (
+        f"errata:oval:{platform_id}:etag",
+        f"errata:oval:{platform_id}:revisions",
     )
-    platform: models.Platform = platform.scalars().first()
-    records = (
+
+
+def get_oval_document_key(platform_id: int, etag: str) -> str:
+    # documents are never overwritten, so they can be streamed
+    # while a newer one is saved
+    document_hash = etag.strip('"')
+    return f"errata:oval:{platform_id}:document:{document_hash}"
+
+
+async def invalidate_oval_cache(platform_id: int, record_ids: List[str]):
+    etag_key, revisions_key = get_oval_cache_keys(platform_id)
+    redis = aioredis.from_url(settings.redis_url)
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            for record_id in record_ids:
+                pipe.hincrby(revisions_key, record_id, 1)
+            pipe.delete(etag_key)
+            await pipe.execute()
+    except Exception:
+        logging.exception(
+            "Cannot invalidate OVAL cache for %s records",
+            record_ids,
+        )
+    finally:
+        await redis.close()
+
+
+async def invalidate_oval_records(records: Dict[int, List[str]]):
+    for platform_id, record_ids in records.items():
+        await invalidate_oval_cache(platform_id, record_ids)
+
+
+async def build_oval_xml(
+    db: AsyncSession,
+    platform: models.Platform,
+    revisions: Optional[Dict[str, int]],
+    epoch: Optional[str] = None,
+) -> str:
+    """
+    Converts errata records of the platform to OVAL document,
+    records are taken from OVAL_RECORDS_CACHE unless their revisions
+    are unknown (None), e.g. when Redis is unavailable.
+    The epoch identifies the revisions hash, so records cached
+    before the hash was lost in Redis aren't reused.
+    """
+    records_ids = (
         (
             await db.execute(
-                select(models.ErrataRecord)
+                select(models.ErrataRecord.id)
                 .where(models.ErrataRecord.platform_id == platform.id)
-                .options(
-                    selectinload(models.ErrataRecord.packages)
-                    .selectinload(models.ErrataPackage.albs_packages)
-                    .selectinload(models.ErrataToALBSPackage.build_artifact)
-                    .selectinload(models.BuildTaskArtifact.build_task),
-                    selectinload(models.ErrataRecord.references).selectinload(
-                        models.ErrataReference.cve
-                    ),
-                )
+                .order_by(models.ErrataRecord.id)
             )
         )
         .scalars()
         .all()
     )
-    return errata_records_to_oval(records)
+    records_objects = {}
+    outdated_ids = []
+    for record_id in records_ids:
+        if revisions is None:
+            outdated_ids.append(record_id)
+            continue
+        revision = revisions.get(record_id, 0)
+        cached = OVAL_RECORDS_CACHE.get(
+            (platform.id, epoch, record_id),
+            validate=lambda entry: entry[0] == revision,
+        )
+        if cached is None:
+            outdated_ids.append(record_id)
+            continue
+        records_objects[record_id] = cached[1]
+    logging.info(
+        "Converting %d of %d %s errata records to OVAL",
+        len(outdated_ids),
+        len(records_ids),
+        platform.name,
+    )
+    if outdated_ids:
+        records = (
+            (
+                await db.execute(
+                    select(models.ErrataRecord)
+                    .where(models.ErrataRecord.id.in_(outdated_ids))
+                    .options(
+                        selectinload(models.ErrataRecord.packages)
+                        .selectinload(models.ErrataPackage.albs_packages)
+                        .selectinload(
+                            models.ErrataToALBSPackage.build_artifact
+                        )
+                        .selectinload(models.BuildTaskArtifact.build_task),
+                        selectinload(
+                            models.ErrataRecord.references
+                        ).selectinload(models.ErrataReference.cve),
+                    )
+                )
+            )
+            .scalars()
+            .all()
+        )
+        for record in records:
+            oval_objects = errata_record_to_oval_objects(record)
+            if revisions is not None:
+                OVAL_RECORDS_CACHE.put(
+                    (platform.id, epoch, record.id),
+                    (revisions.get(record.id, 0), oval_objects),
+                )
+            records_objects[record.id] = oval_objects
+    return compose_oval(
+        records_objects[record_id]
+        for record_id in records_ids
+        if record_id in records_objects
+    )
 
 
-def errata_records_to_oval(records: List[models.ErrataRecord]):
-    oval = Composer()
-    generator = Generator(
-        product_name="AlmaLinux OS Errata System",
-        product_version="0.0.1",
-        schema_version="5.10",
-        timestamp=datetime.datetime.utcnow(),
+def encode_oval_document(oval: str) -> Tuple[bytes, str]:
+    """
+    Returns the response body of OVAL document, which is served
+    as JSON string, and its ETag
+    """
+    content = json.dumps(oval, ensure_ascii=False).encode()
+    return content, f'"{hashlib.sha256(content).hexdigest()}"'
+
+
+async def iter_oval_document(content: bytes) -> AsyncIterator[bytes]:
+    yield content
+
+
+async def stream_cached_oval_document(
+    document_key: str,
+    length: int,
+) -> AsyncIterator[bytes]:
+    # the stream outlives the request dependencies,
+    # so it uses its own Redis connection
+    redis = aioredis.from_url(settings.redis_url)
+    try:
+        for start in range(0, length, OVAL_DOCUMENT_CHUNK_SIZE):
+            chunk = await redis.getrange(
+                document_key,
+                start,
+                start + OVAL_DOCUMENT_CHUNK_SIZE - 1,
+            )
+            if len(chunk) != min(OVAL_DOCUMENT_CHUNK_SIZE, length - start):
+                raise RuntimeError(
+                    f"{document_key} has expired while being streamed"
+                )
+            yield chunk
+    finally:
+        await redis.close()
+
+
+async def get_oval_xml(
+    db: AsyncSession,
+    platform_name: str,
+    redis: aioredis.Redis,
+    if_none_match: Optional[str] = None,
+) -> Tuple[Optional[AsyncIterator[bytes]], str]:
+    """
+    Returns chunks of OVAL document of the platform and its ETag.
+    The document is None when it matches the client's
+    If-None-Match header.
+    """
+    platform = await db.execute(
+        select(models.Platform).where(models.Platform.name == platform_name)
     )
-    oval.generator = generator
+    platform: models.Platform = platform.scalars().first()
+    try:
+        content, etag = await __get_cached_oval_xml(db, platform, redis)
+    except aioredis.RedisError:
+        logging.exception(
+            "Cannot use OVAL cache for %s, generating the document",
+            platform_name,
+        )
+        content, etag = encode_oval_document(
+            await build_oval_xml(db, platform, None)
+        )
+        content = iter_oval_document(content)
+    if if_none_match and etag in (
+        tag.strip() for tag in if_none_match.split(",")
+    ):
+        return None, etag
+    return content, etag
+
+
+async def __get_cached_oval_xml(
+    db: AsyncSession,
+    platform: models.Platform,
+    redis: aioredis.Redis,
+) -> Tuple[AsyncIterator[bytes], str]:
+    etag_key, revisions_key = get_oval_cache_keys(platform.id)
+    etag = await redis.get(etag_key)
+    if etag is not None:
+        etag = etag.decode()
+        document_key = get_oval_document_key(platform.id, etag)
+        length = await redis.strlen(document_key)
+        if length:
+            return stream_cached_oval_document(document_key, length), etag
+    # revisions of records are reset when Redis loses the hash,
+    # so the cached records are bound to the hash epoch
+    await redis.hsetnx(revisions_key, OVAL_EPOCH_FIELD, uuid.uuid4().hex)
+    async with redis.pipeline(transaction=True) as pipe:
+        # records, changed while the document is being generated,
+        # invalidate the document before it's saved
+        await pipe.watch(revisions_key)
+        revisions = {
+            field.decode(): value.decode()
+            for field, value in (await pipe.hgetall(revisions_key)).items()
+        }
+        epoch = revisions.pop(OVAL_EPOCH_FIELD, None)
+        if epoch is not None:
+            revisions = {
+                record_id: int(revision)
+                for record_id, revision in revisions.items()
+            }
+        else:
+            revisions = None
+        content, etag = encode_oval_document(
+            await build_oval_xml(db, platform, revisions, epoch)
+        )
+        pipe.multi()
+        # the document expires in case an invalidation was lost
+        pipe.set(
+            get_oval_document_key(platform.id, etag),
+            content,
+            ex=settings.oval_document_cache_ttl,
+        )
+        pipe.set(etag_key, etag, ex=settings.oval_document_cache_ttl)
+        try:
+            await pipe.execute()
+        except aioredis.WatchError:
+            logging.info(
+                "%s errata records were changed during OVAL generation",
+                platform.name,
+            )
+    return iter_oval_document(content), etag
+
+
+def errata_record_to_oval_objects(
+    record: models.ErrataRecord,
+) -> List[Tuple[str, Any]]:
+    """
+    Converts the errata record to OVAL definition, tests, objects,
+    states and variables, which are returned as (id, object) pairs.
+    """
     # TODO: add this info to platform
     gpg_keys = {
         "8": "51D6647EC21AD6EA",
         "9": "D36CB86CB86B3716",
     }
+    oval_objects = []
     objects = set()
     links_tracking = set()
     evra_regex = re.compile(r"(\d+):(.*)-(.*)")
-    for record in records:
-        is_freezed = record.freezed
-        rhel_evra_mapping = collections.defaultdict(dict)
-        rhel_name_mapping = collections.defaultdict(set)
-        for pkg in record.packages:
-            albs_pkgs = [
-                albs_pkg
-                for albs_pkg in pkg.albs_packages
-                if albs_pkg.status == ErrataPackageStatus.released
-            ]
-            for albs_pkg in albs_pkgs:
-                rhel_evra = f"{pkg.epoch}:{pkg.version}-{pkg.release}"
-                albs_evra = (
-                    f"{albs_pkg.epoch}:{albs_pkg.version}-{albs_pkg.release}"
-                )
-                arch = albs_pkg.arch
-                if arch == "noarch":
-                    arch = pkg.arch
-                rhel_evra_mapping[rhel_evra][arch] = albs_evra
-                rhel_name_mapping[rhel_evra].add(albs_pkg.name)
-        if not rhel_evra_mapping and not is_freezed:
-            continue
-        criteria_list = record.original_criteria[:]
-        while criteria_list:
-            new_criteria_list = []
-            for criteria in criteria_list:
-                new_criteria_list.extend(criteria["criteria"])
-                criterion_list = []
-                criterion_refs = set()
-                for criterion in criteria["criterion"]:
-                    criterion["ref"] = debrand_id(criterion["ref"])
-                    if criterion["ref"] in criterion_refs:
-                        continue
-                    criterion_refs.add(criterion["ref"])
-                    if criterion["comment"] == "Red Hat CoreOS 4 is installed":
-                        continue
-                    criterion["comment"] = debrand_comment(
-                        criterion["comment"], record.platform.distr_version
-                    )
-                    if not is_freezed:
-                        evra = evra_regex.search(criterion["comment"])
-                        if evra:
-                            evra = evra.group()
-                            if evra not in rhel_evra_mapping.keys():
-                                continue
-                            package_name = criterion["comment"].split()[0]
-                            if package_name not in rhel_name_mapping[evra]:
-                                continue
-                            # TODO: Add test mapping here
-                            #       test_id: rhel_evra
-                            criterion["comment"] = criterion[
-                                "comment"
-                            ].replace(
-                                evra,
-                                rhel_evra_mapping[evra][
-                                    next(iter(rhel_evra_mapping[evra].keys()))
-                                ],
-                            )
-                    criterion_list.append(criterion)
-                if len(criterion_list) == 1 and re.search(
-                    r"is signed with AlmaLinux OS",
-                    criterion_list[0]["comment"],
-                ):
-                    criterion_list = []
-                criteria["criterion"] = criterion_list
-                links_tracking.update(
-                    criterion["ref"] for criterion in criterion_list
+    is_freezed = record.freezed
+    rhel_evra_mapping = collections.defaultdict(dict)
+    rhel_name_mapping = collections.defaultdict(set)
+    for pkg in record.packages:
+        albs_pkgs = [
+            albs_pkg
+            for albs_pkg in pkg.albs_packages
+            if albs_pkg.status == ErrataPackageStatus.released
+        ]
+        for albs_pkg in albs_pkgs:
+            rhel_evra = f"{pkg.epoch}:{pkg.version}-{pkg.release}"
+            albs_evra = (
+                f"{albs_pkg.epoch}:{albs_pkg.version}-{albs_pkg.release}"
+            )
+            arch = albs_pkg.arch
+            if arch == "noarch":
+                arch = pkg.arch
+            rhel_evra_mapping[rhel_evra][arch] = albs_evra
+            rhel_name_mapping[rhel_evra].add(albs_pkg.name)
+    if not rhel_evra_mapping and not is_freezed:
+        return []
+    criteria_list = record.original_criteria[:]
+    while criteria_list:
+        new_criteria_list = []
+        for criteria in criteria_list:
+            new_criteria_list.extend(criteria["criteria"])
+            criterion_list = []
+            criterion_refs = set()
+            for criterion in criteria["criterion"]:
+                criterion["ref"] = debrand_id(criterion["ref"])
+                if criterion["ref"] in criterion_refs:
+                    continue
+                criterion_refs.add(criterion["ref"])
+                if criterion["comment"] == "Red Hat CoreOS 4 is installed":
+                    continue
+                criterion["comment"] = debrand_comment(
+                    criterion["comment"], record.platform.distr_version
                 )
-            criteria_list = new_criteria_list
-        for criteria in record.original_criteria:
-            criteria_node = CriteriaNode(criteria, None)
-            criteria_node.simplify()
-        if record.oval_title:
-            title = record.oval_title
-        elif not record.oval_title and record.title:
-            title = record.title
-        else:
-            title = record.original_title
-        definition = Definition.from_dict(
-            {
-                "id": debrand_id(record.definition_id),
-                "version": record.definition_version,
-                "class": record.definition_class,
-                "metadata": {
-                    "title": title,
-                    "description": record.description
-                    if record.description
-                    else record.original_description,
-                    "advisory": {
-                        "from": record.contact_mail,
-                        "severity": record.severity,
-                        "rights": record.rights,
-                        "issued_date": record.issued_date,
-                        "updated_date": record.updated_date,
-                        "affected_cpe_list": debrand_affected_cpe_list(
-                            record.affected_cpe, record.platform.distr_version
-                        ),
-                        "bugzilla": [
-                            {
-                                "id": ref.ref_id,
-                                "href": ref.href,
-                                "title": ref.title,
-                            }
-                            for ref in record.references
-                            if ref.ref_type == ErrataReferenceType.bugzilla
-                        ],
-                        "cves": [
-                            {
-                                "name": ref.ref_id,
-                                "public": datetime.datetime.strptime(
-                                    # year-month-day
-                                    ref.cve.public[:10],
-                                    "%Y-%m-%d",
-                                ).date(),
-                                "href": ref.href,
-                                "impact": ref.cve.impact,
-                                "cwe": ref.cve.cwe,
-                                "cvss3": ref.cve.cvss3,
-                            }
-                            for ref in record.references
-                            if ref.ref_type == ErrataReferenceType.cve
-                            and ref.cve
-                        ],
-                    },
-                    "references": [
-                        debrand_reference(
-                            {
-                                "id": ref.ref_id,
-                                "source": ref.ref_type.value.upper(),
-                                "url": ref.href,
-                            },
-                            record.platform.distr_version,
+                if not is_freezed:
+                    evra = evra_regex.search(criterion["comment"])
+                    if evra:
+                        evra = evra.group()
+                        if evra not in rhel_evra_mapping.keys():
+                            continue
+                        package_name = criterion["comment"].split()[0]
+                        if package_name not in rhel_name_mapping[evra]:
+                            continue
+                        # TODO: Add test mapping here
+                        #       test_id: rhel_evra
+                        criterion["comment"] = criterion[
+                            "comment"
+                        ].replace(
+                            evra,
+                            rhel_evra_mapping[evra][
+                                next(iter(rhel_evra_mapping[evra].keys()))
+                            ],
                         )
+                criterion_list.append(criterion)
+            if len(criterion_list) == 1 and re.search(
+                r"is signed with AlmaLinux OS",
+                criterion_list[0]["comment"],
+            ):
+                criterion_list = []
+            criteria["criterion"] = criterion_list
+            links_tracking.update(
+                criterion["ref"] for criterion in criterion_list
+            )
+        criteria_list = new_criteria_list
+    for criteria in record.original_criteria:
+        criteria_node = CriteriaNode(criteria, None)
+        criteria_node.simplify()
+    definition_id = debrand_id(record.definition_id)
+    if record.oval_title:
+        title = record.oval_title
+    elif not record.oval_title and record.title:
+        title = record.title
+    else:
+        title = record.original_title
+    definition = Definition.from_dict(
+        {
+            "id": definition_id,
+            "version": record.definition_version,
+            "class": record.definition_class,
+            "metadata": {
+                "title": title,
+                "description": record.description
+                if record.description
+                else record.original_description,
+                "advisory": {
+                    "from": record.contact_mail,
+                    "severity": record.severity,
+                    "rights": record.rights,
+                    "issued_date": record.issued_date,
+                    "updated_date": record.updated_date,
+                    "affected_cpe_list": debrand_affected_cpe_list(
+                        record.affected_cpe, record.platform.distr_version
+                    ),
+                    "bugzilla": [
+                        {
+                            "id": ref.ref_id,
+                            "href": ref.href,
+                            "title": ref.title,
+                        }
                         for ref in record.references
-                        if ref.ref_type
-                        not in [
-                            ErrataReferenceType.bugzilla,
-                        ]
+                        if ref.ref_type == ErrataReferenceType.bugzilla
+                    ],
+                    "cves": [
+                        {
+                            "name": ref.ref_id,
+                            "public": datetime.datetime.strptime(
+                                # year-month-day
+                                ref.cve.public[:10],
+                                "%Y-%m-%d",
+                            ).date(),
+                            "href": ref.href,
+                            "impact": ref.cve.impact,
+                            "cwe": ref.cve.cwe,
+                            "cvss3": ref.cve.cvss3,
+                        }
+                        for ref in record.references
+                        if ref.ref_type == ErrataReferenceType.cve
+                        and ref.cve
                     ],
                 },
-                "criteria": record.original_criteria,
-            }
-        )
-        oval.append_object(definition)
-        for test in record.original_tests:
-            test["id"] = debrand_id(test["id"])
-            if test["id"] in objects:
-                continue
-            if test["id"] not in links_tracking:
-                continue
-            objects.add(test["id"])
-            if get_test_cls_by_tag(test["type"]) in (
-                RpminfoTest,
-                RpmverifyfileTest,
-            ):
-                test["comment"] = debrand_comment(
-                    test["comment"], record.platform.distr_version
-                )
-            test["object_ref"] = debrand_id(test["object_ref"])
-            if test.get("state_ref"):
-                test["state_ref"] = debrand_id(test["state_ref"])
-            links_tracking.update([test["object_ref"], test["state_ref"]])
-            oval.append_object(
-                get_test_cls_by_tag(test["type"]).from_dict(test)
+                "references": [
+                    debrand_reference(
+                        {
+                            "id": ref.ref_id,
+                            "source": ref.ref_type.value.upper(),
+                            "url": ref.href,
+                        },
+                        record.platform.distr_version,
+                    )
+                    for ref in record.references
+                    if ref.ref_type
+                    not in [
+                        ErrataReferenceType.bugzilla,
+                    ]
+                ],
+            },
+            "criteria": record.original_criteria,
+        }
+    )
+    oval_objects.append((definition_id, definition))
+    for test in record.original_tests:
+        test["id"] = debrand_id(test["id"])
+        if test["id"] in objects:
+            continue
+        if test["id"] not in links_tracking:
+            continue
+        objects.add(test["id"])
+        if get_test_cls_by_tag(test["type"]) in (
+            RpminfoTest,
+            RpmverifyfileTest,
+        ):
+            test["comment"] = debrand_comment(
+                test["comment"], record.platform.distr_version
             )
+        test["object_ref"] = debrand_id(test["object_ref"])
+        if test.get("state_ref"):
+            test["state_ref"] = debrand_id(test["state_ref"])
+        links_tracking.update([test["object_ref"], test["state_ref"]])
+        oval_objects.append(
+            (test["id"], get_test_cls_by_tag(test["type"]).from_dict(test))
+        )
+    for obj in record.original_objects:
+        obj["id"] = debrand_id(obj["id"])
+        if obj["id"] in objects:
+            continue
+        if obj["id"] not in links_tracking:
+            continue
+        objects.add(obj["id"])
+        if obj.get("instance_var_ref"):
+            obj["instance_var_ref"] = debrand_id(obj["instance_var_ref"])
+            links_tracking.add(obj["instance_var_ref"])
+        if get_object_cls_by_tag(obj["type"]) == RpmverifyfileObject:
+            if obj["filepath"] == "/etc/redhat-release":
+                obj["filepath"] = "/etc/almalinux-release"
+        oval_objects.append(
+            (obj["id"], get_object_cls_by_tag(obj["type"]).from_dict(obj))
+        )
+    for state in record.original_states:
+        state["id"] = debrand_id(state["id"])
+        if state["id"] in objects:
+            continue
+        if state["id"] not in links_tracking:
+            continue
+        if state.get("evr"):
+            if state["evr"] in rhel_evra_mapping:
+                if state["arch"]:
+                    state["arch"] = "|".join(
+                        rhel_evra_mapping[state["evr"]].keys()
+                    )
+                state["evr"] = rhel_evra_mapping[state["evr"]][
+                    next(iter(rhel_evra_mapping[state["evr"]].keys()))
+                ]
+        objects.add(state["id"])
+        state_cls = get_state_cls_by_tag(state["type"])
+        if state_cls == RpminfoState:
+            if not is_freezed:
+                if state["signature_keyid"]:
+                    state["signature_keyid"] = gpg_keys[
+                        record.platform.distr_version
+                    ].lower()
+        elif state_cls == RpmverifyfileState:
+            if state["name"] == "^redhat-release":
+                state["name"] = "^almalinux-release"
+        oval_objects.append((state["id"], state_cls.from_dict(state)))
+    for var in record.original_variables:
+        var["id"] = debrand_id(var["id"])
+        if var["id"] in objects:
+            continue
+        if var["id"] not in links_tracking:
+            continue
+        objects.add(var["id"])
+        oval_objects.append(
+            (var["id"], get_variable_cls_by_tag(var["type"]).from_dict(var))
+        )
         for obj in record.original_objects:
-            obj["id"] = debrand_id(obj["id"])
-            if obj["id"] in objects:
+            if (
+                obj["id"]
+                != var["arithmetic"]["object_component"]["object_ref"]
+            ):
                 continue
-            if obj["id"] not in links_tracking:
+            if obj["id"] in objects:
                 continue
             objects.add(obj["id"])
-            if obj.get("instance_var_ref"):
-                obj["instance_var_ref"] = debrand_id(obj["instance_var_ref"])
-                links_tracking.add(obj["instance_var_ref"])
-            if get_object_cls_by_tag(obj["type"]) == RpmverifyfileObject:
-                if obj["filepath"] == "/etc/redhat-release":
-                    obj["filepath"] = "/etc/almalinux-release"
-            oval.append_object(
-                get_object_cls_by_tag(obj["type"]).from_dict(obj)
+            oval_objects.append(
+                (
+                    obj["id"],
+                    get_object_cls_by_tag(obj["type"]).from_dict(obj),
+                )
             )
-        for state in record.original_states:
-            state["id"] = debrand_id(state["id"])
-            if state["id"] in objects:
-                continue
-            if state["id"] not in links_tracking:
-                continue
-            if state.get("evr"):
-                if state["evr"] in rhel_evra_mapping:
-                    if state["arch"]:
-                        state["arch"] = "|".join(
-                            rhel_evra_mapping[state["evr"]].keys()
-                        )
-                    state["evr"] = rhel_evra_mapping[state["evr"]][
-                        next(iter(rhel_evra_mapping[state["evr"]].keys()))
-                    ]
-            objects.add(state["id"])
-            state_cls = get_state_cls_by_tag(state["type"])
-            if state_cls == RpminfoState:
-                if not is_freezed:
-                    if state["signature_keyid"]:
-                        state["signature_keyid"] = gpg_keys[
-                            record.platform.distr_version
-                        ].lower()
-            elif state_cls == RpmverifyfileState:
-                if state["name"] == "^redhat-release":
-                    state["name"] = "^almalinux-release"
-            oval.append_object(state_cls.from_dict(state))
-        for var in record.original_variables:
-            var["id"] = debrand_id(var["id"])
-            if var["id"] in objects:
-                continue
-            if var["id"] not in links_tracking:
+    return oval_objects
+
+
+def compose_oval(
+    records_objects: Iterable[List[Tuple[str, Any]]],
+) -> str:
+    oval = Composer()
+    generator = Generator(
+        product_name="AlmaLinux OS Errata System",
+        product_version="0.0.1",
+        schema_version="5.10",
+        timestamp=datetime.datetime.utcnow(),
+    )
+    oval.generator = generator
+    objects = set()
+    for oval_objects in records_objects:
+        for object_id, oval_object in oval_objects:
+            # tests, objects and states can be shared between records
+            if object_id in objects:
                 continue
-            objects.add(var["id"])
-            oval.append_object(
-                get_variable_cls_by_tag(var["type"]).from_dict(var)
-            )
-            for obj in record.original_objects:
-                if (
-                    obj["id"]
-                    != var["arithmetic"]["object_component"]["object_ref"]
-                ):
-                    continue
-                if obj["id"] in objects:
-                    continue
-                objects.add(obj["id"])
-                oval.append_object(
-                    get_object_cls_by_tag(obj["type"]).from_dict(obj)
-                )
+            objects.add(object_id)
+            oval.append_object(oval_object)
     return oval.dump_to_string()
 
 
+def errata_records_to_oval(records: List[models.ErrataRecord]):
+    return compose_oval(
+        errata_record_to_oval_objects(record) for record in records
+    )
+
+
 def prepare_search_params(
     errata_record: models.ErrataRecord,
 ) -> DefaultDict[str, List[str]]:
@@ -397,44 +664,63 @@ def prepare_search_params(
     return search_params
 
 
-async def load_platform_packages(
+async def get_platform_repos_packages(
     platform: models.Platform,
     search_params: DefaultDict[str, List[str]],
-    for_release: bool = False,
     module: Optional[str] = None,
-) -> Dict[str, Any]:
-    cache = {}
-    for repo in platform.repos:
-        if not repo.production:
-            continue
-
+) -> List[Tuple[models.Repository, List[RpmPackage]]]:
+    repos = [repo for repo in platform.repos if repo.production]
+    queries = []
+    for repo in repos:
         repo_id = get_uuid_from_pulp_href(repo.pulp_href)
         if module:
-            pkgs = get_rpm_module_packages_from_repository(
-                repo_id=repo_id,
-                module=module,
-                pkg_names=search_params["name"],
-                pkg_versions=search_params["version"],
-                pkg_epochs=search_params["epoch"],
+            queries.append(
+                get_rpm_module_packages_from_repository_async(
+                    repo_id=repo_id,
+                    module=module,
+                    pkg_names=search_params["name"],
+                    pkg_versions=search_params["version"],
+                    pkg_epochs=search_params["epoch"],
+                )
             )
-        else:
-            pkgs = get_rpm_packages_from_repository(
+            continue
+        queries.append(
+            get_rpm_packages_from_repository_async(
                 repo_id=repo_id,
                 pkg_names=search_params["name"],
                 pkg_versions=search_params["version"],
                 pkg_epochs=search_params["epoch"],
             )
+        )
+    return list(zip(repos, await asyncio.gather(*queries)))
 
-        if not pkgs:
-            continue
 
+def get_release_packages_cache(
+    repos_packages: List[Tuple[models.Repository, List[RpmPackage]]],
+) -> Dict[str, List[str]]:
+    cache = collections.defaultdict(list)
+    for repo, pkgs in repos_packages:
+        for pkg in pkgs:
+            cache[pkg.pulp_href].append(repo.pulp_href)
+    return dict(cache)
+
+
+async def load_platform_packages(
+    platform: models.Platform,
+    search_params: DefaultDict[str, List[str]],
+    for_release: bool = False,
+    module: Optional[str] = None,
+) -> Dict[str, Any]:
+    repos_packages = await get_platform_repos_packages(
+        platform,
+        search_params,
+        module=module,
+    )
+    if for_release:
+        return get_release_packages_cache(repos_packages)
+    cache = {}
+    for _, pkgs in repos_packages:
         for pkg in pkgs:
-            if for_release:
-                key = pkg.pulp_href
-                if not cache.get(key):
-                    cache[key] = []
-                cache[key].append(repo.pulp_href)
-                continue
             short_pkg_name = "-".join(
                 (
                     pkg.name,
@@ -456,6 +742,58 @@ async def load_platform_packages(
     return cache
 
 
+async def load_records_platform_packages(
+    records: List[models.ErrataRecord],
+) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Loads packages for release of several records at once.
+    Pulp is queried once per platform repository with united search
+    params of all platform records, found packages are split back
+    by search params of every record.
+    """
+    records_by_platform = collections.defaultdict(list)
+    for record in records:
+        records_by_platform[record.platform_id].append(record)
+    records_packages = {}
+    for platform_records in records_by_platform.values():
+        records_params = {
+            record.id: prepare_search_params(record)
+            for record in platform_records
+        }
+        search_params = collections.defaultdict(list)
+        for record_params in records_params.values():
+            for attr, values in record_params.items():
+                search_params[attr].extend(
+                    value
+                    for value in values
+                    if value not in search_params[attr]
+                )
+        repos_packages = await get_platform_repos_packages(
+            platform_records[0].platform,
+            search_params,
+        )
+        for record_id, record_params in records_params.items():
+            params_sets = {
+                attr: set(values) for attr, values in record_params.items()
+            }
+            records_packages[record_id] = get_release_packages_cache(
+                [
+                    (
+                        repo,
+                        [
+                            pkg
+                            for pkg in pkgs
+                            if pkg.name in params_sets["name"]
+                            and pkg.version in params_sets["version"]
+                            and pkg.epoch in params_sets["epoch"]
+                        ],
+                    )
+                    for repo, pkgs in repos_packages
+                ]
+            )
+    return records_packages
+
+
 async def update_errata_record(
     db: AsyncSession,
     update_record: errata_schema.UpdateErrataRequest,
@@ -477,6 +815,7 @@ async def update_errata_record(
             record.description = update_record.description
     await db.commit()
     await db.refresh(record)
+    await invalidate_oval_cache(record.platform_id, [record.id])
     return record
 
 
@@ -555,7 +894,7 @@ async def get_matching_albs_packages(
         RpmPackage.arch,
         RpmPackage.rpm_sourcerpm,
     ]
-    pulp_pkgs = get_rpm_packages_by_ids(pulp_pkg_ids, pkg_fields)
+    pulp_pkgs = await get_rpm_packages_by_ids_async(pulp_pkg_ids, pkg_fields)
     for package in result:
         pulp_rpm_package = pulp_pkgs.get(package.href)
         if not pulp_rpm_package:
@@ -736,6 +1075,7 @@ async def create_errata_record(db: AsyncSession, errata: BaseErrataRecord):
     db.add_all(items_to_insert)
     await db.commit()
     await db.refresh(db_errata)
+    await invalidate_oval_cache(db_errata.platform_id, [db_errata.id])
     return db_errata
 
 
@@ -829,6 +1169,7 @@ async def update_package_status(
     db: AsyncSession,
     request: List[errata_schema.ChangeErrataPackageStatusRequest],
 ):
+    changed_records = collections.defaultdict(list)
     async with db.begin():
         for record in request:
             errata_record = await db.execute(
@@ -842,6 +1183,9 @@ async def update_package_status(
                 )
             )
             errata_record = errata_record.scalars().first()
+            changed_records[errata_record.platform_id].append(
+                errata_record.id
+            )
             record_approved = record.status == ErrataPackageStatus.approved
             for errata_pkg in errata_record.packages:
                 if errata_pkg.source_srpm != record.source:
@@ -859,9 +1203,57 @@ async def update_package_status(
                         albs_pkg.status = ErrataPackageStatus.skipped
                     if albs_pkg.build_id == record.build_id:
                         albs_pkg.status = record.status
+    await invalidate_oval_records(changed_records)
     return True
 
 
+async def get_errata_packages_module(
+    session: AsyncSession,
+    packages: List[models.ErrataToALBSPackage],
+) -> Optional[models.RpmModule]:
+    """
+    Returns the module of the first package that was built as a part
+    of a module, looking up all the packages with one query.
+    """
+    if not packages:
+        return None
+    artifact_ids = {
+        pkg.albs_artifact_id
+        for pkg in packages
+        if pkg.albs_artifact_id is not None
+    }
+    hrefs = {
+        pkg.pulp_href for pkg in packages if pkg.albs_artifact_id is None
+    }
+    db_pkgs = await session.execute(
+        select(models.BuildTaskArtifact)
+        .where(
+            or_(
+                models.BuildTaskArtifact.id.in_(artifact_ids),
+                models.BuildTaskArtifact.href.in_(hrefs),
+            )
+        )
+        .options(
+            selectinload(models.BuildTaskArtifact.build_task).selectinload(
+                models.BuildTask.rpm_module
+            )
+        )
+    )
+    artifacts_by_id = {}
+    artifacts_by_href = {}
+    for db_pkg in db_pkgs.scalars().all():
+        artifacts_by_id[db_pkg.id] = db_pkg
+        artifacts_by_href.setdefault(db_pkg.href, db_pkg)
+    for pkg in packages:
+        if pkg.albs_artifact_id is not None:
+            db_pkg = artifacts_by_id.get(pkg.albs_artifact_id)
+        else:
+            db_pkg = artifacts_by_href.get(pkg.pulp_href)
+        if db_pkg and db_pkg.build_task.rpm_module is not None:
+            return db_pkg.build_task.rpm_module
+    return None
+
+
 async def release_errata_packages(
     session: AsyncSession,
     pulp_client: PulpClient,
@@ -870,6 +1262,7 @@ async def release_errata_packages(
     platform: models.Platform,
     repo_href: str,
     publish: bool = True,
+    pulp_packages: Optional[Dict[str, Dict[str, Any]]] = None,
 ):
     repo = await pulp_client.get_by_href(repo_href)
     released_record = await pulp_client.list_updateinfo_records(
@@ -883,12 +1276,16 @@ async def release_errata_packages(
     arch = repo["name"].split("-")[-1]
     platform_version = platform.modularity["versions"][-1]
     platform_version = platform_version["name"].replace(".", "_")
-    rpm_module = None
+    if pulp_packages is None:
+        pulp_packages = await get_rpm_packages_metadata(
+            errata_pkg.get_pulp_href() for errata_pkg in packages
+        )
     reboot_suggested = False
     dict_packages = []
+    modular_pkgs = []
     released_pkgs = set()
     for errata_pkg in packages:
-        pulp_pkg = await pulp_client.get_by_href(errata_pkg.get_pulp_href())
+        pulp_pkg = pulp_packages[errata_pkg.get_pulp_href()]
         pkg_name_arch = "_".join([pulp_pkg["name"], pulp_pkg["arch"]])
         if errata_pkg.errata_package.reboot_suggested:
             reboot_suggested = True
@@ -909,35 +1306,21 @@ async def release_errata_packages(
                 "sum_type": "sha256",
             }
         )
-        if rpm_module or ".module_el" not in pulp_pkg["release"]:
-            continue
-        query = models.BuildTaskArtifact.href == errata_pkg.pulp_href
-        if errata_pkg.albs_artifact_id is not None:
-            query = models.BuildTaskArtifact.id == errata_pkg.albs_artifact_id
-        db_pkg = await session.execute(
-            select(models.BuildTaskArtifact)
-            .where(query)
-            .options(
-                selectinload(models.BuildTaskArtifact.build_task).selectinload(
-                    models.BuildTask.rpm_module
-                )
-            )
-        )
-        db_pkg = db_pkg.scalars().first()
-        if not db_pkg:
-            continue
-        db_module = db_pkg.build_task.rpm_module
-        if db_module is not None:
-            rpm_module = {
-                "name": db_module.name,
-                "stream": db_module.stream,
-                "version": int(db_module.version),
-                "context": db_module.context,
-                # we use here repository arch, because looking by
-                # noarch package (that can be referred to other arch)
-                # we can get module with different arch
-                "arch": arch,
-            }
+        if ".module_el" in pulp_pkg["release"]:
+            modular_pkgs.append(errata_pkg)
+    rpm_module = None
+    db_module = await get_errata_packages_module(session, modular_pkgs)
+    if db_module is not None:
+        rpm_module = {
+            "name": db_module.name,
+            "stream": db_module.stream,
+            "version": int(db_module.version),
+            "context": db_module.context,
+            # we use here repository arch, because looking by
+            # noarch package (that can be referred to other arch)
+            # we can get module with different arch
+            "arch": arch,
+        }
     collection_name = (
         f"{platform.name.lower()}-for-{arch}-{repo_stage}-"
         f"rpms__{platform_version}_default"
@@ -994,40 +1377,48 @@ async def release_errata_packages(
 
 async def prepare_updateinfo_mapping(
     db: AsyncSession,
-    pulp: PulpClient,
     package_hrefs: List[str],
     blacklist_updateinfo: List[str],
+    pulp_packages: Optional[Dict[str, Dict[str, Any]]] = None,
 ) -> DefaultDict[
     str,
     List[Tuple[models.BuildTaskArtifact, dict, models.ErrataToALBSPackage]],
 ]:
     updateinfo_mapping = collections.defaultdict(list)
-    for pkg_href in set(package_hrefs):
-        db_pkg_list = (
-            (
-                await db.execute(
-                    select(models.BuildTaskArtifact)
-                    .where(
-                        models.BuildTaskArtifact.href == pkg_href,
-                    )
-                    .options(
-                        selectinload(
-                            models.BuildTaskArtifact.build_task
-                        ).selectinload(models.BuildTask.rpm_module)
-                    )
+    package_hrefs = set(package_hrefs)
+    if not package_hrefs:
+        return updateinfo_mapping
+    db_pkg_list = (
+        (
+            await db.execute(
+                select(models.BuildTaskArtifact)
+                .where(
+                    models.BuildTaskArtifact.href.in_(package_hrefs),
+                )
+                .options(
+                    selectinload(
+                        models.BuildTaskArtifact.build_task
+                    ).selectinload(models.BuildTask.rpm_module)
                 )
             )
-            .scalars()
-            .all()
         )
-        for db_pkg in db_pkg_list:
-            errata_pkgs = await db.execute(
+        .scalars()
+        .all()
+    )
+    if not db_pkg_list:
+        return updateinfo_mapping
+    errata_pkgs = (
+        (
+            await db.execute(
                 select(models.ErrataToALBSPackage)
                 .where(
                     or_(
-                        models.ErrataToALBSPackage.albs_artifact_id
-                        == db_pkg.id,
-                        models.ErrataToALBSPackage.pulp_href == pkg_href,
+                        models.ErrataToALBSPackage.albs_artifact_id.in_(
+                            [db_pkg.id for db_pkg in db_pkg_list]
+                        ),
+                        models.ErrataToALBSPackage.pulp_href.in_(
+                            package_hrefs
+                        ),
                     )
                 )
                 .options(
@@ -1035,26 +1426,26 @@ async def prepare_updateinfo_mapping(
                     selectinload(models.ErrataToALBSPackage.build_artifact),
                 )
             )
-            pulp_pkg = await pulp.get_rpm_package(
-                db_pkg.href,
-                include_fields=[
-                    "name",
-                    "version",
-                    "release",
-                    "epoch",
-                    "arch",
-                    "location_href",
-                    "sha256",
-                    "rpm_sourcerpm",
-                ],
+        )
+        .scalars()
+        .all()
+    )
+    if pulp_packages is None:
+        pulp_packages = await get_rpm_packages_metadata(package_hrefs)
+    for db_pkg in db_pkg_list:
+        pulp_pkg = pulp_packages[db_pkg.href]
+        for errata_pkg in errata_pkgs:
+            if (
+                errata_pkg.albs_artifact_id != db_pkg.id
+                and errata_pkg.pulp_href != db_pkg.href
+            ):
+                continue
+            errata_id = errata_pkg.errata_package.errata_record_id
+            if errata_id in blacklist_updateinfo:
+                continue
+            updateinfo_mapping[errata_id].append(
+                (db_pkg, pulp_pkg, errata_pkg),
             )
-            for errata_pkg in errata_pkgs.scalars().all():
-                errata_id = errata_pkg.errata_package.errata_record_id
-                if errata_id in blacklist_updateinfo:
-                    continue
-                updateinfo_mapping[errata_id].append(
-                    (db_pkg, pulp_pkg, errata_pkg),
-                )
     return updateinfo_mapping
 
 
@@ -1181,9 +1572,17 @@ async def process_errata_release_for_repos(
     session: AsyncSession,
     pulp: PulpClient,
     publish: bool = True,
+    repos_latest_versions: Optional[Dict[str, Optional[str]]] = None,
 ) -> Optional[List[Awaitable]]:
     release_tasks = []
     publish_tasks = []
+    if repos_latest_versions is None:
+        repos_latest_versions = {}
+    pulp_packages = await get_rpm_packages_metadata(
+        pkg.get_pulp_href()
+        for packages in repo_mapping.values()
+        for pkg in packages
+    )
     for repo_href, packages in repo_mapping.items():
         pkg_hrefs = []
         for pkg in packages:
@@ -1192,11 +1591,15 @@ async def process_errata_release_for_repos(
         logging.info("Preparing udpateinfo mapping")
         updateinfo_mapping = await prepare_updateinfo_mapping(
             db=session,
-            pulp=pulp,
             package_hrefs=pkg_hrefs,
             blacklist_updateinfo=[],
+            pulp_packages=pulp_packages,
         )
-        latest_repo_version = await pulp.get_repo_latest_version(repo_href)
+        if repo_href not in repos_latest_versions:
+            repos_latest_versions[
+                repo_href
+            ] = await pulp.get_repo_latest_version(repo_href)
+        latest_repo_version = repos_latest_versions[repo_href]
         if latest_repo_version:
             errata_records = await pulp.list_updateinfo_records(
                 id__in=[
@@ -1222,6 +1625,7 @@ async def process_errata_release_for_repos(
                 db_record.platform,
                 repo_href,
                 publish=False,
+                pulp_packages=pulp_packages,
             )
         )
         if publish:
@@ -1271,7 +1675,7 @@ async def get_release_logs(
         RpmPackage.release,
         RpmPackage.arch,
     ]
-    pulp_pkgs = get_rpm_packages_by_ids(
+    pulp_pkgs = await get_rpm_packages_by_ids_async(
         pulp_pkg_ids=[get_uuid_from_pulp_href(pkg) for pkg in pulp_packages],
         pkg_fields=pkg_fields,
     )
@@ -1359,6 +1763,7 @@ async def release_errata_record(record_id: str, force: bool):
             missing_pkg_names=missing_pkg_names,
         )
         await session.commit()
+        await invalidate_oval_cache(db_record.platform_id, [record_id])
     logging.info("Record %s successfully released", record_id)
 
 
@@ -1398,14 +1803,14 @@ async def bulk_errata_records_release(records_ids: List[str]):
             "Starting bulk errata release, the following records are locked: %s",
             [rec.id for rec in db_records],
         )
+        logging.info("Retrieving platform packages from pulp")
+        records_packages = await load_records_platform_packages(db_records)
+        # release tasks are executed after all records are prepared,
+        # so repositories versions don't change in between
+        repos_latest_versions = {}
         for db_record in db_records:
             logging.info("Preparing data for %s", db_record.id)
-            search_params = prepare_search_params(db_record)
-            pulp_packages = await load_platform_packages(
-                db_record.platform,
-                search_params,
-                for_release=True,
-            )
+            pulp_packages = records_packages[db_record.id]
             try:
                 (
                     repo_mapping,
@@ -1423,6 +1828,7 @@ async def bulk_errata_records_release(records_ids: List[str]):
                 session,
                 pulp,
                 publish=False,
+                repos_latest_versions=repos_latest_versions,
             )
             db_record.release_status = ErrataReleaseStatus.RELEASED
             db_record.last_release_log = await get_release_logs(
@@ -1439,11 +1845,19 @@ async def bulk_errata_records_release(records_ids: List[str]):
             repos_to_publish.extend(repo_mapping.keys())
             release_tasks.extend(tasks)
         await session.commit()
+        released_records = collections.defaultdict(list)
+        for db_record in db_records:
+            released_records[db_record.platform_id].append(db_record.id)
+        await invalidate_oval_records(released_records)
     logging.info("Executing release tasks")
-    await asyncio.gather(*release_tasks)
+    await gather_with_concurrency(
+        settings.errata_release_concurrency,
+        *release_tasks,
+    )
     logging.info("Executing publication tasks")
-    await asyncio.gather(
-        *(pulp.create_rpm_publication(href) for href in set(repos_to_publish))
+    await gather_with_concurrency(
+        settings.errata_release_concurrency,
+        *(pulp.create_rpm_publication(href) for href in set(repos_to_publish)),
     )
     logging.info("Bulk errata release is finished")
 
@@ -5,7 +5,8 @@ import typing
 import urllib.parse
 from collections import defaultdict
 
-from sqlalchemy import or_, update
+import sqlalchemy
+from sqlalchemy import column, func, or_, update, values
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -26,10 +27,22 @@ from alws.perms import actions
 from alws.perms.authorization import can_perform
 from alws.pulp_models import RpmPackage
 from alws.schemas import sign_schema
+from alws.utils.asyncio_utils import gather_with_concurrency
 from alws.utils.copr import create_product_sign_key_repo
 from alws.utils.debuginfo import is_debuginfo_rpm
+from alws.utils.long_poll import notify_task_available
 from alws.utils.pulp_client import PulpClient
-from alws.utils.pulp_utils import get_rpm_packages_by_checksums
+from alws.utils.pulp_utils import (
+    get_content_checksums_by_ids_async,
+    get_rpm_packages_by_checksums_async,
+    get_uuid_from_pulp_href,
+)
+
+
+SIGNED_ARTIFACTS_CHUNK_SIZE = 5000
+# Redis channels to notify waiting sign nodes about new tasks
+SIGN_TASKS_CHANNEL = "sign_tasks:{keyid}"
+GEN_KEY_TASKS_CHANNEL = "gen_key_tasks"
 
 
 async def __get_build_repos(
@@ -110,6 +123,7 @@ async def create_gen_key_task(
     db.add(gen_key_task)
     await db.commit()
     await db.refresh(gen_key_task)
+    await notify_task_available(GEN_KEY_TASKS_CHANNEL)
     return await get_gen_key_task(db=db, gen_key_task_id=gen_key_task.id)
 
 
@@ -177,6 +191,7 @@ async def create_sign_task(
             status=SignStatus.IDLE,
             build_id=payload.build_id,
             sign_key_id=payload.sign_key_id,
+            packages=await __get_sign_task_packages(db, payload.build_id),
         )
         db.add(sign_task)
         await db.commit()
@@ -186,7 +201,11 @@ async def create_sign_task(
         .where(models.SignTask.id == sign_task.id)
         .options(selectinload(models.SignTask.sign_key))
     )
-    return sign_tasks.scalars().first()
+    sign_task = sign_tasks.scalars().first()
+    await notify_task_available(
+        SIGN_TASKS_CHANNEL.format(keyid=sign_task.sign_key.keyid),
+    )
+    return sign_task
 
 
 async def get_available_gen_key_task(
@@ -196,6 +215,11 @@ async def get_available_gen_key_task(
         gen_key_tasks = await db.execute(
             select(models.GenKeyTask)
             .where(models.GenKeyTask.status == GenKeyStatus.IDLE)
+            .order_by(models.GenKeyTask.id)
+            .limit(1)
+            # nodes woken up by the same notification
+            # shouldn't take the same task
+            .with_for_update(skip_locked=True)
             .options(
                 selectinload(models.GenKeyTask.product).selectinload(
                     models.Product.owner
@@ -214,44 +238,21 @@ async def get_available_gen_key_task(
     return gen_key_task
 
 
-async def get_available_sign_task(
+async def __get_sign_task_packages(
     db: AsyncSession,
-    key_ids: typing.List[str],
-) -> typing.Dict[str, typing.Any]:
-    sign_tasks = await db.execute(
-        select(models.SignTask)
-        .join(models.SignTask.sign_key)
-        .where(
-            models.SignTask.status == SignStatus.IDLE,
-            models.SignKey.keyid.in_(key_ids),
-            or_(
-                models.SignTask.ts <= datetime.datetime.utcnow(),
-                models.SignTask.ts.is_(None),
-            ),
-        )
-        .options(selectinload(models.SignTask.sign_key))
-    )
-    sign_task = sign_tasks.scalars().first()
-    if not sign_task:
-        return {}
-
-    await db.execute(
-        update(models.SignTask)
-        .where(models.SignTask.id == sign_task.id)
-        .values(status=SignStatus.IN_PROGRESS)
-    )
-
+    build_id: int,
+) -> typing.List[typing.Dict[str, typing.Any]]:
     build_src_rpms = await db.execute(
         select(models.SourceRpm)
-        .where(models.SourceRpm.build_id == sign_task.build_id)
+        .where(models.SourceRpm.build_id == build_id)
         .options(selectinload(models.SourceRpm.artifact))
     )
     build_src_rpms = build_src_rpms.scalars().all()
     if not build_src_rpms:
-        return {}
+        return []
     build_binary_rpms = await db.execute(
         select(models.BinaryRpm)
-        .where(models.BinaryRpm.build_id == sign_task.build_id)
+        .where(models.BinaryRpm.build_id == build_id)
         .options(
             selectinload(models.BinaryRpm.artifact).selectinload(
                 models.BuildTaskArtifact.build_task
@@ -260,15 +261,10 @@ async def get_available_sign_task(
     )
     build_binary_rpms = build_binary_rpms.scalars().all()
     if not build_binary_rpms:
-        return {}
-    sign_task_payload = {
-        "id": sign_task.id,
-        "build_id": sign_task.build_id,
-        "keyid": sign_task.sign_key.keyid,
-    }
+        return []
     packages = []
 
-    repo_mapping = await __get_build_repos(db, sign_task.build_id)
+    repo_mapping = await __get_build_repos(db, build_id)
     repo = repo_mapping.get(("src", False))
     for src_rpm in build_src_rpms:
         packages.append(
@@ -299,9 +295,100 @@ async def get_available_sign_task(
                 ),
             }
         )
-    sign_task_payload["packages"] = packages
+    return packages
+
+
+async def reset_sign_tasks_packages(db: AsyncSession, build_id: int):
+    """
+    Packages are stored with sign tasks when they are created,
+    so they are reset on build changes and computed again
+    when the task is taken.
+    """
+    await db.execute(
+        update(models.SignTask)
+        .where(
+            models.SignTask.build_id == build_id,
+            models.SignTask.status == SignStatus.IDLE,
+        )
+        .values(packages=None)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def __claim_sign_task(
+    db: AsyncSession,
+    key_ids: typing.List[str],
+):
+    # SKIP LOCKED lets concurrent sign nodes claim different tasks
+    # instead of waiting for each other or taking the same one
+    available_task = (
+        select(models.SignTask.id, models.SignKey.keyid)
+        .join(models.SignTask.sign_key)
+        .where(
+            models.SignTask.status == SignStatus.IDLE,
+            models.SignKey.keyid.in_(key_ids),
+            or_(
+                models.SignTask.ts <= datetime.datetime.utcnow(),
+                models.SignTask.ts.is_(None),
+            ),
+        )
+        .order_by(models.SignTask.id)
+        .limit(1)
+        .with_for_update(of=models.SignTask, skip_locked=True)
+        .cte("available_task")
+    )
+    sign_task = await db.execute(
+        update(models.SignTask)
+        .where(models.SignTask.id == available_task.c.id)
+        .values(status=SignStatus.IN_PROGRESS)
+        .returning(
+            models.SignTask.id,
+            models.SignTask.build_id,
+            models.SignTask.packages,
+            available_task.c.keyid,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return sign_task.first()
+
+
+async def get_available_sign_task(
+    db: AsyncSession,
+    key_ids: typing.List[str],
+) -> typing.Dict[str, typing.Any]:
+    while True:
+        sign_task = await __claim_sign_task(db, key_ids)
+        if not sign_task:
+            # don't keep the connection while the node waits for tasks
+            await db.rollback()
+            return {}
+        packages = sign_task.packages
+        # packages of tasks created before they were stored with them
+        # or reset on build changes are computed on the fly
+        if packages is None:
+            packages = await __get_sign_task_packages(db, sign_task.build_id)
+        if packages:
+            break
+        # tasks are claimed in order, so a task without packages
+        # is failed to not be claimed again before the following ones
+        logging.warning("Sign task %s has no packages to sign", sign_task.id)
+        await db.execute(
+            update(models.SignTask)
+            .where(models.SignTask.id == sign_task.id)
+            .values(
+                status=SignStatus.FAILED,
+                error_message="Build has no packages to sign",
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
     await db.commit()
-    return sign_task_payload
+    return {
+        "id": sign_task.id,
+        "build_id": sign_task.build_id,
+        "keyid": sign_task.keyid,
+        "packages": packages,
+    }
 
 
 async def get_sign_task(
@@ -400,6 +487,36 @@ async def complete_gen_key_task(
     return sign_key
 
 
+async def __update_signed_artifacts(
+    db: AsyncSession,
+    signed_artifacts: typing.Dict[
+        int, typing.Tuple[str, typing.Optional[str]]
+    ],
+    sign_key_id: int,
+):
+    artifacts = [
+        (artifact_id, href, cas_hash)
+        for artifact_id, (href, cas_hash) in signed_artifacts.items()
+    ]
+    for start in range(0, len(artifacts), SIGNED_ARTIFACTS_CHUNK_SIZE):
+        chunk = values(
+            column("id", sqlalchemy.Integer),
+            column("href", sqlalchemy.Text),
+            column("cas_hash", sqlalchemy.Text),
+            name="signed_artifacts",
+        ).data(artifacts[start : start + SIGNED_ARTIFACTS_CHUNK_SIZE])
+        await db.execute(
+            update(models.BuildTaskArtifact)
+            .where(models.BuildTaskArtifact.id == chunk.c.id)
+            .values(
+                href=chunk.c.href,
+                cas_hash=chunk.c.cas_hash,
+                sign_key_id=sign_key_id,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
 async def complete_sign_task(
     sign_task_id: int,
     payload: sign_schema.SignTaskComplete,
@@ -414,14 +531,11 @@ async def complete_sign_task(
             new_pkg_href = rpm_pkg.pulp_href
             sha256 = pkg.sha256
         else:
+            # sha256 of created packages is queried
+            # from Pulp database for all of them at once
             new_pkg_href = await pulp_client.create_rpm_package(
                 pkg.name, pkg.href
             )
-            if new_pkg_href:
-                package_info = await pulp_client.get_rpm_package(
-                    new_pkg_href, include_fields=["sha256"]
-                )
-                sha256 = package_info["sha256"]
         logging.debug("Process single package %s", pkg.id)
         return pkg.name, {
             "id": pkg.id,
@@ -490,7 +604,6 @@ async def complete_sign_task(
         all_rpms = source_rpms + binary_rpms
         for rpm in all_rpms:
             similar_rpms_mapping[rpm.artifact.name].append(rpm)
-        modified_items = []
         repo_mapping = await __get_build_repos(
             db, payload.build_id, build=build
         )
@@ -541,17 +654,40 @@ async def complete_sign_task(
                 package_arches_mapping[package.name].add(package.arch)
                 if package.name not in packages_to_convert:
                     packages_to_convert[package.name] = package
-            pulp_db_packages = get_rpm_packages_by_checksums(
+            pulp_db_packages = await get_rpm_packages_by_checksums_async(
                 [pkg.sha256 for pkg in packages_to_convert.values()],
             )
             logging.info("Start processing packages for task %s", sign_task_id)
-            results = await asyncio.gather(
+            results = await gather_with_concurrency(
+                settings.sign_task_packages_concurrency,
                 *(
                     __process_single_package(package, pulp_db_packages)
                     for package in packages_to_convert.values()
-                )
+                ),
             )
             converted_packages = dict(results)
+            created_packages_ids = [
+                get_uuid_from_pulp_href(pkg_info["href"])
+                for pkg_info in converted_packages.values()
+                if pkg_info["href"] and not pkg_info["sha256"]
+            ]
+            checksums = {}
+            if created_packages_ids:
+                checksums = await get_content_checksums_by_ids_async(
+                    created_packages_ids,
+                )
+            for pkg_info in converted_packages.values():
+                if not pkg_info["href"] or pkg_info["sha256"]:
+                    continue
+                pkg_info["sha256"] = checksums.get(
+                    get_uuid_from_pulp_href(pkg_info["href"])
+                )
+                if not pkg_info["sha256"]:
+                    package_info = await pulp_client.get_rpm_package(
+                        pkg_info["href"],
+                        include_fields=["sha256"],
+                    )
+                    pkg_info["sha256"] = package_info["sha256"]
             logging.info(
                 "Finish processing packages for task %s", sign_task_id
             )
@@ -559,7 +695,6 @@ async def complete_sign_task(
                 "Updating href and add sign key for every srpm in project"
             )
             for pkg_name, pkg_info in converted_packages.items():
-                new_href = pkg_info["href"]
                 if not pkg_info["href"]:
                     logging.error("Package %s href is missing", pkg_name)
                     sign_failed = True
@@ -574,7 +709,14 @@ async def complete_sign_task(
                     logging.error("Package %s checksum differs", pkg_name)
                     sign_failed = True
                     break
+            if sign_failed:
+                sign_task = await __failed_post_processing(sign_task, stats)
+                return sign_task
 
+            # artifact id -> (href, cas_hash)
+            signed_artifacts = {}
+            for pkg_name, pkg_info in converted_packages.items():
+                new_href = pkg_info["href"]
                 debug = is_debuginfo_rpm(pkg_name)
 
                 for db_pkg in similar_rpms_mapping.get(pkg_name, []):
@@ -582,24 +724,23 @@ async def complete_sign_task(
                     # for every srpm in project
                     db_sprms = srpms_mapping.get(db_pkg.artifact.href, [])
                     for db_sprm in db_sprms:
-                        db_sprm.href = new_href
-                        db_sprm.sign_key = sign_task.sign_key
-                        db_sprm.cas_hash = pkg_info["cas_hash"]
-                        modified_items.append(db_sprm)
-
-                    db_pkg.artifact.href = new_href
-                    db_pkg.artifact.sign_key = sign_task.sign_key
-                    db_pkg.artifact.cas_hash = pkg_info["cas_hash"]
-                    modified_items.append(db_pkg)
-                    modified_items.append(db_pkg.artifact)
+                        signed_artifacts[db_sprm.id] = (
+                            new_href,
+                            pkg_info["cas_hash"],
+                        )
+                    signed_artifacts[db_pkg.artifact.id] = (
+                        new_href,
+                        pkg_info["cas_hash"],
+                    )
 
                 for arch in package_arches_mapping.get(pkg_name, []):
                     repo = repo_mapping[(arch, debug)]
                     packages_to_add[repo.pulp_href].append(new_href)
-
-            if sign_failed:
-                sign_task = await __failed_post_processing(sign_task, stats)
-                return sign_task
+            await __update_signed_artifacts(
+                db,
+                signed_artifacts,
+                sign_task.sign_key_id,
+            )
             logging.info("Start modify repository for task %s", sign_task_id)
             await asyncio.gather(
                 *(
@@ -628,61 +769,114 @@ async def complete_sign_task(
 
         db.add(sign_task)
         db.add(build)
-        if modified_items:
-            db.add_all(modified_items)
         logging.info("Sign task %s is finished", sign_task_id)
         return sign_task
 
 
-async def verify_signed_build(
+async def verify_signed_builds(
     db: AsyncSession,
-    build_id: int,
+    build_ids: typing.List[int],
     platform_id: int,
-) -> bool:
-    build = await db.execute(
-        select(models.Build)
-        .where(models.Build.id == build_id)
-        .options(
-            selectinload(models.Build.source_rpms).selectinload(
-                models.SourceRpm.artifact
-            ),
-            selectinload(models.Build.binary_rpms).selectinload(
-                models.BinaryRpm.artifact
-            ),
-        )
-    )
-    build = build.scalars().first()
-    if not build:
-        raise DataNotFoundError(f"Build with ID {build_id} does not exist")
-    if not build.signed:
-        raise SignError(f"Build with ID {build_id} has not already signed")
-    if not build.source_rpms or not build.binary_rpms:
-        raise ValueError(f"No built packages in build with ID {build_id}")
+) -> typing.Dict[int, typing.Optional[Exception]]:
+    """
+    Verifies signatures of several builds with two queries.
+    Returns None for every verified build, otherwise the error
+    which describes why the build isn't verified.
+    """
     platforms = await db.execute(
         select(models.Platform)
         .where(models.Platform.id == platform_id)
         .options(selectinload(models.Platform.sign_keys))
     )
     platform = platforms.scalars().first()
+    platform_error = None
+    sign_key = None
     if not platform:
-        raise DataNotFoundError(
+        platform_error = DataNotFoundError(
             f"platform with ID {platform_id} does not exist"
         )
-    if not platform.sign_keys:
-        raise DataNotFoundError(
+    elif not platform.sign_keys:
+        platform_error = DataNotFoundError(
             f"platform with ID {platform_id} connects with no keys"
         )
-    sign_key = platform.sign_keys[0]
-    if not sign_key:
-        raise DataNotFoundError(
-            f"Sign key for Platform ID {platform_id} does not exist"
-        )
+    else:
+        sign_key = platform.sign_keys[0]
+        if not sign_key:
+            platform_error = DataNotFoundError(
+                f"Sign key for Platform ID {platform_id} does not exist"
+            )
 
-    all_rpms = build.source_rpms + build.binary_rpms
-    for rpm in all_rpms:
-        if rpm.artifact.sign_key != sign_key:
-            raise SignError(
-                f"Sign key with for pkg ID {rpm.id} is not matched "
-                f"by sign key for platform ID {platform_id}"
+    columns = [models.Build.id, models.Build.signed]
+    for rpm_model in (models.SourceRpm, models.BinaryRpm):
+        columns.append(
+            select(func.count(rpm_model.id))
+            .where(rpm_model.build_id == models.Build.id)
+            .scalar_subquery()
+        )
+    if platform_error is None:
+        # the first package of every build signed with another key
+        for rpm_model in (models.SourceRpm, models.BinaryRpm):
+            columns.append(
+                select(func.min(rpm_model.id))
+                .join(
+                    models.BuildTaskArtifact,
+                    rpm_model.artifact_id == models.BuildTaskArtifact.id,
+                )
+                .where(
+                    rpm_model.build_id == models.Build.id,
+                    models.BuildTaskArtifact.sign_key_id.is_distinct_from(
+                        sign_key.id
+                    ),
+                )
+                .scalar_subquery()
+            )
+    builds = await db.execute(
+        select(*columns).where(models.Build.id.in_(build_ids))
+    )
+    builds_info = {row[0]: row[1:] for row in builds.all()}
+
+    verdicts = {}
+    for build_id in build_ids:
+        build_info = builds_info.get(build_id)
+        if build_info is None:
+            verdicts[build_id] = DataNotFoundError(
+                f"Build with ID {build_id} does not exist"
+            )
+            continue
+        signed, src_rpms_count, binary_rpms_count, *unmatched = build_info
+        if not signed:
+            verdicts[build_id] = SignError(
+                f"Build with ID {build_id} has not already signed"
+            )
+            continue
+        if not src_rpms_count or not binary_rpms_count:
+            verdicts[build_id] = ValueError(
+                f"No built packages in build with ID {build_id}"
+            )
+            continue
+        if platform_error is not None:
+            verdicts[build_id] = platform_error
+            continue
+        unmatched_rpm_id = next(
+            (rpm_id for rpm_id in unmatched if rpm_id is not None),
+            None,
+        )
+        if unmatched_rpm_id is not None:
+            verdicts[build_id] = SignError(
+                f"Sign key with for pkg ID {unmatched_rpm_id} is not "
+                f"matched by sign key for platform ID {platform_id}"
             )
+            continue
+        verdicts[build_id] = None
+    return verdicts
+
+
+async def verify_signed_build(
+    db: AsyncSession,
+    build_id: int,
+    platform_id: int,
+) -> bool:
+    verdicts = await verify_signed_builds(db, [build_id], platform_id)
+    if verdicts[build_id] is not None:
+        raise verdicts[build_id]
     return True
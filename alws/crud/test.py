@@ -22,7 +22,7 @@ from alws.utils.file_utils import download_file
 from alws.utils.parsing import parse_tap_output, tap_set_status
 from alws.utils.pulp_client import PulpClient
 from alws.utils.pulp_utils import (
-    get_rpm_packages_by_ids,
+    get_rpm_packages_by_ids_async,
     get_uuid_from_pulp_href,
 )
 
@@ -188,10 +188,10 @@ async def create_test_tasks_for_build_id(db: AsyncSession, build_id: int):
         await create_test_tasks(db, build_task_id, test_log_repository.id)
 
 
-def get_pulp_packages(
+async def get_pulp_packages(
     artifacts: List[models.BuildTaskArtifact],
 ) -> Dict[str, RpmPackage]:
-    return get_rpm_packages_by_ids(
+    return await get_rpm_packages_by_ids_async(
         [get_uuid_from_pulp_href(artifact.href) for artifact in artifacts],
         [
             RpmPackage.name,
@@ -230,7 +230,7 @@ async def create_test_tasks(
             new_revision = latest_revision + 1
 
         test_tasks = []
-        pulp_packages = get_pulp_packages(build_task.artifacts)
+        pulp_packages = await get_pulp_packages(build_task.artifacts)
         for artifact in build_task.artifacts:
             if artifact.type != 'rpm':
                 continue
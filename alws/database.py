@@ -1,20 +1,131 @@
 # -*- mode:python; coding:utf-8; -*-
 # author: Vyacheslav Potoropin <vpotoropin@almalinux.org>
 # created: 2021-06-22
+import asyncio
+import time
+import typing
+import weakref
+
 from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
 from alws.config import settings
 
-__all__ = ['Base', 'Session', 'SyncSession', 'PulpSession', 'engine']
+__all__ = [
+    'AsyncPulpSession',
+    'Base',
+    'Session',
+    'SyncSession',
+    'PulpSession',
+    'configure_engine_pool',
+    'dispose_engines',
+    'engine',
+    'get_engine_pool_stats',
+]
 
 
 DATABASE_URL = settings.database_url
 
-engine = create_async_engine(DATABASE_URL, poolclass=NullPool, echo_pool=True)
+
+class MeasuredAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Async queue pool which collects checkout and wait time statistics.
+
+    asyncpg connections and the pool queue can be used only in the event
+    loop they were created in, so the pool is bound to the loop of its
+    first checkout. Before the engine is used from another event loop
+    (e.g. in scripts with several asyncio.run() calls) it should be
+    disposed with dispose_engines() in the previous loop, which closes
+    the connections and replaces the pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._event_loop = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _check_event_loop(self):
+        current_loop = asyncio.get_running_loop()
+        if self._event_loop is None:
+            self._event_loop = weakref.ref(current_loop)
+        elif self._event_loop() is not current_loop:
+            raise RuntimeError(
+                'Connection pool is bound to another event loop, '
+                'dispose the engine before switching event loops'
+            )
+
+    def _do_get(self):
+        self._check_event_loop()
+        start = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            self.timeouts += 1
+            raise
+        wait_time = time.monotonic() - start
+        self.checkouts += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.checkouts = self.checkouts
+        pool.timeouts = self.timeouts
+        pool.total_wait_time = self.total_wait_time
+        pool.max_wait_time = self.max_wait_time
+        return pool
+
+    def get_stats(self) -> typing.Dict[str, typing.Any]:
+        return {
+            'size': self.size(),
+            'checked_out': self.checkedout(),
+            'overflow': self.overflow(),
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'avg_wait_time': (
+                self.total_wait_time / self.checkouts
+                if self.checkouts
+                else 0.0
+            ),
+            'max_wait_time': self.max_wait_time,
+        }
+
+
+def create_pooled_async_engine(
+    url: str,
+    pool_size: int,
+    max_overflow: int,
+) -> AsyncEngine:
+    if pool_size <= 0:
+        return create_async_engine(url, poolclass=NullPool)
+    return create_async_engine(
+        url,
+        poolclass=MeasuredAsyncQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.database_pool_timeout,
+        pool_recycle=settings.database_pool_recycle,
+        pool_pre_ping=True,
+    )
+
+
+engine = create_pooled_async_engine(
+    DATABASE_URL,
+    settings.database_pool_size,
+    settings.database_max_overflow,
+)
 sync_engine = create_engine(
     settings.sync_database_url, pool_pre_ping=True, pool_recycle=3600
 )
@@ -29,3 +140,45 @@ pulp_engine = create_engine(
 )
 pulp_session_factory = sessionmaker(pulp_engine, expire_on_commit=False)
 PulpSession = scoped_session(pulp_session_factory)
+
+pulp_async_engine = create_pooled_async_engine(
+    settings.pulp_async_database_url
+    or make_url(settings.pulp_database_url).set(
+        drivername='postgresql+asyncpg'
+    ),
+    settings.pulp_database_pool_size,
+    settings.pulp_database_max_overflow,
+)
+AsyncPulpSession = sessionmaker(
+    pulp_async_engine, expire_on_commit=False, class_=AsyncSession
+)
+
+
+def configure_engine_pool(pool_size: int, max_overflow: int):
+    """
+    Recreates the main async engine with another pool size.
+    Must be called before the first connection is made,
+    e.g. dramatiq workers use a smaller pool than the web app.
+    Use dependencies.configure_db_pool to resize DB_SEMAPHORE as well.
+    """
+    global engine
+    engine = create_pooled_async_engine(
+        DATABASE_URL, pool_size, max_overflow
+    )
+    Session.configure(bind=engine)
+
+
+def get_engine_pool_stats() -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+    return {
+        name: async_engine.pool.get_stats()
+        for name, async_engine in (
+            ('albs', engine),
+            ('pulp', pulp_async_engine),
+        )
+        if isinstance(async_engine.pool, MeasuredAsyncQueuePool)
+    }
+
+
+async def dispose_engines():
+    await engine.dispose()
+    await pulp_async_engine.dispose()
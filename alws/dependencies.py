@@ -1,7 +1,8 @@
 import asyncio
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 
 import aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from alws import database
@@ -9,6 +10,7 @@ from alws.config import settings
 
 
 __all__ = [
+    'get_async_pulp_db',
     'get_async_session',
     'get_db',
     'get_pulp_db',
@@ -16,9 +18,34 @@ __all__ = [
 ]
 
 
-# Usually PostgreSQL supports up to 100 concurrent connections,
-# so making semaphore a bit less to not hit that limit
-DB_SEMAPHORE = asyncio.Semaphore(90)
+def create_db_semaphore(
+    pool_size: int,
+    max_overflow: int,
+) -> asyncio.Semaphore:
+    # Usually PostgreSQL supports up to 100 concurrent connections,
+    # so making semaphore a bit less to not hit that limit.
+    # Pooled sessions are also limited by the pool capacity,
+    # so requests wait here instead of failing with pool timeouts
+    if pool_size <= 0:
+        return asyncio.Semaphore(90)
+    return asyncio.Semaphore(min(90, pool_size + max_overflow))
+
+
+DB_SEMAPHORE = create_db_semaphore(
+    settings.database_pool_size,
+    settings.database_max_overflow,
+)
+
+
+def configure_db_pool(pool_size: int, max_overflow: int):
+    """
+    Recreates the main async engine with another pool size
+    and resizes DB_SEMAPHORE to its capacity.
+    Must be called before the first connection is made.
+    """
+    global DB_SEMAPHORE
+    database.configure_engine_pool(pool_size, max_overflow)
+    DB_SEMAPHORE = create_db_semaphore(pool_size, max_overflow)
 
 
 # FIXME: `get_current_user` dependency causes a transaction
@@ -51,6 +78,15 @@ def get_pulp_db() -> Session:
             session.close()
 
 
+@asynccontextmanager
+async def get_async_pulp_db() -> AsyncSession:
+    async with database.AsyncPulpSession() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 async def get_redis() -> aioredis.Redis:
     client = aioredis.from_url(settings.redis_url)
     try:
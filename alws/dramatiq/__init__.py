@@ -16,7 +16,34 @@ import asyncio
 import dramatiq
 from dramatiq.brokers.rabbitmq import RabbitmqBroker
 
+from alws import database
 from alws.config import settings
+from alws.dependencies import configure_db_pool
+from alws.utils.beholder_client import close_beholder_session
+from alws.utils.pulp_client import close_pulp_session
+
+
+class ConnectionPoolsMiddleware(dramatiq.Middleware):
+    """
+    Sizes the database pool for worker processes and closes database,
+    Pulp and Beholder connection pools, bound to the tasks event loop,
+    when the worker is shutting down.
+    """
+
+    def after_process_boot(self, broker):
+        # Workers process messages one by one in the single event loop,
+        # so they don't need as many pooled connections as the web app
+        configure_db_pool(
+            settings.dramatiq_database_pool_size,
+            settings.dramatiq_database_max_overflow,
+        )
+
+    def after_worker_shutdown(self, broker, worker):
+        if not event_loop.is_closed() and not event_loop.is_running():
+            event_loop.run_until_complete(close_pulp_session())
+            event_loop.run_until_complete(close_beholder_session())
+            event_loop.run_until_complete(database.dispose_engines())
+
 
 rabbitmq_broker = RabbitmqBroker(
     url=f"amqp://"
@@ -25,6 +52,7 @@ rabbitmq_broker = RabbitmqBroker(
     f"{settings.rabbitmq_default_host}:5672/"
     f"{settings.rabbitmq_default_vhost}",
 )
+rabbitmq_broker.add_middleware(ConnectionPoolsMiddleware())
 dramatiq.set_broker(rabbitmq_broker)
 event_loop = asyncio.get_event_loop()
 
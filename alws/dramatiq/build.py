@@ -97,8 +97,12 @@ async def _start_build(build_id: int, build_request: build_schema.BuildCreate):
                     await planner.add_linked_builds(linked_build)
             db.flush()
             await planner.init_build_repos()
+            ready_arches = {
+                task.arch for task in build.tasks if task.is_ready
+            }
             db.commit()
         db.close()
+    await build_node_crud.notify_build_tasks_ready(ready_arches)
 
 
 async def _build_done(request: build_node_schema.BuildDone):
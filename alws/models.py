@@ -26,7 +26,8 @@ from alws.constants import (
     SignStatus,
     GenKeyStatus,
 )
-from alws.database import Base, engine
+from alws import database
+from alws.database import Base
 
 __all__ = [
     "Build",
@@ -495,6 +496,14 @@ class BuildTask(TimeMixin, Base):
     )
     built_srpm_url = sqlalchemy.Column(sqlalchemy.VARCHAR, nullable=True)
     error = sqlalchemy.Column(sqlalchemy.Text, nullable=True, default=None)
+    # Precomputed "task has no dependencies" flag, so build task dispatch
+    # doesn't need to check build_task_dependency table on every poll
+    is_ready = sqlalchemy.Column(
+        sqlalchemy.Boolean,
+        nullable=False,
+        default=False,
+        server_default=sqlalchemy.false(),
+    )
 
 
 class BuildTaskRef(Base):
@@ -1160,6 +1169,9 @@ class SignTask(TimeMixin, Base):
     error_message = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
     log_href = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
     stats = sqlalchemy.Column(JSONB, nullable=True)
+    # Packages to sign with their download URLs, collected
+    # when the task is created
+    packages = sqlalchemy.Column(JSONB, nullable=True)
 
 
 class ExportTask(Base):
@@ -1461,6 +1473,13 @@ idx_build_tasks_status_arch_ts = sqlalchemy.Index(
     BuildTask.arch,
     BuildTask.ts,
 )
+idx_build_tasks_is_ready_arch_status_ts = sqlalchemy.Index(
+    "idx_build_tasks_is_ready_arch_status_ts",
+    BuildTask.is_ready,
+    BuildTask.arch,
+    BuildTask.status,
+    BuildTask.ts,
+)
 idx_build_tasks_build_id_index = sqlalchemy.Index(
     "idx_build_tasks_build_id_index",
     BuildTask.build_id,
@@ -1477,6 +1496,11 @@ idx_build_tasks_build_id_status = sqlalchemy.Index(
     BuildTask.build_id,
     BuildTask.status,
 )
+idx_sign_tasks_status_ts = sqlalchemy.Index(
+    "idx_sign_tasks_status_ts",
+    SignTask.status,
+    SignTask.ts,
+)
 idx_test_tasks_build_task_id_revision = sqlalchemy.Index(
     "idx_test_tasks_build_task_id_revision",
     TestTask.build_task_id,
@@ -1507,7 +1531,9 @@ idx_errata_packages_name_version_arch = sqlalchemy.Index(
 
 
 async def create_tables():
-    async with engine.begin() as conn:
+    # engine is referenced through the module,
+    # since configure_engine_pool() can replace it
+    async with database.engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 
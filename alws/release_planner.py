@@ -1,8 +1,10 @@
 import asyncio
+import concurrent.futures
 import copy
 import datetime
 import logging
 import re
+import threading
 import traceback
 import typing
 from abc import ABCMeta, abstractmethod
@@ -26,6 +28,7 @@ from alws.constants import (
     RepoType,
     BeholderMatchMethod,
 )
+from alws.crud import errata as errata_crud
 from alws.crud import products as product_crud
 from alws.crud import sign_task
 from alws.crud import user as user_crud
@@ -42,15 +45,16 @@ from alws.perms.authorization import can_perform
 from alws.pulp_models import RpmPackage
 from alws.schemas import release_schema
 from alws.utils.beholder_client import BeholderClient
+from alws.utils.cache import LRUCache
 from alws.utils.debuginfo import clean_debug_name, is_debuginfo_rpm
 from alws.utils.measurements import class_measure_work_time_async
-from alws.utils.modularity import IndexWrapper, ModuleWrapper
+from alws.utils.modularity import ModuleWrapper
 from alws.utils.parsing import get_clean_distr_name
 from alws.utils.pulp_client import PulpClient
 from alws.utils.pulp_utils import (
-    get_rpm_packages_by_ids,
-    get_rpm_packages_from_repositories,
-    get_rpm_packages_from_repository,
+    get_rpm_packages_by_ids_async,
+    get_rpm_packages_presence_in_repositories_async,
+    get_rpm_packages_from_repository_async,
     get_uuid_from_pulp_href,
 )
 
@@ -61,6 +65,36 @@ __all__ = [
 ]
 
 
+# immudb client keeps the verified state of the database between calls,
+# so every thread of the pool gets its own client
+IMMUDB_THREAD_LOCAL = threading.local()
+IMMUDB_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=settings.immudb_concurrency,
+    thread_name_prefix="immudb",
+)
+# Notarized checksums stay notarized, so only positive results are cached
+IMMUDB_AUTHENTICATED_CACHE = LRUCache(settings.immudb_cache_size)
+
+
+def get_immudb_wrapper() -> ImmudbWrapper:
+    wrapper = getattr(IMMUDB_THREAD_LOCAL, "wrapper", None)
+    if wrapper is None:
+        wrapper = ImmudbWrapper(
+            username=settings.immudb_username,
+            password=settings.immudb_password,
+            database=settings.immudb_database,
+            immudb_address=settings.immudb_address,
+            public_key_file=settings.immudb_public_key_file,
+        )
+        IMMUDB_THREAD_LOCAL.wrapper = wrapper
+    return wrapper
+
+
+def authenticate_checksum(package_checksum: str) -> bool:
+    response = get_immudb_wrapper().authenticate(package_checksum)
+    return response.get("verified", False)
+
+
 class BaseReleasePlanner(metaclass=ABCMeta):
     def __init__(self, db: AsyncSession):
         self._db = db
@@ -70,14 +104,6 @@ class BaseReleasePlanner(metaclass=ABCMeta):
             settings.pulp_password,
         )
         self.codenotary_enabled = settings.codenotary_enabled
-        if self.codenotary_enabled:
-            self._immudb_wrapper = ImmudbWrapper(
-                username=settings.immudb_username,
-                password=settings.immudb_password,
-                database=settings.immudb_database,
-                immudb_address=settings.immudb_address,
-                public_key_file=settings.immudb_public_key_file,
-            )
         self.stats = {}
 
     async def revert_release(
@@ -96,8 +122,9 @@ class BaseReleasePlanner(metaclass=ABCMeta):
             raise PermissionDenied(
                 "User does not have permissions to update release"
             )
+        changed_records = None
         try:
-            await self.revert_release_plan(release)
+            changed_records = await self.revert_release_plan(release)
         except Exception:
             await self.db.rollback()
             await self.db.refresh(release)
@@ -109,6 +136,8 @@ class BaseReleasePlanner(metaclass=ABCMeta):
         release_plan["last_log"] = message
         release.plan = release_plan
         await self.db.commit()
+        if changed_records:
+            await errata_crud.invalidate_oval_records(changed_records)
         logging.info("Successfully reverted release: %s", release_id)
 
     async def remove_packages_from_repositories(
@@ -151,7 +180,11 @@ class BaseReleasePlanner(metaclass=ABCMeta):
     async def revert_release_plan(
         self,
         release: models.Release,
-    ):
+    ) -> typing.Optional[typing.Dict[int, typing.List[str]]]:
+        """
+        Reverts the release, returns errata records (by platform id)
+        which OVAL cache should be invalidated after commit
+        """
         raise NotImplementedError()
 
     @property
@@ -168,6 +201,99 @@ class BaseReleasePlanner(metaclass=ABCMeta):
     ) -> dict:
         raise NotImplementedError()
 
+    @staticmethod
+    def get_module_key(module: dict) -> typing.Tuple[str, ...]:
+        return tuple(
+            str(module[key])
+            for key in ("name", "stream", "version", "context", "arch")
+        )
+
+    async def get_incremental_release_plan(
+        self,
+        release: models.Release,
+        build_ids: typing.List[int],
+        build_tasks: typing.List[int],
+    ) -> typing.Optional[dict]:
+        """
+        Updates the stored release plan only with packages and modules
+        of added and removed builds and build tasks.
+        Returns None if the plan should be generated from scratch.
+        """
+        plan = release.plan or {}
+        if not plan.get("packages") or not release.build_task_ids:
+            return
+        # plans generated before packages had task_id can't be updated
+        if any("task_id" not in pkg["package"] for pkg in plan["packages"]):
+            return
+        removed_builds = set(release.build_ids) - set(build_ids)
+        removed_tasks = set(release.build_task_ids) - set(build_tasks)
+        added_tasks = set(build_tasks) - set(release.build_task_ids)
+        modules = list(plan.get("modules") or [])
+        tasks_builds = {
+            pkg["package"]["task_id"]: pkg["package"]["build_id"]
+            for pkg in plan["packages"]
+        }
+        # modules know only their build, so removing a task
+        # from a build that stays in the release needs a full update
+        if modules and any(
+            tasks_builds.get(task_id) not in removed_builds
+            for task_id in removed_tasks
+        ):
+            return
+
+        packages = [
+            pkg
+            for pkg in plan["packages"]
+            if pkg["package"]["build_id"] not in removed_builds
+            and pkg["package"]["task_id"] not in removed_tasks
+        ]
+        modules = [
+            module
+            for module in modules
+            if module["module"]["build_id"] not in removed_builds
+        ]
+        delta_plan = {}
+        if added_tasks:
+            delta_plan = await self.get_release_plan(
+                base_platform=release.platform,
+                build_ids=build_ids,
+                build_tasks=sorted(added_tasks),
+                product=release.product,
+            )
+        full_names = {pkg["package"]["full_name"] for pkg in packages}
+        packages.extend(
+            pkg
+            for pkg in delta_plan.get("packages", [])
+            if pkg["package"]["full_name"] not in full_names
+        )
+        full_names = {pkg["package"]["full_name"] for pkg in packages}
+        module_keys = {
+            self.get_module_key(module["module"]) for module in modules
+        }
+        modules.extend(
+            module
+            for module in delta_plan.get("modules") or []
+            if self.get_module_key(module["module"]) not in module_keys
+        )
+        release_plan = {
+            **plan,
+            **delta_plan,
+            "packages": packages,
+            "modules": modules,
+        }
+        for key in ("packages_from_repos", "packages_in_repos"):
+            if key not in plan:
+                continue
+            release_plan[key] = {
+                full_name: value
+                for full_name, value in {
+                    **plan[key],
+                    **delta_plan.get(key, {}),
+                }.items()
+                if full_name in full_names
+            }
+        return release_plan
+
     @abstractmethod
     async def update_release_plan(
         self,
@@ -193,11 +319,18 @@ class BaseReleasePlanner(metaclass=ABCMeta):
 
     async def authenticate_package(self, package_checksum: str):
         is_authenticated = False
-        if self.codenotary_enabled:
-            response = self._immudb_wrapper.authenticate(
-                package_checksum,
-            )
-            is_authenticated = response.get('verified', False)
+        if not self.codenotary_enabled:
+            return package_checksum, is_authenticated
+        if IMMUDB_AUTHENTICATED_CACHE.get(package_checksum):
+            return package_checksum, True
+        # immudb client is synchronous, so it shouldn't block the loop
+        is_authenticated = await asyncio.get_running_loop().run_in_executor(
+            IMMUDB_EXECUTOR,
+            authenticate_checksum,
+            package_checksum,
+        )
+        if is_authenticated:
+            IMMUDB_AUTHENTICATED_CACHE.put(package_checksum, True)
         return package_checksum, is_authenticated
 
     @class_measure_work_time_async("get_packages_info_pulp_api")
@@ -216,7 +349,7 @@ class BaseReleasePlanner(metaclass=ABCMeta):
             RpmPackage.release,
             RpmPackage.arch,
         ]
-        pulp_packages = get_rpm_packages_by_ids(
+        pulp_packages = await get_rpm_packages_by_ids_async(
             [
                 get_uuid_from_pulp_href(rpm.artifact.href)
                 for rpm in build_rpms
@@ -267,36 +400,45 @@ class BaseReleasePlanner(metaclass=ABCMeta):
             )
         )
         build_result = await self.db.execute(builds_q)
+        builds = build_result.scalars().all()
         modules_to_release = defaultdict(list)
-        for build in build_result.scalars().all():
-            build_rpms = build.source_rpms + build.binary_rpms
-            pulp_artifacts = await self.get_pulp_packages_info(
-                build_rpms,
+        # Packages of all builds are fetched from Pulp in one query
+        pulp_artifacts = {
+            artifact_dict.pop("pulp_href"): artifact_dict
+            for artifact_dict in await self.get_pulp_packages_info(
+                [
+                    rpm
+                    for build in builds
+                    for rpm in build.source_rpms + build.binary_rpms
+                ],
                 build_tasks,
             )
-            pulp_artifacts = {
-                artifact_dict.pop("pulp_href"): artifact_dict
-                for artifact_dict in pulp_artifacts
-            }
+        }
+        for build in builds:
+            build_rpms = build.source_rpms + build.binary_rpms
+            build_tasks_by_id = {task.id: task for task in build.tasks}
+            is_beta = self.is_beta_build(build)
             for rpm in build_rpms:
                 artifact_task_id = rpm.artifact.build_task_id
                 if build_tasks and artifact_task_id not in build_tasks:
                     continue
                 artifact_name = rpm.artifact.name
                 source_name = None
-                pkg_info = copy.deepcopy(pulp_artifacts[rpm.artifact.href])
-                pkg_info["is_beta"] = self.is_beta_build(build)
-                pkg_info["build_id"] = build.id
-                pkg_info["artifact_href"] = rpm.artifact.href
-                pkg_info["cas_hash"] = rpm.artifact.cas_hash
-                pkg_info["href_from_repo"] = None
-                pkg_info["full_name"] = artifact_name
-                build_task = next(
-                    task for task in build.tasks if task.id == artifact_task_id
-                )
-                pkg_info["task_arch"] = build_task.arch
-                pkg_info["force"] = False
-                pkg_info["force_not_notarized"] = False
+                # package info values are immutable,
+                # so a shallow copy is enough here
+                pkg_info = {
+                    **pulp_artifacts[rpm.artifact.href],
+                    "is_beta": is_beta,
+                    "build_id": build.id,
+                    "artifact_href": rpm.artifact.href,
+                    "cas_hash": rpm.artifact.cas_hash,
+                    "href_from_repo": None,
+                    "full_name": artifact_name,
+                    "task_id": artifact_task_id,
+                    "task_arch": build_tasks_by_id[artifact_task_id].arch,
+                    "force": False,
+                    "force_not_notarized": False,
+                }
                 source_rpm = getattr(rpm, "source_rpm", None)
                 if source_rpm:
                     source_name = source_rpm.artifact.name
@@ -322,12 +464,11 @@ class BaseReleasePlanner(metaclass=ABCMeta):
                         and not build_repo.debug
                         and build_repo.type == "rpm"
                     )
-                    template = await self.pulp_client.get_repo_modules_yaml(
-                        module_repo.url
+                    module_index = (
+                        await self.pulp_client.get_repo_modules_index(
+                            module_repo.url
+                        )
                     )
-                    module_index = IndexWrapper()
-                    if template:
-                        module_index = IndexWrapper.from_template(template)
                     for module in module_index.iter_modules():
                         # in some cases we have also devel module in template,
                         # we should add all modules from template
@@ -515,15 +656,24 @@ class BaseReleasePlanner(metaclass=ABCMeta):
         if (payload.builds and payload.builds != release.build_ids) or (
             build_tasks and build_tasks != release.build_task_ids
         ):
+            release_plan = None
+            if payload.builds and build_tasks:
+                release_plan = await self.get_incremental_release_plan(
+                    release,
+                    build_ids=payload.builds,
+                    build_tasks=build_tasks,
+                )
+            if release_plan is None:
+                release_plan = await self.get_release_plan(
+                    base_platform=release.platform,
+                    build_ids=payload.builds,
+                    build_tasks=payload.build_tasks,
+                    product=release.product,
+                )
             release.build_ids = payload.builds
             if build_tasks:
                 release.build_task_ids = payload.build_tasks
-            release.plan = await self.get_release_plan(
-                base_platform=release.platform,
-                build_ids=payload.builds,
-                build_tasks=payload.build_tasks,
-                product=release.product,
-            )
+            release.plan = release_plan
         elif payload.plan:
             # TODO: Add packages presence check in community repos
             new_plan = await self.update_release_plan(payload.plan, release)
@@ -705,11 +855,15 @@ class CommunityReleasePlanner(BaseReleasePlanner):
             for repo in build.repos
             if repo.arch == "x86_64"
         ]
-        for repo_id in x86_64_build_repos_ids:
-            for rpm_pkg in get_rpm_packages_from_repository(
+        repos_rpm_pkgs = await asyncio.gather(*(
+            get_rpm_packages_from_repository_async(
                 repo_id,
                 pkg_arches=["i686"],
-            ):
+            )
+            for repo_id in x86_64_build_repos_ids
+        ))
+        for rpm_pkgs in repos_rpm_pkgs:
+            for rpm_pkg in rpm_pkgs:
                 i686_pkgs_in_x86_64_repos.append(rpm_pkg.pulp_href)
         for pkg in pulp_packages:
             if pkg["full_name"] in added_packages:
@@ -806,14 +960,9 @@ class CommunityReleasePlanner(BaseReleasePlanner):
                     repo_url = db_repo["url"]
                 repo_module_index = prod_repo_modules_cache.get(repo_url)
                 if repo_module_index is None:
-                    template = await self.pulp_client.get_repo_modules_yaml(
-                        repo_url
+                    repo_module_index = (
+                        await self.pulp_client.get_repo_modules_index(repo_url)
                     )
-                    repo_module_index = IndexWrapper()
-                    if template:
-                        repo_module_index = IndexWrapper.from_template(
-                            template
-                        )
                     prod_repo_modules_cache[repo_url] = repo_module_index
                 module_info = module["module"]
                 release_module = ModuleWrapper.from_template(
@@ -919,8 +1068,10 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
                 )
             )
         )
-        for errata_pkg in errata_pkgs.scalars().all():
+        errata_pkgs = errata_pkgs.scalars().all()
+        for errata_pkg in errata_pkgs:
             errata_pkg.status = ErrataPackageStatus.proposal
+        changed_records = await self.get_oval_changed_records(errata_pkgs)
         await self.db.execute(
             update(models.Build)
             .where(
@@ -933,6 +1084,28 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
             )
         )
         release.status = ReleaseStatus.REVERTED
+        return changed_records
+
+    async def get_oval_changed_records(
+        self,
+        albs_pkgs: typing.List[models.ErrataToALBSPackage],
+    ) -> typing.DefaultDict[int, typing.List[str]]:
+        # released or reverted packages change OVAL definitions
+        # of their records
+        records = await self.db.execute(
+            select(models.ErrataRecord.platform_id, models.ErrataRecord.id)
+            .join(models.ErrataPackage)
+            .where(
+                models.ErrataPackage.id.in_(
+                    {albs_pkg.errata_package_id for albs_pkg in albs_pkgs}
+                )
+            )
+            .distinct()
+        )
+        changed_records = defaultdict(list)
+        for platform_id, record_id in records:
+            changed_records[platform_id].append(record_id)
+        return changed_records
 
     @class_measure_work_time_async("packages_presence_check")
     async def check_packages_presence_in_prod_repositories(
@@ -947,11 +1120,6 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
             pulp_repo_id = get_uuid_from_pulp_href(repo.pulp_href)
             repo_mapping[pulp_repo_id] = (repo.id, repo.arch)
 
-        pkg_names = []
-        pkg_epochs = []
-        pkg_versions = []
-        pkg_releases = []
-        pkg_arches = []
         pkgs_mapping = {}
         for package_info in packages_list:
             package = package_info["package"]
@@ -963,43 +1131,22 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
                 package["arch"],
             )
             pkgs_mapping[nevra] = package["full_name"]
-            for collection, key in (
-                (pkg_names, "name"),
-                (pkg_epochs, "epoch"),
-                (pkg_versions, "version"),
-                (pkg_releases, "release"),
-                (pkg_arches, "arch"),
-            ):
-                collection.append(package[key])
 
         packages_presence_info = defaultdict(list)
-        pulp_packages = get_rpm_packages_from_repositories(
-            repo_ids=list(repo_mapping),
-            pkg_names=pkg_names,
-            pkg_epochs=pkg_epochs,
-            pkg_versions=pkg_versions,
-            pkg_releases=pkg_releases,
-            pkg_arches=pkg_arches,
-        )
-        for pulp_pkg in pulp_packages:
-            full_name = pkgs_mapping.get(
-                PackageNevra(
-                    pulp_pkg.name,
-                    pulp_pkg.epoch,
-                    pulp_pkg.version,
-                    pulp_pkg.release,
-                    pulp_pkg.arch,
+        presence_rows = []
+        if pkgs_mapping:
+            presence_rows = (
+                await get_rpm_packages_presence_in_repositories_async(
+                    repo_ids=list(repo_mapping),
+                    pkg_nevras=list(pkgs_mapping),
                 )
             )
-            if full_name is None:
+        for pkg_href, nevra, repo_id in presence_rows:
+            full_name = pkgs_mapping.get(PackageNevra(*nevra))
+            repo_info = repo_mapping.get(repo_id)
+            if full_name is None or not repo_info:
                 continue
-            for repo_id in pulp_pkg.repo_ids:
-                repo_info = repo_mapping.get(repo_id)
-                if not repo_info:
-                    continue
-                packages_presence_info[full_name].append(
-                    (pulp_pkg.pulp_href, *repo_info),
-                )
+            packages_presence_info[full_name].append((pkg_href, *repo_info))
 
         packages_from_repos = defaultdict(list)
         packages_in_repos = defaultdict(list)
@@ -1310,24 +1457,43 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
                 prod_repos=prod_repos,
             )
 
+        platforms_list = base_platform.reference_platforms + [base_platform]
+        modules_arch_lists = []
         for module in pulp_rpm_modules:
-            module_name = module["name"]
-            module_stream = module["stream"]
             module_arch_list = [module["arch"]]
-            module_nvsca = (
-                f"{module_name}:{module['version']}:{module_stream}:"
-                f"{module['context']}:{module['arch']}"
-            )
             for strong_arch, weak_arches in strong_arches.items():
                 if module["arch"] in weak_arches:
                     module_arch_list.append(strong_arch)
-
-            platforms_list = base_platform.reference_platforms + [base_platform]
-            module_responses = await self._beholder_client.retrieve_responses(
+            modules_arch_lists.append(module_arch_list)
+        # Beholder lookups for every module and for source RPMs
+        # don't depend on each other, so we make them all at once
+        *modules_responses, beholder_responses = await asyncio.gather(
+            *(
+                self._beholder_client.retrieve_responses(
+                    platforms_list,
+                    module_name=module["name"],
+                    module_stream=module["stream"],
+                    module_arch_list=module_arch_list,
+                )
+                for module, module_arch_list in zip(
+                    pulp_rpm_modules, modules_arch_lists
+                )
+            ),
+            self._beholder_client.retrieve_responses(
                 platforms_list,
-                module_name=module_name,
-                module_stream=module_stream,
-                module_arch_list=module_arch_list,
+                data={
+                    "source_rpms": src_rpm_names,
+                    "match": BeholderMatchMethod.all(),
+                },
+            ),
+        )
+
+        for module, module_responses in zip(
+            pulp_rpm_modules, modules_responses
+        ):
+            module_nvsca = (
+                f"{module['name']}:{module['version']}:{module['stream']}:"
+                f"{module['context']}:{module['arch']}"
             )
             module_info = {"module": module, "repositories": []}
             if not module_responses:
@@ -1400,12 +1566,6 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
                     continue
                 module_info["repositories"].append(module_repo_dict)
 
-        platforms_list = base_platform.reference_platforms + [base_platform]
-        beholder_responses = await self._beholder_client.retrieve_responses(
-            platforms_list,
-            data={"source_rpms": src_rpm_names, "match": BeholderMatchMethod.all()},
-        )
-
         for beholder_response in beholder_responses:
             distr = beholder_response["distribution"]
             is_beta = distr["version"].endswith("-beta")
@@ -1577,32 +1737,42 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
                 "Cannot execute plan with empty packages or repositories: "
                 "{packages}, {repositories}".format_map(release.plan)
             )
+        verdicts = await sign_task.verify_signed_builds(
+            self.db, release.build_ids, release.platform.id
+        )
         for build_id in release.build_ids:
-            try:
-                verified = await sign_task.verify_signed_build(
-                    self.db, build_id, release.platform.id
+            error = verdicts[build_id]
+            if error is not None:
+                raise SignError(
+                    f"The build {build_id} was not verified, because\n{error}"
                 )
-            except (DataNotFoundError, ValueError, SignError) as e:
-                msg = f"The build {build_id} was not verified, because\n{e}"
-                raise SignError(msg)
-            if not verified:
-                msg = f"Cannot execute plan with wrong singing of {build_id}"
-                raise SignError(msg)
 
         # check packages presence in prod repos
         self.base_platform = release.platform
-        for pkg_dict in release.plan["packages"]:
-            package = pkg_dict["package"]
-            if self.codenotary_enabled:
-                authenticate_tasks.append(
-                    self.authenticate_package(package["sha256"])
-                )
-        (
-            pkgs_from_repos,
-            pkgs_in_repos,
-        ) = await self.check_packages_presence_in_prod_repositories(
-            release.plan["packages"],
-        )
+        authenticate_tasks = []
+        if self.codenotary_enabled:
+            # authentication runs in threads while we check the presence
+            authenticate_tasks = [
+                asyncio.ensure_future(self.authenticate_package(checksum))
+                for checksum in {
+                    pkg_dict["package"]["sha256"]
+                    for pkg_dict in release.plan["packages"]
+                }
+            ]
+        try:
+            (
+                pkgs_from_repos,
+                pkgs_in_repos,
+            ) = await self.check_packages_presence_in_prod_repositories(
+                release.plan["packages"],
+            )
+        except Exception:
+            # authentication results aren't needed anymore,
+            # but the tasks should be finished to not lose their errors
+            for task in authenticate_tasks:
+                task.cancel()
+            await asyncio.gather(*authenticate_tasks, return_exceptions=True)
+            raise
         release.plan["packages_from_repos"] = pkgs_from_repos
         release.plan["packages_in_repos"] = pkgs_in_repos
         if self.codenotary_enabled:
@@ -1665,14 +1835,9 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
                     )
                 repo_module_index = prod_repo_modules_cache.get(repo_url)
                 if repo_module_index is None:
-                    template = await self.pulp_client.get_repo_modules_yaml(
-                        repo_url
+                    repo_module_index = (
+                        await self.pulp_client.get_repo_modules_index(repo_url)
                     )
-                    repo_module_index = IndexWrapper()
-                    if template:
-                        repo_module_index = IndexWrapper.from_template(
-                            template
-                        )
                     prod_repo_modules_cache[repo_url] = repo_module_index
                 if repo_name not in packages_to_repo_layout:
                     packages_to_repo_layout[repo_name] = {}
@@ -1714,17 +1879,21 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
 
         modify_tasks = []
         publication_tasks = []
+        # debug repositories have their own names,
+        # so name and arch are enough to find a repository
+        repos_index = {
+            (repo.name, repo.arch): repo for repo in self.base_platform.repos
+        }
         for repository_name, arches in packages_to_repo_layout.items():
             for arch, packages in arches.items():
-                # TODO: we already have all repos in self.base_platform.repos,
-                #   we can store them in dict
-                #   for example: (repo_name, arch): repo
-                repo_q = select(models.Repository).where(
-                    models.Repository.name == repository_name,
-                    models.Repository.arch == arch,
-                )
-                repo_result = await self.db.execute(repo_q)
-                repo: models.Repository = repo_result.scalars().first()
+                repo = repos_index.get((repository_name, arch))
+                if not repo:
+                    repo_q = select(models.Repository).where(
+                        models.Repository.name == repository_name,
+                        models.Repository.arch == arch,
+                    )
+                    repo_result = await self.db.execute(repo_q)
+                    repo = repo_result.scalars().first()
                 if not repo:
                     raise MissingRepository(
                         f"Repository with name {repository_name} is missing "
@@ -1768,9 +1937,12 @@ class AlmaLinuxReleasePlanner(BaseReleasePlanner):
                 )
             )
         )
-        for albs_pkg in albs_pkgs.scalars().all():
+        albs_pkgs = albs_pkgs.scalars().all()
+        for albs_pkg in albs_pkgs:
             albs_pkg.status = ErrataPackageStatus.released
+        changed_records = await self.get_oval_changed_records(albs_pkgs)
         await self.db.commit()
+        await errata_crud.invalidate_oval_records(changed_records)
 
     @class_measure_work_time_async("update_release_plan")
     async def update_release_plan(
@@ -1,8 +1,10 @@
 import datetime
 import itertools
 import typing
+from contextlib import asynccontextmanager
 
-from fastapi import APIRouter, Depends, Response, status
+import aioredis
+from fastapi import APIRouter, Depends, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from alws import dramatiq
@@ -10,8 +12,9 @@ from alws.auth import get_current_user
 from alws.config import settings
 from alws.constants import BuildTaskRefType, BuildTaskStatus
 from alws.crud import build_node
-from alws.dependencies import get_db
+from alws.dependencies import get_db, get_redis
 from alws.schemas import build_node_schema
+from alws.utils.long_poll import wait_for_task
 
 router = APIRouter(
     prefix="/build_node",
@@ -21,13 +24,9 @@ router = APIRouter(
 
 
 @router.post("/ping")
-async def ping(
-    node_status: build_node_schema.Ping,
-    db: AsyncSession = Depends(get_db),
-):
-    if not node_status.active_tasks:
-        return {}
-    await build_node.ping_tasks(db, node_status.active_tasks)
+async def ping(node_status: build_node_schema.Ping):
+    # pings are buffered and flushed to the database periodically
+    build_node.ping_tasks(node_status.active_tasks)
     return {}
 
 
@@ -57,9 +56,26 @@ async def build_done(
 )
 async def get_task(
     request: build_node_schema.RequestTask,
-    db: AsyncSession = Depends(get_db),
+    timeout: int = Query(0, ge=0, le=settings.build_task_max_wait_timeout),
+    redis: aioredis.Redis = Depends(get_redis),
 ):
-    task = await build_node.get_available_build_task(db, request)
+    # a session is opened for each attempt, so waiting nodes
+    # don't hold database connections between them
+    async def get_available_build_task():
+        async with asynccontextmanager(get_db)() as db:
+            return await build_node.get_available_build_task(db, request)
+
+    # with timeout the request is blocked until a task
+    # for one of the supported arches is ready or the timeout expires
+    task = await wait_for_task(
+        redis,
+        [
+            build_node.BUILD_TASKS_CHANNEL.format(arch=arch)
+            for arch in request.supported_arches
+        ],
+        get_available_build_task,
+        timeout,
+    )
     if not task:
         return
     # generate full url to builted SRPM for using less memory in database
@@ -1,13 +1,14 @@
 from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from fastapi.responses import PlainTextResponse
+import aioredis
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from alws.auth import get_current_user
 from alws.constants import ErrataReleaseStatus
 from alws.crud import errata as errata_crud
-from alws.dependencies import get_db
+from alws.dependencies import get_db, get_redis
 from alws.dramatiq import bulk_errata_release, release_errata
 from alws.schemas import errata_schema
 
@@ -50,9 +51,27 @@ async def get_errata_record(
 @router.get("/get_oval_xml/", response_model=str)
 async def get_oval_xml(
     platform_name: str,
+    if_none_match: Annotated[Optional[str], Header()] = None,
     db: AsyncSession = Depends(get_db),
+    redis: aioredis.Redis = Depends(get_redis),
 ):
-    return await errata_crud.get_oval_xml(db, platform_name)
+    content, etag = await errata_crud.get_oval_xml(
+        db,
+        platform_name,
+        redis,
+        if_none_match=if_none_match,
+    )
+    headers = {"ETag": etag}
+    if content is None:
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=headers,
+        )
+    return StreamingResponse(
+        content,
+        media_type="application/json",
+        headers=headers,
+    )
 
 
 @router.get("/query/", response_model=errata_schema.ErrataListResponse)
@@ -2,15 +2,18 @@ import datetime
 import json
 import typing
 import uuid
+from contextlib import asynccontextmanager
 
 import aioredis
-from fastapi import APIRouter, Depends, WebSocket
+from fastapi import APIRouter, Depends, Query, WebSocket
 
 from alws import database, dramatiq
 from alws.auth import get_current_user
+from alws.config import settings
 from alws.crud import sign_task
 from alws.dependencies import get_db, get_redis
 from alws.schemas import sign_schema
+from alws.utils.long_poll import wait_for_task
 
 router = APIRouter(
     prefix='/sign-tasks',
@@ -45,9 +48,27 @@ async def create_sign_task(
     response_model=typing.Union[dict, sign_schema.AvailableSignTask],
 )
 async def get_available_sign_task(
-    payload: sign_schema.SignTaskGet, db: database.Session = Depends(get_db)
+    payload: sign_schema.SignTaskGet,
+    timeout: int = Query(0, ge=0, le=settings.sign_task_max_wait_timeout),
+    redis: aioredis.Redis = Depends(get_redis),
 ):
-    result = await sign_task.get_available_sign_task(db, payload.key_ids)
+    # a session is opened for each attempt, so waiting nodes
+    # don't hold database connections between them
+    async def get_available_sign_task():
+        async with asynccontextmanager(get_db)() as db:
+            return await sign_task.get_available_sign_task(db, payload.key_ids)
+
+    # with timeout the request is blocked until a task
+    # with one of the keys is created or the timeout expires
+    result = await wait_for_task(
+        redis,
+        [
+            sign_task.SIGN_TASKS_CHANNEL.format(keyid=keyid)
+            for keyid in payload.key_ids
+        ],
+        get_available_sign_task,
+        timeout,
+    )
     if any([
         not result.get(item)
         for item in ['build_id', 'id', 'keyid', 'packages']
@@ -128,8 +149,20 @@ async def iter_sync_sign_tasks(
     '/community/get_gen_sign_key_task/',
     response_model=typing.Union[dict, sign_schema.AvailableGenKeyTask],
 )
-async def get_avaiable_gen_key_task(db: database.Session = Depends(get_db)):
-    gen_key_task = await sign_task.get_available_gen_key_task(db)
+async def get_avaiable_gen_key_task(
+    timeout: int = Query(0, ge=0, le=settings.sign_task_max_wait_timeout),
+    redis: aioredis.Redis = Depends(get_redis),
+):
+    async def get_available_gen_key_task():
+        async with asynccontextmanager(get_db)() as db:
+            return await sign_task.get_available_gen_key_task(db)
+
+    gen_key_task = await wait_for_task(
+        redis,
+        [sign_task.GEN_KEY_TASKS_CHANNEL],
+        get_available_gen_key_task,
+        timeout,
+    )
     if gen_key_task:
         return {
             'id': gen_key_task.id,
@@ -1,10 +1,20 @@
 import asyncio
 
 
-async def gather_with_concurrency(n, *coroutines):
+def limit_concurrency(n, *coroutines):
     semaphore = asyncio.Semaphore(n)
 
     async def sem_coro(coro):
-        async with semaphore:
-            return await coro
-    return await asyncio.gather(*(sem_coro(c) for c in coroutines))
+        try:
+            async with semaphore:
+                return await coro
+        finally:
+            # coroutines cancelled before they were started
+            # shouldn't be reported as never awaited
+            coro.close()
+
+    return [sem_coro(c) for c in coroutines]
+
+
+async def gather_with_concurrency(n, *coroutines):
+    return await asyncio.gather(*limit_concurrency(n, *coroutines))
@@ -1,15 +1,45 @@
+import asyncio
 import copy
+import hashlib
 import json
 import logging
 import typing
 import urllib.parse
+import weakref
 
 import aiohttp
 
+from alws.config import settings
 from alws.constants import REQUEST_TIMEOUT, LOWEST_PRIORITY
 from alws.models import Platform
+from alws.utils.cache import TTLCache
 from alws.utils.parsing import get_clean_distr_name
 
+# aiohttp sessions are bound to the event loop they were created in,
+# so we keep one long-lived connection pool per event loop
+BEHOLDER_SESSIONS = weakref.WeakKeyDictionary()
+# Raw Beholder responses keyed by request, the same builds are looked up
+# many times during release planning and multilib processing
+BEHOLDER_RESPONSES_CACHE = TTLCache(
+    settings.beholder_cache_size,
+    settings.beholder_cache_ttl,
+)
+
+
+def get_beholder_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = BEHOLDER_SESSIONS.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(raise_for_status=True)
+        BEHOLDER_SESSIONS[loop] = session
+    return session
+
+
+async def close_beholder_session():
+    session = BEHOLDER_SESSIONS.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
 
 class BeholderClient:
     def __init__(
@@ -54,17 +84,25 @@ class BeholderClient:
         endpoints: typing.Iterable[str],
         data: typing.Optional[typing.Union[dict, list]] = None,
     ) -> typing.AsyncIterable[dict]:
-        for endpoint in endpoints:
-            try:
-                coro = self.get(endpoint)
-                if data:
-                    coro = self.post(endpoint, data)
-                yield await coro
-            except Exception:
+        async def retrieve(endpoint: str):
+            if data:
+                return await self.post(endpoint, data)
+            return await self.get(endpoint)
+
+        endpoints = list(endpoints)
+        results = await asyncio.gather(
+            *(retrieve(endpoint) for endpoint in endpoints),
+            return_exceptions=True,
+        )
+        for endpoint, result in zip(endpoints, results):
+            if isinstance(result, Exception):
                 logging.error(
-                    "Cannot retrieve beholder info, "
-                    "trying next reference platform"
+                    "Cannot retrieve beholder info from %s, "
+                    "trying next reference platform",
+                    endpoint,
                 )
+                continue
+            yield result
 
     async def retrieve_responses(
         self,
@@ -136,43 +174,59 @@ class BeholderClient:
                 pass
         return result
 
-    async def get(
+    async def _request(
         self,
+        method: str,
         endpoint: str,
         headers: typing.Optional[dict] = None,
         params: typing.Optional[dict] = None,
+        data: typing.Optional[typing.Union[dict, list]] = None,
     ):
         req_headers = self._headers.copy()
         if headers:
             req_headers.update(**headers)
         full_url = self._get_url(endpoint)
-        async with aiohttp.ClientSession(
-            headers=req_headers,
-            raise_for_status=True,
-        ) as session:
-            async with session.get(
+        cache_key = (
+            method,
+            full_url,
+            hashlib.sha256(
+                json.dumps(
+                    [sorted(req_headers.items()), params, data],
+                    sort_keys=True,
+                ).encode()
+            ).hexdigest(),
+        )
+        content = BEHOLDER_RESPONSES_CACHE.get(cache_key)
+        if content is None:
+            async with get_beholder_session().request(
+                method,
                 full_url,
+                headers=req_headers,
                 params=params,
+                json=data,
                 timeout=self.__timeout,
             ) as response:
-                data = await response.read()
-                json_data = json.loads(data)
-                return json_data
+                content = await response.read()
+            BEHOLDER_RESPONSES_CACHE.put(cache_key, content)
+        # responses are parsed on every call, so callers can modify them
+        return json.loads(content)
+
+    async def get(
+        self,
+        endpoint: str,
+        headers: typing.Optional[dict] = None,
+        params: typing.Optional[dict] = None,
+    ):
+        return await self._request(
+            "GET",
+            endpoint,
+            headers=headers,
+            params=params,
+        )
 
     async def post(
         self,
         endpoint: str,
         data: typing.Union[dict, list],
     ):
-        async with aiohttp.ClientSession(
-            headers=self._headers,
-            raise_for_status=True,
-        ) as session:
-            async with session.post(
-                self._get_url(endpoint),
-                json=data,
-                timeout=self.__timeout,
-            ) as response:
-                content = await response.read()
-                json_data = json.loads(content)
-                return json_data
+        return await self._request("POST", endpoint, data=data)
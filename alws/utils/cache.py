@@ -0,0 +1,80 @@
+import collections
+import time
+import typing
+
+
+class LRUCache:
+    """
+    Size bounded cache which evicts the least recently used entries
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_entry(self, key: typing.Any) -> typing.Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def get(
+        self,
+        key: typing.Any,
+        validate: typing.Optional[typing.Callable[[typing.Any], bool]] = None,
+    ) -> typing.Any:
+        """
+        Returns the cached entry, entries rejected by `validate`
+        are treated as missing
+        """
+        entry = self._get_entry(key)
+        if entry is None or (validate is not None and not validate(entry)):
+            self.misses += 1
+            return
+        self.hits += 1
+        return entry
+
+    def put(self, key: typing.Any, entry: typing.Any):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: typing.Any):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> typing.Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class TTLCache(LRUCache):
+    """
+    LRU cache which entries expire after `ttl` seconds
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        super().__init__(max_size)
+        self.ttl = ttl
+
+    def _get_entry(self, key: typing.Any) -> typing.Any:
+        entry = super()._get_entry(key)
+        if entry is None:
+            return
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self.pop(key)
+            return
+        return value
+
+    def put(self, key: typing.Any, entry: typing.Any):
+        super().put(key, (time.monotonic() + self.ttl, entry))
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+import typing
+
+import aioredis
+
+from alws.config import settings
+
+__all__ = [
+    'notify_task_available',
+    'wait_for_task',
+]
+
+
+async def notify_task_available(*channels: str):
+    """
+    Wakes up nodes waiting for tasks on the channels. Nodes still fetch
+    the task from the database, so a lost notification only delays it.
+    """
+    if not channels:
+        return
+    redis = aioredis.from_url(settings.redis_url)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for channel in channels:
+                pipe.publish(channel, '')
+            await pipe.execute()
+    except Exception:
+        logging.exception('Cannot notify nodes waiting on %s', channels)
+    finally:
+        await redis.close()
+
+
+async def wait_for_task(
+    redis: aioredis.Redis,
+    channels: typing.List[str],
+    get_task: typing.Callable[[], typing.Awaitable[typing.Any]],
+    timeout: float,
+    retry_interval: typing.Optional[float] = None,
+) -> typing.Any:
+    """
+    Returns the result of get_task(), retrying it every time
+    a notification arrives to one of the channels or retry_interval
+    passes until the result is not empty or the timeout expires.
+    """
+    if retry_interval is None:
+        retry_interval = settings.long_poll_retry_interval
+    if not timeout or not channels:
+        return await get_task()
+    deadline = time.monotonic() + timeout
+    pubsub = redis.pubsub()
+    try:
+        # subscribe before the first try to not miss tasks
+        # created in between
+        subscribed = await _subscribe(pubsub, channels)
+        task = await get_task()
+        # tasks can become available without notifications,
+        # e.g. expired ones, so they are retried periodically as well
+        next_retry = time.monotonic() + retry_interval
+        while not task:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wait_time = min(deadline, next_retry) - now
+            message = None
+            if subscribed:
+                try:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True,
+                        timeout=wait_time,
+                    )
+                except aioredis.RedisError:
+                    logging.exception(
+                        'Cannot wait for notifications on %s, '
+                        'polling for tasks instead',
+                        channels,
+                    )
+                    subscribed = False
+                    continue
+            else:
+                await asyncio.sleep(wait_time)
+            if message is None and time.monotonic() < next_retry:
+                continue
+            task = await get_task()
+            next_retry = time.monotonic() + retry_interval
+        return task
+    finally:
+        await pubsub.close()
+
+
+async def _subscribe(
+    pubsub: aioredis.client.PubSub,
+    channels: typing.List[str],
+) -> bool:
+    # nodes are still given tasks without Redis, just not as soon
+    # as they are available, like when notifications are lost
+    try:
+        await pubsub.subscribe(*channels)
+    except aioredis.RedisError:
+        logging.exception(
+            'Cannot subscribe to %s, polling for tasks instead',
+            channels,
+        )
+        return False
+    return True
@@ -18,7 +18,7 @@ from alws.utils.modularity import IndexWrapper
 from alws.utils.parsing import get_clean_distr_name
 from alws.utils.pulp_client import PulpClient
 from alws.utils.pulp_utils import (
-    get_rpm_packages_by_ids,
+    get_rpm_packages_by_ids_async,
     get_uuid_from_pulp_href,
 )
 
@@ -244,7 +244,7 @@ class MultilibProcessor:
         db_artifacts = await get_build_task_artifacts(
             self._db, self._build_task
         )
-        pulp_packages = self.get_packages_info_from_pulp(db_artifacts)
+        pulp_packages = await self.get_packages_info_from_pulp(db_artifacts)
         for artifact in db_artifacts:
             href = artifact.href
             rpm_pkg = pulp_packages[artifact.href]
@@ -291,11 +291,11 @@ class MultilibProcessor:
             ),
         )
 
-    def get_packages_info_from_pulp(
+    async def get_packages_info_from_pulp(
         self,
         rpm_packages: typing.List[models.BuildTaskArtifact],
     ) -> typing.Dict[str, RpmPackage]:
-        return get_rpm_packages_by_ids(
+        return await get_rpm_packages_by_ids_async(
             [get_uuid_from_pulp_href(rpm.href) for rpm in rpm_packages],
             [
                 RpmPackage.content_ptr_id,
@@ -358,12 +358,10 @@ class MultilibProcessor:
                     packages_to_process[artifact["name"]] = package
 
         try:
-            packages = [
-                pkg.as_dict()
-                for pkg in self.get_packages_info_from_pulp(
-                    packages_to_process.values()
-                ).values()
-            ]
+            pulp_packages = await self.get_packages_info_from_pulp(
+                packages_to_process.values()
+            )
+            packages = [pkg.as_dict() for pkg in pulp_packages.values()]
             module_name = self._build_task.rpm_module.name
             module_stream = self._build_task.rpm_module.stream
             await self.update_module_index(
@@ -5,8 +5,10 @@ import logging
 import math
 import re
 import os
+import time
 import typing
 import urllib.parse
+import weakref
 from typing import (
     Any,
     Dict,
@@ -18,12 +20,169 @@ from aiohttp.client_exceptions import ClientResponseError
 from fastapi import status
 from aiohttp_retry import RetryClient, ExponentialRetry
 
+from alws.config import settings
 from alws.constants import UPLOAD_FILE_CHUNK_SIZE
+from alws.utils.cache import LRUCache
 from alws.utils.file_utils import hash_content, hash_file
 from alws.utils.ids import get_random_unique_version
+from alws.utils.modularity import IndexWrapper
+
+
+PULP_READ_OPERATION = "read"
+PULP_CONTENT_OPERATION = "content"
+PULP_REPOSITORY_OPERATION = "repository"
+PULP_TASK_POLL_OPERATION = "task_poll"
+PULP_TASK_FINAL_STATES = ("failed", "completed", "canceled")
+PULP_TASKS_POLL_CHUNK_SIZE = 50
+# aiohttp sessions are bound to the event loop they were created in,
+# so we keep one long-lived connection pool per event loop
+PULP_SESSIONS = weakref.WeakKeyDictionary()
+
+
+def get_pulp_session() -> aiohttp.ClientSession:
+    loop = asyncio.get_running_loop()
+    session = PULP_SESSIONS.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=settings.pulp_connections_limit,
+            limit_per_host=settings.pulp_connections_limit_per_host,
+            keepalive_timeout=settings.pulp_keepalive_timeout,
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        PULP_SESSIONS[loop] = session
+    return session
+
+
+async def close_pulp_session():
+    session = PULP_SESSIONS.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+class PulpLimiter:
+    """
+    Limits concurrency of one class of Pulp operations and collects
+    queue depth and wait time statistics for it
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.acquired = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
 
+    async def __aenter__(self):
+        wait_time = 0.0
+        if self._semaphore.locked():
+            self.queue_depth += 1
+            self.max_queue_depth = max(
+                self.max_queue_depth, self.queue_depth
+            )
+            start = time.monotonic()
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.queue_depth -= 1
+            wait_time = time.monotonic() - start
+        else:
+            await self._semaphore.acquire()
+        self.acquired += 1
+        self.in_flight += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "acquired": self.acquired,
+            "avg_wait_time": (
+                self.total_wait_time / self.acquired if self.acquired else 0.0
+            ),
+            "max_wait_time": self.max_wait_time,
+        }
 
-PULP_SEMAPHORE = asyncio.Semaphore(5)
+
+# asyncio.Semaphore is bound to the event loop on python 3.9,
+# so limiters are created lazily for every event loop as well
+PULP_LIMITERS = weakref.WeakKeyDictionary()
+PULP_LIMITS_OVERRIDES = {}
+
+
+def get_pulp_limits() -> Dict[str, int]:
+    limits = {
+        PULP_READ_OPERATION: settings.pulp_read_concurrency,
+        PULP_CONTENT_OPERATION: settings.pulp_content_concurrency,
+        PULP_REPOSITORY_OPERATION: settings.pulp_repository_concurrency,
+        PULP_TASK_POLL_OPERATION: settings.pulp_task_poll_concurrency,
+    }
+    limits.update(PULP_LIMITS_OVERRIDES)
+    return limits
+
+
+def configure_pulp_limiters(limit: typing.Optional[int] = None, **limits):
+    """
+    Overrides Pulp concurrency limits from settings.
+    `limit` is applied to every operation, keyword arguments
+    override limits for specific operations, e.g. `read=20`.
+    """
+    if limit is not None:
+        PULP_LIMITS_OVERRIDES.update(
+            {operation: limit for operation in get_pulp_limits()}
+        )
+    PULP_LIMITS_OVERRIDES.update(limits)
+    PULP_LIMITERS.clear()
+
+
+def get_pulp_limiter(operation: str) -> PulpLimiter:
+    loop = asyncio.get_running_loop()
+    limiters = PULP_LIMITERS.get(loop)
+    if limiters is None:
+        limiters = {
+            name: PulpLimiter(name, limit)
+            for name, limit in get_pulp_limits().items()
+        }
+        PULP_LIMITERS[loop] = limiters
+    return limiters[operation]
+
+
+def get_pulp_limiters_stats() -> Dict[str, Dict[str, Any]]:
+    limiters = PULP_LIMITERS.get(asyncio.get_running_loop(), {})
+    return {name: limiter.get_stats() for name, limiter in limiters.items()}
+
+
+def get_pulp_operation(method: str, endpoint: str) -> str:
+    path = urllib.parse.urlsplit(endpoint).path
+    if method.upper() == "GET":
+        if "/tasks/" in path:
+            return PULP_TASK_POLL_OPERATION
+        return PULP_READ_OPERATION
+    if any(
+        part in path for part in ("/content/", "/artifacts/", "/uploads/")
+    ):
+        return PULP_CONTENT_OPERATION
+    return PULP_REPOSITORY_OPERATION
+
+
+# modules.yaml files keyed by repository URL. Entries are revalidated
+# on every access with a conditional repomd.xml request and modules.yaml
+# is downloaded again only when its location in repomd.xml changes,
+# the location contains the checksum of the file
+PULP_MODULES_YAML_CACHE = LRUCache(settings.pulp_modules_yaml_cache_size)
+# Parsed modules.yaml files keyed by repository URL
+PULP_MODULES_INDEX_CACHE = LRUCache(settings.pulp_modules_yaml_cache_size)
 
 
 class PulpClient:
@@ -337,21 +496,77 @@ class PulpClient:
 
         return reference, sha256
 
-    async def get_repo_modules_yaml(self, url: str):
+    async def _get_repo_modules_entry(
+        self,
+        url: str,
+    ) -> typing.Optional[Dict[str, Any]]:
+        entry = PULP_MODULES_YAML_CACHE.get(url)
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
         repomd_url = urllib.parse.urljoin(url, "repodata/repomd.xml")
-        async with aiohttp.ClientSession(auth=self._auth) as session:
-            async with session.get(repomd_url) as response:
-                repomd_xml = await response.text()
-                response.raise_for_status()
-            res = re.search(r"repodata/[\w\d]+-modules.yaml", repomd_xml)
-            if not res:
-                return
-            modules_path = res.group()
-            modules_url = urllib.parse.urljoin(url, modules_path)
-            async with session.get(modules_url) as response:
-                modules_yaml = await response.text()
-                response.raise_for_status()
-                return modules_yaml
+        session = get_pulp_session()
+        async with session.get(
+            repomd_url, auth=self._auth, headers=headers
+        ) as response:
+            if entry is not None and response.status == 304:
+                return entry
+            repomd_xml = await response.text()
+            response.raise_for_status()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+        res = re.search(r"repodata/[\w\d]+-modules.yaml", repomd_xml)
+        if not res:
+            PULP_MODULES_YAML_CACHE.pop(url)
+            return
+        modules_path = res.group()
+        if entry is not None and entry["modules_path"] == modules_path:
+            entry["etag"] = etag
+            entry["last_modified"] = last_modified
+            return entry
+        modules_url = urllib.parse.urljoin(url, modules_path)
+        async with session.get(modules_url, auth=self._auth) as response:
+            modules_yaml = await response.text()
+            response.raise_for_status()
+        entry = {
+            "modules_path": modules_path,
+            "etag": etag,
+            "last_modified": last_modified,
+            "modules_yaml": modules_yaml,
+        }
+        PULP_MODULES_YAML_CACHE.put(url, entry)
+        return entry
+
+    async def get_repo_modules_yaml(self, url: str):
+        entry = await self._get_repo_modules_entry(url)
+        if entry is None:
+            return
+        return entry["modules_yaml"]
+
+    async def get_repo_modules_index(self, url: str) -> IndexWrapper:
+        """
+        Returns parsed modules.yaml of the repository.
+        The index is shared between callers, so it must not be modified,
+        use get_repo_modules_yaml to get an index that can be changed.
+        """
+        modules_yaml = await self.get_repo_modules_yaml(url)
+        if not modules_yaml:
+            PULP_MODULES_INDEX_CACHE.pop(url)
+            return IndexWrapper()
+        entry = PULP_MODULES_INDEX_CACHE.get(
+            url,
+            validate=lambda entry: entry["modules_yaml"] == modules_yaml,
+        )
+        if entry is not None:
+            return entry["index"]
+        index = IndexWrapper.from_template(modules_yaml)
+        PULP_MODULES_INDEX_CACHE.put(
+            url, {"modules_yaml": modules_yaml, "index": index}
+        )
+        return index
 
     def begin(self):
         return self
@@ -373,14 +588,19 @@ class PulpClient:
         pass
 
     async def commit(self):
+        # Modifications are sent once, so committing again
+        # on the transaction exit is a no-op
+        modifications = self._current_transaction
+        self._current_transaction = {}
         tasks = []
-        for repo, payload in self._current_transaction.items():
+        for repo, payload in modifications.items():
             tasks.append(
-                self._modify_repository(
+                self._start_repository_modification(
                     repo, list(payload["add"]), list(payload["remove"])
                 )
             )
-        await asyncio.gather(*tasks)
+        tasks = await asyncio.gather(*tasks)
+        await self.wait_for_tasks([task["task"] for task in tasks])
 
     async def _update_transaction(
         self, repo_to: str, add: List[str] = None, remove: List[str] = None
@@ -390,26 +610,36 @@ class PulpClient:
                 "add": set(),
                 "remove": set(),
             }
-        self._current_transaction[repo_to]["add"].update(add or [])
-        self._current_transaction[repo_to]["remove"].update(remove or [])
-
-    async def _modify_repository(
+        # Pulp applies removals before additions within one modification,
+        # so a removal cancels a pending addition of the same content
+        # to keep the result equal to sequential modifications
+        payload = self._current_transaction[repo_to]
+        payload["add"].difference_update(remove or [])
+        payload["remove"].update(remove or [])
+        payload["add"].update(add or [])
+
+    async def _start_repository_modification(
         self, repo_to: str, add: List[str] = None, remove: List[str] = None
-    ):
+    ) -> Dict[str, Any]:
         ENDPOINT = urllib.parse.urljoin(repo_to, "modify/")
         payload = {}
         if add:
             payload["add_content_units"] = add
         if remove:
             payload["remove_content_units"] = remove
-        task = await self.request("POST", ENDPOINT, json=payload)
+        return await self.request("POST", ENDPOINT, json=payload)
+
+    async def _modify_repository(
+        self, repo_to: str, add: List[str] = None, remove: List[str] = None
+    ):
+        task = await self._start_repository_modification(repo_to, add, remove)
         response = await self.wait_for_task(task["task"])
         return response
 
     async def modify_repository(
         self, repo_to: str, add: List[str] = None, remove: List[str] = None
     ) -> Dict[str, Any]:
-        if self._current_transaction:
+        if self._current_transaction is not None:
             return await self._update_transaction(repo_to, add, remove)
         return await self._modify_repository(repo_to, add, remove)
 
@@ -803,32 +1033,89 @@ class PulpClient:
     async def get_distro(self, distro_href: str):
         return await self.request("GET", distro_href)
 
-    async def create_entity(self, artifact):
+    async def create_entity(self, artifact, include_sha256: bool = True):
         if artifact.type == "rpm":
             entity_href = await self.create_rpm_package(artifact.name, artifact.href)
         else:
             entity_href = await self.create_file(artifact.name, artifact.href)
+        if not include_sha256:
+            return entity_href, None, artifact
         info = await self.get_artifact(entity_href, include_fields=["sha256"])
         return entity_href, info["sha256"], artifact
 
+    @staticmethod
+    def _iter_poll_intervals() -> typing.Iterator[float]:
+        # Pulp tasks usually finish in less than a second, so we start
+        # polling fast and back off exponentially up to the cap
+        interval = settings.pulp_task_poll_min_interval
+        while True:
+            yield interval
+            interval = min(interval * 2, settings.pulp_task_poll_max_interval)
+
+    @staticmethod
+    def _check_task_state(task: Dict[str, Any]):
+        if task["state"] != "failed":
+            return
+        error = task.get("error")
+        error_msg = ""
+        if error:
+            description = error.get("description", "")
+            traceback = error.get("traceback", "")
+            if description:
+                error_msg += f"\nDescription: {description}"
+            if traceback:
+                error_msg += f"\nPulp traceback:\n{traceback}"
+        raise Exception(f"Task {task['pulp_href']} has failed{error_msg}")
+
     async def wait_for_task(self, task_href: str):
         task = await self.request("GET", task_href)
-        while task["state"] not in ("failed", "completed"):
-            await asyncio.sleep(5)
+        poll_intervals = self._iter_poll_intervals()
+        while task["state"] not in PULP_TASK_FINAL_STATES:
+            await asyncio.sleep(next(poll_intervals))
             task = await self.request("GET", task_href)
-        if task["state"] == "failed":
-            error = task.get("error")
-            error_msg = ""
-            if error:
-                description = error.get("description", "")
-                traceback = error.get("traceback", "")
-                if description:
-                    error_msg += f"\nDescription: {description}"
-                if traceback:
-                    error_msg += f"\nPulp traceback:\n{traceback}"
-            raise Exception(f"Task {task['pulp_href']} has failed{error_msg}")
+        self._check_task_state(task)
         return task
 
+    async def wait_for_tasks(
+        self,
+        task_hrefs: List[str],
+    ) -> List[Dict[str, Any]]:
+        """
+        Waits for many Pulp tasks at once, polling all unfinished tasks
+        with a single tasks/?pulp_href__in= query per chunk
+        """
+        finished_tasks = {}
+        pending_hrefs = list(dict.fromkeys(task_hrefs))
+        poll_intervals = self._iter_poll_intervals()
+        while pending_hrefs:
+            for i in range(0, len(pending_hrefs), PULP_TASKS_POLL_CHUNK_SIZE):
+                chunk = pending_hrefs[i : i + PULP_TASKS_POLL_CHUNK_SIZE]
+                tasks = await self.__get_entities(
+                    "pulp/api/v3/tasks/",
+                    pulp_href__in=",".join(chunk),
+                    limit=len(chunk),
+                )
+                # tasks which Pulp doesn't know would be polled forever
+                missing_hrefs = set(chunk).difference(
+                    task["pulp_href"] for task in tasks
+                )
+                if missing_hrefs:
+                    raise Exception(
+                        f"Tasks {', '.join(sorted(missing_hrefs))} "
+                        "are not found in Pulp"
+                    )
+                for task in tasks:
+                    if task["state"] not in PULP_TASK_FINAL_STATES:
+                        continue
+                    self._check_task_state(task)
+                    finished_tasks[task["pulp_href"]] = task
+            pending_hrefs = [
+                href for href in pending_hrefs if href not in finished_tasks
+            ]
+            if pending_hrefs:
+                await asyncio.sleep(next(poll_intervals))
+        return [finished_tasks[href] for href in task_hrefs]
+
     async def list_updateinfo_records(
         self, id__in: List[str], repository_version: typing.Optional[str] = None
     ):
@@ -838,21 +1125,27 @@ class PulpClient:
             payload["repository_version"] = repository_version
         return (await self.request("GET", endpoint, params=payload))["results"]
 
-    async def add_errata_record(self, record: dict, repo_href: str):
+    async def _start_errata_record_upload(
+        self, record: dict, repo_href: str
+    ) -> Dict[str, Any]:
         endpoint = "pulp/api/v3/content/rpm/advisories/"
         payload = {
             "file": io.StringIO(json.dumps(record)),
             "repository": repo_href,
         }
-        task = await self.request("POST", endpoint, data=payload)
+        return await self.request("POST", endpoint, data=payload)
+
+    async def add_errata_record(self, record: dict, repo_href: str):
+        task = await self._start_errata_record_upload(record, repo_href)
         response = await self.wait_for_task(task["task"])
         return response
 
     async def add_errata_records(self, records: List[dict], repo_href: str):
         tasks = []
         for record in records:
-            tasks.append(self.add_errata_record(record, repo_href))
-        await asyncio.gather(*tasks)
+            tasks.append(self._start_errata_record_upload(record, repo_href))
+        tasks = await asyncio.gather(*tasks)
+        await self.wait_for_tasks([task["task"] for task in tasks])
 
     async def request(
         self,
@@ -869,22 +1162,26 @@ class PulpClient:
             full_url = endpoint
         else:
             full_url = urllib.parse.urljoin(self._host, endpoint)
-        async with PULP_SEMAPHORE:
+        session = get_pulp_session()
+        async with get_pulp_limiter(get_pulp_operation(method, full_url)):
             if method.lower() == "get":
-                async with RetryClient(retry_options=self._retry_options) as client:
-                    response = await client.get(
-                        full_url,
-                        params=params,
-                        json=json,
-                        data=data,
-                        headers=headers,
-                        auth=self._auth,
-                    )
+                client = RetryClient(
+                    client_session=session,
+                    retry_options=self._retry_options,
+                )
+                async with client.get(
+                    full_url,
+                    params=params,
+                    json=json,
+                    data=data,
+                    headers=headers,
+                    auth=self._auth,
+                ) as response:
                     if raw:
                         return {"result": await response.text()}
                     response_json = await response.json()
             else:
-                async with aiohttp.request(
+                async with session.request(
                     method,
                     full_url,
                     params=params,
@@ -1,10 +1,12 @@
+import asyncio
 import typing
 import uuid
 
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import joinedload, load_only
+from sqlalchemy.sql import Select
 
-from alws.dependencies import get_pulp_db
+from alws.dependencies import get_async_pulp_db, get_pulp_db
 from alws.pulp_models import (
     CoreArtifact,
     CoreContent,
@@ -16,6 +18,9 @@ from alws.pulp_models import (
 from alws.utils.modularity import IndexWrapper, get_modules_yaml_from_repo
 from alws.utils.parsing import parse_rpm_nevra
 
+RPM_PACKAGES_PRESENCE_CHUNK_SIZE = 5000
+RPM_PACKAGES_BY_IDS_CHUNK_SIZE = 10000
+
 
 def get_uuid_from_pulp_href(pulp_href: str) -> uuid.UUID:
     return uuid.UUID(pulp_href.split("/")[-2])
@@ -24,38 +29,16 @@ def get_uuid_from_pulp_href(pulp_href: str) -> uuid.UUID:
 # TODO: After ALBS-1012 is fixed, we can refactor this function
 # to get module packages from pulp without having to grab the actual
 # modules.yaml file from the repository
-def get_rpm_module_packages_from_repository(
+def _get_rpm_module_packages_query(
     repo_id: uuid.UUID,
+    repo_modules_yaml: typing.Optional[str],
     module: str,
     pkg_names: typing.Optional[typing.List[str]] = None,
     pkg_versions: typing.Optional[typing.List[str]] = None,
     pkg_epochs: typing.Optional[typing.List[str]] = None,
-) -> typing.List[RpmPackage]:
-    result = []
-    repo_query = select(CoreRepository).where(
-        CoreRepository.pulp_id == repo_id
-    )
-    with get_pulp_db() as pulp_db:
-        repo = pulp_db.execute(repo_query).scalars().first()
-        repo_name = repo.name
-
-    if not repo_name:
-        return []
-
-    # TODO: Getting modules.yaml files from BS production repos is not right.
-    # The problem here is that we need a way to get packages from
-    # the provided module:stream, and pulp actually doesn't have an artifact
-    # for it. This is a side effect of our current modules workflow.
-    # When building/releasing/publishing modules, we don't actually get
-    # them added into pulp, and we should do it.
-    # At this moment, we can only trust the modules that are in production
-    # repositories.
-    try:
-        repo_modules_yaml = get_modules_yaml_from_repo(repo_name)
-    except Exception:
-        return result
+) -> typing.Optional[Select]:
     if not repo_modules_yaml:
-        return result
+        return
 
     module_name, module_stream = module.split(":")
     devel_module_name = (
@@ -65,7 +48,7 @@ def get_rpm_module_packages_from_repository(
     try:
         repo_index = IndexWrapper.from_template(repo_modules_yaml)
     except Exception:
-        return result
+        return
     for repo_module in repo_index.iter_modules():
         if (
             repo_module.name not in (module_name, devel_module_name)
@@ -74,7 +57,7 @@ def get_rpm_module_packages_from_repository(
             continue
         repo_modules.append(repo_module)
     if not repo_modules:
-        return result
+        return
 
     pkg_releases = []
     for repo_module in repo_modules:
@@ -95,7 +78,7 @@ def get_rpm_module_packages_from_repository(
     first_subq = (
         select(CoreRepositoryContent.content_id)
         .where(
-            CoreRepositoryContent.repository_id == repo.pulp_id,
+            CoreRepositoryContent.repository_id == repo_id,
             CoreRepositoryContent.version_removed_id.is_(None),
         )
         .scalar_subquery()
@@ -116,20 +99,95 @@ def get_rpm_module_packages_from_repository(
         ]
     )
 
-    query = select(RpmPackage).where(*conditions)
+    return select(RpmPackage).where(*conditions)
+
+
+def _get_modules_yaml(repo_name: str) -> typing.Optional[str]:
+    # TODO: Getting modules.yaml files from BS production repos is not right.
+    # The problem here is that we need a way to get packages from
+    # the provided module:stream, and pulp actually doesn't have an artifact
+    # for it. This is a side effect of our current modules workflow.
+    # When building/releasing/publishing modules, we don't actually get
+    # them added into pulp, and we should do it.
+    # At this moment, we can only trust the modules that are in production
+    # repositories.
+    try:
+        return get_modules_yaml_from_repo(repo_name)
+    except Exception:
+        return
+
+
+def get_rpm_module_packages_from_repository(
+    repo_id: uuid.UUID,
+    module: str,
+    pkg_names: typing.Optional[typing.List[str]] = None,
+    pkg_versions: typing.Optional[typing.List[str]] = None,
+    pkg_epochs: typing.Optional[typing.List[str]] = None,
+) -> typing.List[RpmPackage]:
+    repo_query = select(CoreRepository.name).where(
+        CoreRepository.pulp_id == repo_id
+    )
     with get_pulp_db() as pulp_db:
-        result = pulp_db.execute(query).scalars().all()
-    return result
+        repo_name = pulp_db.execute(repo_query).scalars().first()
 
+    if not repo_name:
+        return []
 
-def get_rpm_packages_from_repositories(
+    query = _get_rpm_module_packages_query(
+        repo_id,
+        _get_modules_yaml(repo_name),
+        module,
+        pkg_names=pkg_names,
+        pkg_versions=pkg_versions,
+        pkg_epochs=pkg_epochs,
+    )
+    if query is None:
+        return []
+    with get_pulp_db() as pulp_db:
+        return pulp_db.execute(query).scalars().all()
+
+
+async def get_rpm_module_packages_from_repository_async(
+    repo_id: uuid.UUID,
+    module: str,
+    pkg_names: typing.Optional[typing.List[str]] = None,
+    pkg_versions: typing.Optional[typing.List[str]] = None,
+    pkg_epochs: typing.Optional[typing.List[str]] = None,
+) -> typing.List[RpmPackage]:
+    repo_query = select(CoreRepository.name).where(
+        CoreRepository.pulp_id == repo_id
+    )
+    async with get_async_pulp_db() as pulp_db:
+        repo_name = (await pulp_db.execute(repo_query)).scalars().first()
+
+    if not repo_name:
+        return []
+
+    # modules.yaml is downloaded with blocking requests,
+    # so we do it in a thread to keep the event loop free
+    repo_modules_yaml = await asyncio.to_thread(_get_modules_yaml, repo_name)
+    query = _get_rpm_module_packages_query(
+        repo_id,
+        repo_modules_yaml,
+        module,
+        pkg_names=pkg_names,
+        pkg_versions=pkg_versions,
+        pkg_epochs=pkg_epochs,
+    )
+    if query is None:
+        return []
+    async with get_async_pulp_db() as pulp_db:
+        return (await pulp_db.execute(query)).scalars().all()
+
+
+def _get_rpm_packages_from_repositories_query(
     repo_ids: typing.List[uuid.UUID],
     pkg_names: typing.Optional[typing.List[str]] = None,
     pkg_versions: typing.Optional[typing.List[str]] = None,
     pkg_epochs: typing.Optional[typing.List[str]] = None,
     pkg_arches: typing.Optional[typing.List[str]] = None,
     pkg_releases: typing.Optional[typing.List[str]] = None,
-) -> typing.List[RpmPackage]:
+) -> Select:
     conditions = [
         CoreRepository.pulp_id.in_(repo_ids),
         CoreRepositoryContent.version_removed_id.is_(None),
@@ -144,7 +202,7 @@ def get_rpm_packages_from_repositories(
         conditions.append(RpmPackage.arch.in_(pkg_arches))
     if pkg_releases:
         conditions.append(RpmPackage.release.in_(pkg_releases))
-    query = (
+    return (
         select(RpmPackage)
         .join(CoreContent)
         .join(CoreRepositoryContent)
@@ -158,17 +216,152 @@ def get_rpm_packages_from_repositories(
             )
         )
     )
+
+
+def get_rpm_packages_from_repositories(
+    repo_ids: typing.List[uuid.UUID],
+    pkg_names: typing.Optional[typing.List[str]] = None,
+    pkg_versions: typing.Optional[typing.List[str]] = None,
+    pkg_epochs: typing.Optional[typing.List[str]] = None,
+    pkg_arches: typing.Optional[typing.List[str]] = None,
+    pkg_releases: typing.Optional[typing.List[str]] = None,
+) -> typing.List[RpmPackage]:
+    query = _get_rpm_packages_from_repositories_query(
+        repo_ids,
+        pkg_names=pkg_names,
+        pkg_versions=pkg_versions,
+        pkg_epochs=pkg_epochs,
+        pkg_arches=pkg_arches,
+        pkg_releases=pkg_releases,
+    )
     with get_pulp_db() as pulp_db:
         return pulp_db.execute(query).scalars().unique().all()
 
 
-def get_rpm_packages_from_repository(
-    repo_id: uuid.UUID,
+async def get_rpm_packages_from_repositories_async(
+    repo_ids: typing.List[uuid.UUID],
     pkg_names: typing.Optional[typing.List[str]] = None,
     pkg_versions: typing.Optional[typing.List[str]] = None,
     pkg_epochs: typing.Optional[typing.List[str]] = None,
     pkg_arches: typing.Optional[typing.List[str]] = None,
+    pkg_releases: typing.Optional[typing.List[str]] = None,
 ) -> typing.List[RpmPackage]:
+    query = _get_rpm_packages_from_repositories_query(
+        repo_ids,
+        pkg_names=pkg_names,
+        pkg_versions=pkg_versions,
+        pkg_epochs=pkg_epochs,
+        pkg_arches=pkg_arches,
+        pkg_releases=pkg_releases,
+    )
+    async with get_async_pulp_db() as pulp_db:
+        return (await pulp_db.execute(query)).scalars().unique().all()
+
+
+def _get_rpm_packages_presence_in_repositories_query(
+    repo_ids: typing.List[uuid.UUID],
+    pkg_nevras: typing.List[typing.Tuple[str, str, str, str, str]],
+) -> Select:
+    return (
+        select(
+            RpmPackage.content_ptr_id,
+            RpmPackage.name,
+            RpmPackage.epoch,
+            RpmPackage.version,
+            RpmPackage.release,
+            RpmPackage.arch,
+            CoreRepositoryContent.repository_id,
+        )
+        .join(
+            CoreRepositoryContent,
+            CoreRepositoryContent.content_id == RpmPackage.content_ptr_id,
+        )
+        .where(
+            CoreRepositoryContent.repository_id.in_(repo_ids),
+            CoreRepositoryContent.version_removed_id.is_(None),
+            tuple_(
+                RpmPackage.name,
+                RpmPackage.epoch,
+                RpmPackage.version,
+                RpmPackage.release,
+                RpmPackage.arch,
+            ).in_(pkg_nevras),
+        )
+    )
+
+
+def _iter_rpm_packages_presence_queries(
+    repo_ids: typing.List[uuid.UUID],
+    pkg_nevras: typing.Iterable[typing.Tuple[str, str, str, str, str]],
+) -> typing.Iterator[Select]:
+    # Every NEVRA takes 5 query parameters, the chunks keep us
+    # below the parameters limit of the PostgreSQL protocol
+    pkg_nevras = list(dict.fromkeys(pkg_nevras))
+    for i in range(0, len(pkg_nevras), RPM_PACKAGES_PRESENCE_CHUNK_SIZE):
+        yield _get_rpm_packages_presence_in_repositories_query(
+            repo_ids,
+            pkg_nevras[i : i + RPM_PACKAGES_PRESENCE_CHUNK_SIZE],
+        )
+
+
+def _get_rpm_packages_presence_row(
+    row: typing.Any,
+) -> typing.Tuple[str, typing.Tuple[str, str, str, str, str], uuid.UUID]:
+    content_id, *nevra, repo_id = row
+    return (
+        f"/pulp/api/v3/content/rpm/packages/{content_id}/",
+        tuple(nevra),
+        repo_id,
+    )
+
+
+def get_rpm_packages_presence_in_repositories(
+    repo_ids: typing.List[uuid.UUID],
+    pkg_nevras: typing.Iterable[typing.Tuple[str, str, str, str, str]],
+) -> typing.List[
+    typing.Tuple[str, typing.Tuple[str, str, str, str, str], uuid.UUID]
+]:
+    """
+    Returns (package href, NEVRA, repository id) for every given
+    package NEVRA found in the given repositories
+    """
+    result = []
+    with get_pulp_db() as pulp_db:
+        for query in _iter_rpm_packages_presence_queries(repo_ids, pkg_nevras):
+            result.extend(
+                _get_rpm_packages_presence_row(row)
+                for row in pulp_db.execute(query).all()
+            )
+    return result
+
+
+async def get_rpm_packages_presence_in_repositories_async(
+    repo_ids: typing.List[uuid.UUID],
+    pkg_nevras: typing.Iterable[typing.Tuple[str, str, str, str, str]],
+) -> typing.List[
+    typing.Tuple[str, typing.Tuple[str, str, str, str, str], uuid.UUID]
+]:
+    """
+    Returns (package href, NEVRA, repository id) for every given
+    package NEVRA found in the given repositories
+    """
+    result = []
+    async with get_async_pulp_db() as pulp_db:
+        for query in _iter_rpm_packages_presence_queries(repo_ids, pkg_nevras):
+            result.extend(
+                _get_rpm_packages_presence_row(row)
+                for row in (await pulp_db.execute(query)).all()
+            )
+    return result
+
+
+def _get_rpm_packages_from_repository_query(
+    repo_id: uuid.UUID,
+    pkg_names: typing.Optional[typing.List[str]] = None,
+    pkg_versions: typing.Optional[typing.List[str]] = None,
+    pkg_epochs: typing.Optional[typing.List[str]] = None,
+    pkg_arches: typing.Optional[typing.List[str]] = None,
+) -> Select:
     first_subq = (
         select(CoreRepository.pulp_id)
         .where(CoreRepository.pulp_id == repo_id)
@@ -203,61 +396,163 @@ def get_rpm_packages_from_repository(
     if pkg_arches:
         conditions.append(RpmPackage.arch.in_(pkg_arches))
 
-    query = select(RpmPackage).where(*conditions)
+    return select(RpmPackage).where(*conditions)
+
+
+def get_rpm_packages_from_repository(
+    repo_id: uuid.UUID,
+    pkg_names: typing.Optional[typing.List[str]] = None,
+    pkg_versions: typing.Optional[typing.List[str]] = None,
+    pkg_epochs: typing.Optional[typing.List[str]] = None,
+    pkg_arches: typing.Optional[typing.List[str]] = None,
+) -> typing.List[RpmPackage]:
+    query = _get_rpm_packages_from_repository_query(
+        repo_id,
+        pkg_names=pkg_names,
+        pkg_versions=pkg_versions,
+        pkg_epochs=pkg_epochs,
+        pkg_arches=pkg_arches,
+    )
     with get_pulp_db() as pulp_db:
         return pulp_db.execute(query).scalars().all()
 
 
+async def get_rpm_packages_from_repository_async(
+    repo_id: uuid.UUID,
+    pkg_names: typing.Optional[typing.List[str]] = None,
+    pkg_versions: typing.Optional[typing.List[str]] = None,
+    pkg_epochs: typing.Optional[typing.List[str]] = None,
+    pkg_arches: typing.Optional[typing.List[str]] = None,
+) -> typing.List[RpmPackage]:
+    query = _get_rpm_packages_from_repository_query(
+        repo_id,
+        pkg_names=pkg_names,
+        pkg_versions=pkg_versions,
+        pkg_epochs=pkg_epochs,
+        pkg_arches=pkg_arches,
+    )
+    async with get_async_pulp_db() as pulp_db:
+        return (await pulp_db.execute(query)).scalars().all()
+
+
+def _get_rpm_packages_by_ids_query(
+    pulp_pkg_ids: typing.List[uuid.UUID],
+    pkg_fields: typing.List[typing.Any],
+) -> Select:
+    return (
+        select(RpmPackage)
+        .where(
+            RpmPackage.content_ptr_id.in_(pulp_pkg_ids),
+        )
+        .options(
+            joinedload(RpmPackage.content)
+            .joinedload(CoreContent.core_contentartifact)
+            .joinedload(CoreContentArtifact.artifact),
+            load_only(*pkg_fields),
+        )
+    )
+
+
+def _iter_rpm_packages_by_ids_queries(
+    pulp_pkg_ids: typing.Iterable[uuid.UUID],
+    pkg_fields: typing.List[typing.Any],
+) -> typing.Iterator[Select]:
+    # The chunks keep us below the parameters limit
+    # of the PostgreSQL protocol
+    pulp_pkg_ids = list(dict.fromkeys(pulp_pkg_ids))
+    for i in range(0, len(pulp_pkg_ids), RPM_PACKAGES_BY_IDS_CHUNK_SIZE):
+        yield _get_rpm_packages_by_ids_query(
+            pulp_pkg_ids[i : i + RPM_PACKAGES_BY_IDS_CHUNK_SIZE],
+            pkg_fields,
+        )
+
+
 def get_rpm_packages_by_ids(
     pulp_pkg_ids: typing.List[uuid.UUID],
     pkg_fields: typing.List[typing.Any],
 ) -> typing.Dict[str, RpmPackage]:
     result = {}
     with get_pulp_db() as pulp_db:
-        pulp_pkgs = (
-            pulp_db.execute(
-                select(RpmPackage)
-                .where(
-                    RpmPackage.content_ptr_id.in_(pulp_pkg_ids),
-                )
-                .options(
-                    joinedload(RpmPackage.content)
-                    .joinedload(CoreContent.core_contentartifact)
-                    .joinedload(CoreContentArtifact.artifact),
-                    load_only(*pkg_fields),
-                )
+        for query in _iter_rpm_packages_by_ids_queries(
+            pulp_pkg_ids, pkg_fields
+        ):
+            pulp_pkgs = pulp_db.execute(query).unique().scalars().all()
+            result.update((pkg.pulp_href, pkg) for pkg in pulp_pkgs)
+    return result
+
+
+async def get_rpm_packages_by_ids_async(
+    pulp_pkg_ids: typing.List[uuid.UUID],
+    pkg_fields: typing.List[typing.Any],
+) -> typing.Dict[str, RpmPackage]:
+    result = {}
+    async with get_async_pulp_db() as pulp_db:
+        for query in _iter_rpm_packages_by_ids_queries(
+            pulp_pkg_ids, pkg_fields
+        ):
+            pulp_pkgs = (
+                (await pulp_db.execute(query)).unique().scalars().all()
             )
-            .unique()
-            .scalars()
-            .all()
+            result.update((pkg.pulp_href, pkg) for pkg in pulp_pkgs)
+    return result
+
+
+def _get_rpm_packages_by_checksums_query(
+    pkg_checksums: typing.List[str],
+) -> Select:
+    return (
+        select(RpmPackage)
+        .join(CoreContent)
+        .join(CoreContentArtifact)
+        .join(CoreArtifact)
+        .where(CoreArtifact.sha256.in_(pkg_checksums))
+        .options(
+            joinedload(RpmPackage.content)
+            .joinedload(CoreContent.core_contentartifact)
+            .joinedload(CoreContentArtifact.artifact),
         )
-        for pkg in pulp_pkgs:
-            result[pkg.pulp_href] = pkg
-        return result
+    )
 
 
 def get_rpm_packages_by_checksums(
     pkg_checksums: typing.List[str],
 ) -> typing.Dict[str, RpmPackage]:
-    result = {}
+    query = _get_rpm_packages_by_checksums_query(pkg_checksums)
     with get_pulp_db() as pulp_db:
-        pulp_pkgs = (
-            pulp_db.execute(
-                select(RpmPackage)
-                .join(CoreContent)
-                .join(CoreContentArtifact)
-                .join(CoreArtifact)
-                .where(CoreArtifact.sha256.in_(pkg_checksums))
-                .options(
-                    joinedload(RpmPackage.content)
-                    .joinedload(CoreContent.core_contentartifact)
-                    .joinedload(CoreContentArtifact.artifact),
-                ),
-            )
-            .unique()
-            .scalars()
-            .all()
-        )
-        for package in pulp_pkgs:
-            result[package.sha256] = package
-        return result
+        pulp_pkgs = pulp_db.execute(query).unique().scalars().all()
+        return {package.sha256: package for package in pulp_pkgs}
+
+
+async def get_rpm_packages_by_checksums_async(
+    pkg_checksums: typing.List[str],
+) -> typing.Dict[str, RpmPackage]:
+    query = _get_rpm_packages_by_checksums_query(pkg_checksums)
+    async with get_async_pulp_db() as pulp_db:
+        pulp_pkgs = (await pulp_db.execute(query)).unique().scalars().all()
+        return {package.sha256: package for package in pulp_pkgs}
+
+
+def _get_content_checksums_by_ids_query(
+    content_ids: typing.List[uuid.UUID],
+) -> Select:
+    return (
+        select(CoreContentArtifact.content_id, CoreArtifact.sha256)
+        .join(CoreArtifact)
+        .where(CoreContentArtifact.content_id.in_(content_ids))
+    )
+
+
+def get_content_checksums_by_ids(
+    content_ids: typing.List[uuid.UUID],
+) -> typing.Dict[uuid.UUID, str]:
+    query = _get_content_checksums_by_ids_query(content_ids)
+    with get_pulp_db() as pulp_db:
+        return dict(pulp_db.execute(query).all())
+
+
+async def get_content_checksums_by_ids_async(
+    content_ids: typing.List[uuid.UUID],
+) -> typing.Dict[uuid.UUID, str]:
+    query = _get_content_checksums_by_ids_query(content_ids)
+    async with get_async_pulp_db() as pulp_db:
+        return dict((await pulp_db.execute(query)).all())
@@ -3,14 +3,14 @@ import typing
 from alws.models import BuildTaskArtifact
 from alws.pulp_models import RpmPackage
 from alws.utils.pulp_utils import (
-    get_rpm_packages_by_ids,
+    get_rpm_packages_by_ids_async,
     get_uuid_from_pulp_href,
 )
 
-__all__ = ["get_rpm_packages_info"]
+__all__ = ["get_rpm_packages_info", "get_rpm_packages_metadata"]
 
 
-def get_rpm_packages_info(
+async def get_rpm_packages_info(
     artifacts: typing.List[BuildTaskArtifact],
 ) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
     pkg_fields = [
@@ -22,7 +22,7 @@ def get_rpm_packages_info(
         RpmPackage.arch,
         RpmPackage.rpm_sourcerpm,
     ]
-    pulp_packages = get_rpm_packages_by_ids(
+    pulp_packages = await get_rpm_packages_by_ids_async(
         [get_uuid_from_pulp_href(artifact.href) for artifact in artifacts],
         pkg_fields,
     )
@@ -37,3 +37,42 @@ def get_rpm_packages_info(
         }
         for _, pkg in pulp_packages.items()
     }
+
+
+async def get_rpm_packages_metadata(
+    pkg_hrefs: typing.Iterable[str],
+) -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+    """
+    Returns the same package fields as Pulp API does for updateinfo
+    records, but with a single query to the Pulp database.
+    """
+    pkg_ids = {get_uuid_from_pulp_href(href) for href in pkg_hrefs}
+    if not pkg_ids:
+        return {}
+    pkg_fields = [
+        RpmPackage.content_ptr_id,
+        RpmPackage.name,
+        RpmPackage.epoch,
+        RpmPackage.version,
+        RpmPackage.release,
+        RpmPackage.arch,
+        RpmPackage.location_href,
+        RpmPackage.rpm_sourcerpm,
+    ]
+    pulp_packages = await get_rpm_packages_by_ids_async(
+        list(pkg_ids),
+        pkg_fields,
+    )
+    return {
+        href: {
+            "name": pkg.name,
+            "epoch": pkg.epoch,
+            "version": pkg.version,
+            "release": pkg.release,
+            "arch": pkg.arch,
+            "location_href": pkg.location_href,
+            "rpm_sourcerpm": pkg.rpm_sourcerpm,
+            "sha256": pkg.sha256,
+        }
+        for href, pkg in pulp_packages.items()
+    }
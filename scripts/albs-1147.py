@@ -88,7 +88,7 @@ async def main(write=False):
     affected_records = {}
     affected_records_content_ids = []
     repos_to_publicate = set()
-    pulp_client.PULP_SEMAPHORE = asyncio.Semaphore(10)
+    pulp_client.configure_pulp_limiters(limit=10)
     pulp = pulp_client.PulpClient(
         settings.pulp_host, settings.pulp_user, settings.pulp_password
     )
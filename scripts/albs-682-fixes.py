@@ -327,7 +327,7 @@ async def update_pulp_repos():
 
 
 async def main():
-    pulp_client.PULP_SEMAPHORE = asyncio.Semaphore(10)
+    pulp_client.configure_pulp_limiters(limit=10)
 
     await prepare_albs_errata_cache()
 
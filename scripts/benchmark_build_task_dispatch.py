@@ -0,0 +1,165 @@
+"""
+Simulates N concurrent build node pollers against a seeded queue of
+build tasks and measures /build_node/get_task dispatch latency.
+
+Tasks are attached to an existing build and platform and removed after
+the run, so use a staging (or test) database only.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+import typing
+from contextlib import asynccontextmanager
+
+from sqlalchemy import delete, insert
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from alws import database, models
+from alws.constants import BuildTaskStatus
+from alws.crud.build_node import get_available_build_task
+from alws.dependencies import get_db
+from alws.schemas.build_node_schema import RequestTask
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        'benchmark_build_task_dispatch',
+        description='Measures build task dispatch under concurrent pollers',
+    )
+    parser.add_argument(
+        '-b', '--build-id', type=int, required=True,
+        help='Existing build to attach seeded build tasks to',
+    )
+    parser.add_argument(
+        '-p', '--platform-id', type=int, required=True,
+        help='Existing platform for seeded build tasks',
+    )
+    parser.add_argument(
+        '-t', '--tasks', type=int, default=1000,
+        help='Number of seeded build tasks',
+    )
+    parser.add_argument(
+        '-n', '--pollers', type=int, default=100,
+        help='Number of concurrent pollers',
+    )
+    parser.add_argument(
+        '-a', '--arch', type=str, default='x86_64',
+        help='Architecture of seeded tasks and pollers',
+    )
+    return parser.parse_args()
+
+
+async def seed_tasks(
+    build_id: int,
+    platform_id: int,
+    arch: str,
+    tasks_count: int,
+) -> typing.Tuple[int, typing.List[int]]:
+    async with asynccontextmanager(get_db)() as db, db.begin():
+        ref_id = (
+            await db.execute(
+                insert(models.BuildTaskRef)
+                .values(url='https://example.com/benchmark.git')
+                .returning(models.BuildTaskRef.id)
+            )
+        ).scalar()
+        task_ids = (
+            await db.execute(
+                insert(models.BuildTask)
+                .values([
+                    {
+                        'build_id': build_id,
+                        'platform_id': platform_id,
+                        'ref_id': ref_id,
+                        'status': BuildTaskStatus.IDLE,
+                        'index': index,
+                        'arch': arch,
+                        'is_ready': True,
+                    }
+                    for index in range(tasks_count)
+                ])
+                .returning(models.BuildTask.id)
+            )
+        ).scalars().all()
+    return ref_id, task_ids
+
+
+async def cleanup_tasks(ref_id: int, task_ids: typing.List[int]):
+    async with asynccontextmanager(get_db)() as db, db.begin():
+        await db.execute(
+            delete(models.BuildTask).where(models.BuildTask.id.in_(task_ids))
+        )
+        await db.execute(
+            delete(models.BuildTaskRef).where(models.BuildTaskRef.id == ref_id)
+        )
+
+
+async def poller(
+    arch: str,
+    latencies: typing.List[float],
+    claimed: typing.List[int],
+):
+    request = RequestTask(supported_arches=[arch])
+    while True:
+        start = time.monotonic()
+        async with asynccontextmanager(get_db)() as db:
+            task = await get_available_build_task(db, request)
+        latencies.append(time.monotonic() - start)
+        if not task:
+            return
+        claimed.append(task.id)
+
+
+async def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    ref_id, task_ids = await seed_tasks(
+        args.build_id, args.platform_id, args.arch, args.tasks
+    )
+    latencies = []
+    claimed = []
+    try:
+        start = time.monotonic()
+        await asyncio.gather(*(
+            poller(args.arch, latencies, claimed)
+            for _ in range(args.pollers)
+        ))
+        elapsed = time.monotonic() - start
+    finally:
+        await cleanup_tasks(ref_id, task_ids)
+    latencies.sort()
+    logging.info('Pollers: %d, seeded tasks: %d', args.pollers, args.tasks)
+    logging.info(
+        'Claimed: %d, duplicates: %d, total time: %.2fs, tasks/s: %.1f',
+        len(claimed),
+        len(claimed) - len(set(claimed)),
+        elapsed,
+        len(claimed) / elapsed,
+    )
+    logging.info(
+        'get_task latency p50: %.1fms, p95: %.1fms, max: %.1fms',
+        statistics.median(latencies) * 1000,
+        latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        latencies[-1] * 1000,
+    )
+    for name, stats in database.get_engine_pool_stats().items():
+        logging.info(
+            '%s pool: size %d, checkouts %d, timeouts %d, '
+            'avg wait %.1fms, max wait %.1fms',
+            name,
+            stats['size'],
+            stats['checkouts'],
+            stats['timeouts'],
+            stats['avg_wait_time'] * 1000,
+            stats['max_wait_time'] * 1000,
+        )
+
+
+if __name__ == '__main__':
+    # Module level semaphores are bound to the default event loop
+    asyncio.get_event_loop().run_until_complete(main())
@@ -0,0 +1,121 @@
+"""
+Microbenchmark of PulpClient requests against a local stub Pulp server.
+
+Compares requests per second of a new connection per request
+(previous PulpClient behaviour) with the shared connection pool.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+import urllib.parse
+
+import aiohttp
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from alws.utils import pulp_client
+from alws.utils.pulp_client import PulpClient, close_pulp_session
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        'benchmark_pulp_client',
+        description='Measures PulpClient throughput against a stub server',
+    )
+    parser.add_argument(
+        '-r', '--requests', type=int, default=2000,
+        help='Number of requests for each run',
+    )
+    parser.add_argument(
+        '-p', '--port', type=int, default=8765,
+        help='Port for the stub Pulp server',
+    )
+    return parser.parse_args()
+
+
+async def stub_handler(request: web.Request) -> web.Response:
+    if request.method == 'GET':
+        return web.json_response({
+            'pulp_href': request.path,
+            'sha256': '0' * 64,
+            'state': 'completed',
+        })
+    return web.json_response({'task': '/pulp/api/v3/tasks/1/'})
+
+
+async def start_stub_server(port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_route('*', '/{tail:.*}', stub_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def request_without_pool(client: PulpClient, method: str, endpoint: str):
+    full_url = urllib.parse.urljoin(client._host, endpoint)
+    operation = pulp_client.get_pulp_operation(method, full_url)
+    async with pulp_client.get_pulp_limiter(operation):
+        async with aiohttp.request(
+            method, full_url, auth=client._auth
+        ) as response:
+            response_json = await response.json()
+            response.raise_for_status()
+            return response_json
+
+
+async def measure(name: str, requests_count: int, request_func) -> float:
+    start = time.monotonic()
+    await asyncio.gather(*(
+        request_func(
+            'GET' if i % 2 else 'POST',
+            f'pulp/api/v3/content/rpm/packages/{i}/',
+        )
+        for i in range(requests_count)
+    ))
+    rps = requests_count / (time.monotonic() - start)
+    logging.info('%s: %.1f requests/s', name, rps)
+    return rps
+
+
+async def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    runner = await start_stub_server(args.port)
+    client = PulpClient(f'http://127.0.0.1:{args.port}', 'admin', 'admin')
+    try:
+        before = await measure(
+            'New connection per request',
+            args.requests,
+            lambda method, endpoint: request_without_pool(
+                client, method, endpoint
+            ),
+        )
+        after = await measure(
+            'Shared connection pool',
+            args.requests,
+            client.request,
+        )
+        logging.info('Speedup: %.2fx', after / before)
+        for name, stats in pulp_client.get_pulp_limiters_stats().items():
+            logging.info(
+                '%s limiter: limit %d, max queue depth %d, '
+                'avg wait %.1fms, max wait %.1fms',
+                name,
+                stats['limit'],
+                stats['max_queue_depth'],
+                stats['avg_wait_time'] * 1000,
+                stats['max_wait_time'] * 1000,
+            )
+    finally:
+        await close_pulp_session()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    # Module level semaphores are bound to the default event loop
+    asyncio.get_event_loop().run_until_complete(main())
@@ -0,0 +1,233 @@
+"""
+Microbenchmark of collecting release plan packages on a synthetic release.
+
+Compares a Pulp query per build with deep copies and task scans
+(previous BaseReleasePlanner.get_pulp_packages behaviour) with one bulk
+query for all builds. The Pulp database is simulated with a fixed
+latency per query and per returned row.
+"""
+import argparse
+import asyncio
+import copy
+import logging
+import os
+import sys
+import time
+import typing
+import uuid
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+# alws.release_planner can only be imported after the release CRUD
+# because of the circular import between them
+from alws.crud import release  # noqa: F401
+from alws import release_planner
+from alws.release_planner import AlmaLinuxReleasePlanner
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        'benchmark_release_plan',
+        description='Measures release plan packages collection',
+    )
+    parser.add_argument(
+        '-b', '--builds', type=int, default=100,
+        help='Number of builds in the release',
+    )
+    parser.add_argument(
+        '-p', '--packages', type=int, default=20000,
+        help='Total number of packages in the release',
+    )
+    parser.add_argument(
+        '-l', '--query-latency', type=float, default=0.005,
+        help='Simulated Pulp database latency per query, in seconds',
+    )
+    parser.add_argument(
+        '-r', '--row-latency', type=float, default=0.00001,
+        help='Simulated Pulp database latency per row, in seconds',
+    )
+    return parser.parse_args()
+
+
+class FakeResult:
+    def __init__(self, items: list):
+        self._items = items
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self._items
+
+
+class FakeSession:
+    def __init__(self, builds: list):
+        self._builds = builds
+
+    async def execute(self, *args, **kwargs):
+        return FakeResult(self._builds)
+
+
+def generate_release(
+    builds_count: int,
+    packages_count: int,
+) -> typing.Tuple[list, dict]:
+    builds = []
+    pulp_packages = {}
+    packages_per_build = max(packages_count // builds_count, 2)
+    arches = ('x86_64', 'aarch64', 'i686', 'ppc64le')
+    for build_id in range(1, builds_count + 1):
+        tasks = [
+            SimpleNamespace(
+                id=build_id * 10 + index,
+                arch=arch,
+                rpm_module=None,
+            )
+            for index, arch in enumerate(arches)
+        ]
+        source_rpms = []
+        binary_rpms = []
+        for index in range(packages_per_build):
+            task = tasks[index % len(tasks)]
+            pkg_id = uuid.uuid4()
+            href = f'/pulp/api/v3/content/rpm/packages/{pkg_id}/'
+            is_src = index == 0
+            arch = 'src' if is_src else task.arch
+            name = f'package{build_id}-{index}'
+            artifact = SimpleNamespace(
+                href=href,
+                name=f'{name}-1.0-1.el8.{arch}.rpm',
+                build_task_id=task.id,
+                cas_hash=None,
+            )
+            pulp_packages[pkg_id] = SimpleNamespace(
+                pulp_href=href,
+                name=name,
+                epoch='0',
+                version='1.0',
+                release='1.el8',
+                arch=arch,
+                sha256=pkg_id.hex * 2,
+            )
+            if is_src:
+                source_rpms.append(SimpleNamespace(artifact=artifact))
+                continue
+            binary_rpms.append(
+                SimpleNamespace(artifact=artifact, source_rpm=source_rpms[0])
+            )
+        builds.append(
+            SimpleNamespace(
+                id=build_id,
+                platform_flavors=[],
+                source_rpms=source_rpms,
+                binary_rpms=binary_rpms,
+                tasks=tasks,
+                repos=[],
+            )
+        )
+    return builds, pulp_packages
+
+
+def make_pulp_query(
+    pulp_packages: dict,
+    query_latency: float,
+    row_latency: float,
+    stats: dict,
+):
+    async def get_rpm_packages_by_ids_async(pulp_pkg_ids, pkg_fields):
+        stats['queries'] += 1
+        await asyncio.sleep(query_latency + row_latency * len(pulp_pkg_ids))
+        return {
+            pulp_packages[pkg_id].pulp_href: pulp_packages[pkg_id]
+            for pkg_id in pulp_pkg_ids
+        }
+
+    return get_rpm_packages_by_ids_async
+
+
+async def get_pulp_packages_per_build(
+    planner: AlmaLinuxReleasePlanner,
+    builds: list,
+    build_tasks: typing.List[int],
+) -> list:
+    pulp_packages = []
+    for build in builds:
+        build_rpms = build.source_rpms + build.binary_rpms
+        pulp_artifacts = {
+            artifact_dict.pop('pulp_href'): artifact_dict
+            for artifact_dict in await planner.get_pulp_packages_info(
+                build_rpms,
+                build_tasks,
+            )
+        }
+        for rpm in build_rpms:
+            artifact_task_id = rpm.artifact.build_task_id
+            pkg_info = copy.deepcopy(pulp_artifacts[rpm.artifact.href])
+            pkg_info['is_beta'] = planner.is_beta_build(build)
+            pkg_info['build_id'] = build.id
+            pkg_info['artifact_href'] = rpm.artifact.href
+            build_task = next(
+                task for task in build.tasks if task.id == artifact_task_id
+            )
+            pkg_info['task_arch'] = build_task.arch
+            pulp_packages.append(pkg_info)
+    return pulp_packages
+
+
+async def get_pulp_packages_bulk(
+    planner: AlmaLinuxReleasePlanner,
+    build_ids: typing.List[int],
+    build_tasks: typing.List[int],
+) -> list:
+    pulp_packages, *_ = await planner.get_pulp_packages(
+        build_ids,
+        build_tasks=build_tasks,
+    )
+    return pulp_packages
+
+
+async def measure(name: str, stats: dict, coro) -> float:
+    stats['queries'] = 0
+    start = time.monotonic()
+    packages = await coro
+    elapsed = time.monotonic() - start
+    logging.info(
+        '%s: %d packages, %d Pulp queries, %.3fs',
+        name,
+        len(packages),
+        stats['queries'],
+        elapsed,
+    )
+    return elapsed
+
+
+async def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    builds, pulp_packages = generate_release(args.builds, args.packages)
+    build_ids = [build.id for build in builds]
+    build_tasks = [task.id for build in builds for task in build.tasks]
+    stats = {'queries': 0}
+    release_planner.get_rpm_packages_by_ids_async = make_pulp_query(
+        pulp_packages,
+        args.query_latency,
+        args.row_latency,
+        stats,
+    )
+    planner = AlmaLinuxReleasePlanner(FakeSession(builds))
+    before = await measure(
+        'Query per build',
+        stats,
+        get_pulp_packages_per_build(planner, builds, build_tasks),
+    )
+    after = await measure(
+        'Bulk query',
+        stats,
+        get_pulp_packages_bulk(planner, build_ids, build_tasks),
+    )
+    logging.info('Speedup: %.2fx', before / after)
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(main())
@@ -187,7 +187,7 @@ async def update_albs_db():
 
 
 async def main():
-    pulp_client.PULP_SEMAPHORE = asyncio.Semaphore(10)
+    pulp_client.configure_pulp_limiters(limit=10)
     tasks = [
         update_pulp_db(),
         update_albs_db(),
@@ -45,7 +45,7 @@ log_regex = re.compile(r'href="(?P<log_name>.+\.log)"')
 
 
 async def main():
-    pulp_client.PULP_SEMAPHORE = asyncio.Semaphore(5)
+    pulp_client.configure_pulp_limiters(limit=5)
     pulp = pulp_client.PulpClient(
         settings.pulp_host,
         settings.pulp_user,
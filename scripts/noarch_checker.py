@@ -326,7 +326,7 @@ def parse_args():
 
 async def main():
     args = parse_args()
-    pulp_client.PULP_SEMAPHORE = asyncio.Semaphore(10)
+    pulp_client.configure_pulp_limiters(limit=10)
     async with asynccontextmanager(get_db)() as session:
         processor = NoarchProcessor(
             session=session,
@@ -54,7 +54,7 @@ async def create_rpm_package(
 
 
 async def async_main(args, work_dir, logger):
-    pulp_client.PULP_SEMAPHORE = asyncio.Semaphore(5)
+    pulp_client.configure_pulp_limiters(limit=5)
     pulp_host, pulp_user, pulp_password = get_pulp_params()
     pulp = pulp_client.PulpClient(pulp_host, pulp_user, pulp_password)
     repository = await pulp.get_rpm_repository(args.repository_name)
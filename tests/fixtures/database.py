@@ -9,8 +9,13 @@ from sqlalchemy.pool import NullPool
 from alws import models
 from alws.config import settings
 from alws.database import Base
+from alws.dependencies import configure_db_pool
 from tests.constants import ADMIN_USER_ID, CUSTOM_USER_ID
 
+# application connection pools are bound to one event loop,
+# while tests are run in different ones
+configure_db_pool(0, 0)
+
 engine = create_async_engine(
     settings.test_database_url,
     poolclass=NullPool,
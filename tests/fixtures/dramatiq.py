@@ -23,6 +23,17 @@ def patch_dramatiq_actor_send(monkeypatch):
     monkeypatch.setattr("dramatiq.Actor.send", func)
 
 
+@pytest.fixture(autouse=True)
+def mock_notify_build_tasks_ready(monkeypatch):
+    async def func(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(
+        "alws.crud.build_node.notify_task_available",
+        func,
+    )
+
+
 @pytest.mark.anyio
 @pytest.fixture
 async def start_modular_build(
@@ -1,4 +1,3 @@
-import asyncio
 import hashlib
 import re
 import uuid
@@ -22,14 +21,6 @@ from tests.test_utils.pulp_utils import (
 )
 
 
-@pytest.fixture(autouse=True)
-def semaphore_patch(monkeypatch):
-    monkeypatch.setattr(
-        "alws.utils.pulp_client.PULP_SEMAPHORE",
-        asyncio.Semaphore(5),
-    )
-
-
 @pytest.mark.anyio
 @pytest.fixture(autouse=True)
 async def disable_pulp_requests(monkeypatch):
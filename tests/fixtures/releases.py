@@ -20,11 +20,11 @@ async def get_pulp_packages_info(monkeypatch):
 
 @pytest.fixture
 def disable_packages_check_in_prod_repos(monkeypatch):
-    def func(*args, **kwargs):
+    async def func(*args, **kwargs):
         return []
 
     monkeypatch.setattr(
-        "alws.release_planner.get_rpm_packages_from_repositories",
+        "alws.release_planner.get_rpm_packages_presence_in_repositories_async",
         func,
     )
 
@@ -33,20 +33,21 @@ def disable_packages_check_in_prod_repos(monkeypatch):
 @pytest.fixture
 async def disable_sign_verify(monkeypatch):
     async def func(*args, **kwargs):
-        return True
+        _, build_ids, *_ = args
+        return {build_id: None for build_id in build_ids}
 
     monkeypatch.setattr(
-        "alws.release_planner.sign_task.verify_signed_build",
+        "alws.release_planner.sign_task.verify_signed_builds",
         func,
     )
 
 
 @pytest.fixture(autouse=True)
 def mock_get_packages_from_64_bit_repos(monkeypatch):
-    def func(*args, **kwargs):
+    async def func(*args, **kwargs):
         return []
 
     monkeypatch.setattr(
-        "alws.release_planner.get_rpm_packages_from_repository",
+        "alws.release_planner.get_rpm_packages_from_repository_async",
         func,
     )
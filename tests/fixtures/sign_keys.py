@@ -9,6 +9,17 @@ from alws.models import SignKey
 from alws.schemas.sign_schema import SignKeyCreate
 
 
+@pytest.fixture(autouse=True)
+def mock_notify_task_available(monkeypatch):
+    async def func(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(
+        "alws.crud.sign_task.notify_task_available",
+        func,
+    )
+
+
 @pytest.fixture
 def basic_sign_key_payload() -> dict:
     return {
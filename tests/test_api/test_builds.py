@@ -1,9 +1,26 @@
+import asyncio
+import datetime
+
 import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from alws.constants import BuildTaskStatus
-from alws.models import Build
+from alws.constants import BuildTaskStatus, ErrataPackageStatus
+from alws.config import settings
+from alws.crud.build_node import (
+    BUILD_TASKS_CHANNEL,
+    PINGED_BUILD_TASKS,
+    flush_pinged_tasks,
+    safe_build_done,
+    start_build_tasks_pings_flush,
+    stop_build_tasks_pings_flush,
+)
+from alws.models import Build, BuildTask, ErrataToALBSPackage
+from alws.schemas.build_node_schema import BuildDone
 from alws.utils.modularity import IndexWrapper
 from tests.constants import CUSTOM_USER_ID
+from tests.fixtures.dramatiq import prepare_build_done_payload
 from tests.mock_classes import BaseAsyncTestCase
 
 
@@ -18,6 +35,246 @@ class TestBuildsEndpoints(BaseAsyncTestCase):
         message = f"Cannot ping tasks:\n{response.text}"
         assert response.status_code == self.status_codes.HTTP_200_OK, message
 
+    async def test_ping_coalesces_updates(
+        self,
+        session: AsyncSession,
+        regular_build: Build,
+        start_build,
+        monkeypatch,
+    ):
+        monkeypatch.setattr(
+            settings,
+            "build_task_ping_flush_interval",
+            3600,
+        )
+        task_ids = (
+            (
+                await session.execute(
+                    select(BuildTask.id).where(
+                        BuildTask.build_id == regular_build.id,
+                    )
+                )
+            )
+            .scalars()
+            .all()
+        )
+        await session.close()
+        future_ts = datetime.datetime.utcnow() + datetime.timedelta(hours=3)
+        async with session.begin():
+            await session.execute(
+                update(BuildTask)
+                .where(BuildTask.id == task_ids[0])
+                .values(ts=future_ts)
+            )
+        await flush_pinged_tasks(session)
+
+        async def get_tasks_ts():
+            tasks_ts = await session.execute(
+                select(BuildTask.id, BuildTask.ts).where(
+                    BuildTask.id.in_(task_ids),
+                )
+            )
+            await session.close()
+            return dict(tasks_ts.all())
+
+        initial_tasks_ts = await get_tasks_ts()
+        for _ in range(2):
+            response = await self.make_request(
+                "post",
+                "/api/v1/build_node/ping",
+                json={"active_tasks": task_ids},
+            )
+            assert response.status_code == self.status_codes.HTTP_200_OK
+        message = "Pings should be buffered until the flush"
+        assert await get_tasks_ts() == initial_tasks_ts, message
+        await flush_pinged_tasks(session)
+        tasks_ts = await get_tasks_ts()
+        message = "Buffered pings should be flushed"
+        assert all(
+            tasks_ts[task_id] != initial_tasks_ts[task_id]
+            for task_id in task_ids[1:]
+        ), message
+        message = "Ping shouldn't move task timestamp backwards"
+        assert tasks_ts[task_ids[0]] == future_ts, message
+        assert not PINGED_BUILD_TASKS
+
+    async def test_pings_are_flushed_periodically(
+        self,
+        session: AsyncSession,
+        regular_build: Build,
+        start_build,
+        monkeypatch,
+    ):
+        monkeypatch.setattr(
+            settings,
+            "build_task_ping_flush_interval",
+            0.1,
+        )
+        task_id = (
+            await session.execute(
+                select(BuildTask.id).where(
+                    BuildTask.build_id == regular_build.id,
+                )
+            )
+        ).scalar()
+        await session.close()
+
+        async def get_task_ts():
+            task_ts = await session.execute(
+                select(BuildTask.ts).where(BuildTask.id == task_id)
+            )
+            await session.close()
+            return task_ts.scalar()
+
+        await start_build_tasks_pings_flush()
+        try:
+            response = await self.make_request(
+                "post",
+                "/api/v1/build_node/ping",
+                json={"active_tasks": [task_id]},
+            )
+            assert response.status_code == self.status_codes.HTTP_200_OK
+            pinged_ts = PINGED_BUILD_TASKS[task_id]
+            for _ in range(50):
+                task_ts = await get_task_ts()
+                if task_ts == pinged_ts:
+                    break
+                await asyncio.sleep(0.1)
+        finally:
+            await stop_build_tasks_pings_flush()
+        message = "Pings should be flushed without further requests"
+        assert task_ts == pinged_ts, message
+
+    async def test_get_task_concurrently(
+        self,
+        regular_build: Build,
+        start_build,
+    ):
+        responses = await asyncio.gather(*(
+            self.make_request(
+                "post",
+                "/api/v1/build_node/get_task",
+                json={"supported_arches": ["i686", "x86_64"]},
+            )
+            for _ in range(3)
+        ))
+        task_ids = []
+        for response in responses:
+            message = f"Cannot get build task:\n{response.text}"
+            assert (
+                response.status_code == self.status_codes.HTTP_200_OK
+            ), message
+            if response.json():
+                task_ids.append(response.json()["id"])
+        assert task_ids, "No build task was claimed"
+        message = "The same build task was claimed twice"
+        assert len(task_ids) == len(set(task_ids)), message
+
+    async def test_build_tasks_readiness(
+        self,
+        session: AsyncSession,
+        regular_build: Build,
+        start_build,
+        create_entity,
+        get_rpm_packages_info,
+        get_packages_info_from_pulp,
+        monkeypatch,
+    ):
+        notified_channels = []
+
+        async def notify_task_available(*channels):
+            notified_channels.extend(channels)
+
+        monkeypatch.setattr(
+            "alws.crud.build_node.notify_task_available",
+            notify_task_available,
+        )
+
+        async def get_ready_task_ids():
+            return (
+                (
+                    await session.execute(
+                        select(BuildTask.id).where(
+                            BuildTask.build_id == regular_build.id,
+                            BuildTask.status == BuildTaskStatus.IDLE,
+                            BuildTask.is_ready.is_(True),
+                        )
+                    )
+                )
+                .scalars()
+                .all()
+            )
+
+        ready_task_ids = await get_ready_task_ids()
+        await session.close()
+        message = "Only the first task of a ref should be ready"
+        assert len(ready_task_ids) == 1, message
+        await safe_build_done(
+            session,
+            BuildDone(
+                **prepare_build_done_payload(
+                    ready_task_ids[0],
+                    [
+                        "chan-0.0.4-3.el8.src.rpm",
+                        "chan-0.0.4-3.el8.i686.rpm",
+                    ],
+                )
+            ),
+        )
+        new_ready_task_ids = await get_ready_task_ids()
+        await session.close()
+        message = "Dependent task should be ready after its dependency is done"
+        assert new_ready_task_ids, message
+        assert ready_task_ids[0] not in new_ready_task_ids
+        new_ready_arches = (
+            (
+                await session.execute(
+                    select(BuildTask.arch).where(
+                        BuildTask.id.in_(new_ready_task_ids)
+                    )
+                )
+            )
+            .scalars()
+            .all()
+        )
+        await session.close()
+        message = "Waiting build nodes should be notified about ready tasks"
+        assert sorted(notified_channels) == sorted(
+            BUILD_TASKS_CHANNEL.format(arch=arch)
+            for arch in set(new_ready_arches)
+        ), message
+
+    @pytest.mark.parametrize(
+        "errata_create_payload",
+        [{"id": "ALSA-2022:0124"}],
+        indirect=True,
+    )
+    async def test_errata_proposals_after_build_done(
+        self,
+        session: AsyncSession,
+        base_platform,
+        create_errata,
+        build_done,
+    ):
+        albs_packages = (
+            (
+                await session.execute(
+                    select(ErrataToALBSPackage)
+                    .where(ErrataToALBSPackage.name == "chan")
+                    .options(selectinload(ErrataToALBSPackage.errata_package))
+                )
+            )
+            .scalars()
+            .all()
+        )
+        await session.close()
+        message = "Built packages should be proposed for matching errata"
+        assert albs_packages, message
+        for albs_package in albs_packages:
+            assert albs_package.status == ErrataPackageStatus.proposal
+            assert albs_package.arch == albs_package.errata_package.arch
+            assert albs_package.errata_package.source_srpm == "chan"
+
     async def test_mark_build_as_cancelled(
         self,
         regular_build: Build,
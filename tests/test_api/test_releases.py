@@ -160,7 +160,17 @@ class TestReleasesEndpoints(BaseAsyncTestCase):
         base_product: models.Product,
         modify_repository,
         create_rpm_publication,
+        monkeypatch,
     ):
+        invalidated_records = []
+
+        async def invalidate_oval_cache(platform_id, record_ids):
+            invalidated_records.extend(record_ids)
+
+        monkeypatch.setattr(
+            "alws.crud.errata.invalidate_oval_cache",
+            invalidate_oval_cache,
+        )
         response = await self.make_request(
             "get",
             "/api/v1/releases/",
@@ -216,6 +226,7 @@ class TestReleasesEndpoints(BaseAsyncTestCase):
         )
         errata_pkgs = errata_pkgs.scalars().all()
         assert not errata_pkgs, "Packages are not marked as proposal"
+        assert invalidated_records, "OVAL cache of reverted records is kept"
 
     async def test_revert_community_release(
         self,
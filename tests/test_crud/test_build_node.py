@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+
+import pytest
+
+from alws.crud import build_node
+from alws.errors import ArtifactChecksumError
+from alws.schemas.build_node_schema import BuildDoneArtifact
+from alws.utils.pulp_client import PulpClient
+
+
+@pytest.mark.anyio
+async def test_create_entities_fails_on_first_bad_checksum(monkeypatch):
+    artifacts = [
+        BuildDoneArtifact(
+            name=name,
+            type="rpm",
+            href=f"/pulp/api/v3/artifacts/{uuid.uuid4()}/",
+            sha256="a" * 64,
+        )
+        for name in ("bad-1.0-1.x86_64.rpm", "slow-1.0-1.x86_64.rpm")
+    ]
+    slow_cancelled = asyncio.Event()
+
+    async def create_entity(_, artifact, include_sha256=True):
+        href = f"/pulp/api/v3/content/rpm/packages/{uuid.uuid4()}/"
+        if artifact.name.startswith("slow"):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                slow_cancelled.set()
+                raise
+        return href, None, artifact
+
+    async def get_content_checksums_by_ids_async(content_ids):
+        return {content_id: "b" * 64 for content_id in content_ids}
+
+    monkeypatch.setattr(PulpClient, "create_entity", create_entity)
+    monkeypatch.setattr(
+        "alws.crud.build_node.get_content_checksums_by_ids_async",
+        get_content_checksums_by_ids_async,
+    )
+    create_entities = getattr(build_node, "__create_entities")
+    pulp_client = PulpClient("http://pulp", "user", "password")
+    with pytest.raises(ArtifactChecksumError, match="bad-1.0-1"):
+        await asyncio.wait_for(create_entities(pulp_client, artifacts), 5)
+    message = "Remaining artifacts should be cancelled on the first error"
+    assert slow_cancelled.is_set(), message
+
+
+@pytest.mark.anyio
+async def test_create_entities_keeps_artifacts_order(monkeypatch):
+    artifacts = [
+        BuildDoneArtifact(
+            name=f"pkg{index}-1.0-1.x86_64.rpm",
+            type="rpm",
+            href=f"/pulp/api/v3/artifacts/{uuid.uuid4()}/",
+            sha256="a" * 64,
+        )
+        for index in range(5)
+    ]
+
+    async def create_entity(_, artifact, include_sha256=True):
+        # artifacts are created in reverse order
+        await asyncio.sleep(0.01 * (5 - int(artifact.name[3])))
+        href = f"/pulp/api/v3/content/rpm/packages/{uuid.uuid4()}/"
+        return href, None, artifact
+
+    async def get_content_checksums_by_ids_async(content_ids):
+        return {content_id: "a" * 64 for content_id in content_ids}
+
+    monkeypatch.setattr(PulpClient, "create_entity", create_entity)
+    monkeypatch.setattr(
+        "alws.crud.build_node.get_content_checksums_by_ids_async",
+        get_content_checksums_by_ids_async,
+    )
+    create_entities = getattr(build_node, "__create_entities")
+    pulp_client = PulpClient("http://pulp", "user", "password")
+    results = await create_entities(pulp_client, artifacts)
+    assert [artifact for _, _, artifact in results] == artifacts
+    assert all(sha256 == "a" * 64 for _, sha256, _ in results)
@@ -0,0 +1,332 @@
+import uuid
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from alws.constants import SignStatus
+from alws.crud.sign_task import (
+    complete_sign_task,
+    get_available_sign_task,
+    reset_sign_tasks_packages,
+    verify_signed_builds,
+)
+from alws.errors import DataNotFoundError, SignError
+from alws.models import (
+    BinaryRpm,
+    Build,
+    BuildTaskArtifact,
+    Platform,
+    SignKey,
+    SignTask,
+    SourceRpm,
+)
+from alws.schemas.sign_schema import SignTaskComplete
+from alws.utils.pulp_client import PulpClient
+
+
+@pytest.mark.anyio
+async def test_verify_signed_builds(
+    session: AsyncSession,
+    base_platform: Platform,
+    regular_build: Build,
+):
+    missing_build_id = regular_build.id + 1000
+    verdicts = await verify_signed_builds(
+        session,
+        [regular_build.id, missing_build_id],
+        base_platform.id,
+    )
+    assert isinstance(verdicts[regular_build.id], SignError)
+    assert str(verdicts[regular_build.id]) == (
+        f"Build with ID {regular_build.id} has not already signed"
+    )
+    assert isinstance(verdicts[missing_build_id], DataNotFoundError)
+
+
+@pytest.mark.anyio
+async def test_verify_signed_builds_with_sign_key(
+    session: AsyncSession,
+    base_platform: Platform,
+    regular_build: Build,
+    build_done,
+    sign_key: SignKey,
+):
+    build_artifact_ids = select(SourceRpm.artifact_id).where(
+        SourceRpm.build_id == regular_build.id
+    ).union(
+        select(BinaryRpm.artifact_id).where(
+            BinaryRpm.build_id == regular_build.id
+        )
+    )
+    await session.execute(
+        update(SignKey)
+        .where(SignKey.id == sign_key.id)
+        .values(platform_id=base_platform.id)
+    )
+    await session.execute(
+        update(Build).where(Build.id == regular_build.id).values(signed=True)
+    )
+    await session.commit()
+
+    verdicts = await verify_signed_builds(
+        session,
+        [regular_build.id],
+        base_platform.id,
+    )
+    message = "Packages signed with another key shouldn't be verified"
+    assert isinstance(verdicts[regular_build.id], SignError), message
+    assert "is not matched by sign key" in str(verdicts[regular_build.id])
+
+    await session.execute(
+        update(BuildTaskArtifact)
+        .where(BuildTaskArtifact.id.in_(build_artifact_ids))
+        .values(sign_key_id=sign_key.id)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    verdicts = await verify_signed_builds(
+        session,
+        [regular_build.id],
+        base_platform.id,
+    )
+    message = "Packages signed with the platform key should be verified"
+    assert verdicts[regular_build.id] is None, message
+
+    await session.execute(
+        update(BuildTaskArtifact)
+        .where(BuildTaskArtifact.sign_key_id == sign_key.id)
+        .values(sign_key_id=None)
+    )
+    await session.execute(
+        update(Build).where(Build.id == regular_build.id).values(signed=False)
+    )
+    await session.commit()
+
+
+@pytest.mark.anyio
+async def test_get_available_sign_task_claims_task_once(
+    session: AsyncSession,
+    regular_build: Build,
+    sign_key: SignKey,
+):
+    packages = [
+        {
+            "id": 1,
+            "name": "test.src.rpm",
+            "cas_hash": None,
+            "arch": "src",
+            "type": "rpm",
+            "download_url": "http://pulp/builds/Packages/t/test.src.rpm",
+        }
+    ]
+    session.add(
+        SignTask(
+            status=SignStatus.IDLE,
+            build_id=regular_build.id,
+            sign_key_id=sign_key.id,
+            packages=packages,
+        )
+    )
+    await session.commit()
+    sign_task = await get_available_sign_task(session, [sign_key.keyid])
+    assert sign_task["build_id"] == regular_build.id
+    assert sign_task["keyid"] == sign_key.keyid
+    assert sign_task["packages"] == packages
+    assert await get_available_sign_task(session, [sign_key.keyid]) == {}
+    db_sign_task = await session.get(SignTask, sign_task["id"])
+    assert db_sign_task.status == SignStatus.IN_PROGRESS
+    await session.delete(db_sign_task)
+    await session.commit()
+
+
+@pytest.mark.anyio
+async def test_get_available_sign_task_skips_task_without_packages(
+    session: AsyncSession,
+    regular_build: Build,
+    sign_key: SignKey,
+):
+    packages = [
+        {
+            "id": 1,
+            "name": "test.src.rpm",
+            "cas_hash": None,
+            "arch": "src",
+            "type": "rpm",
+            "download_url": "http://pulp/builds/Packages/t/test.src.rpm",
+        }
+    ]
+    empty_task = SignTask(
+        status=SignStatus.IDLE,
+        build_id=regular_build.id,
+        sign_key_id=sign_key.id,
+        packages=[],
+    )
+    session.add(empty_task)
+    await session.commit()
+    session.add(
+        SignTask(
+            status=SignStatus.IDLE,
+            build_id=regular_build.id,
+            sign_key_id=sign_key.id,
+            packages=packages,
+        )
+    )
+    await session.commit()
+    sign_task = await get_available_sign_task(session, [sign_key.keyid])
+    message = "Task without packages shouldn't block the following ones"
+    assert sign_task["packages"] == packages, message
+    await session.refresh(empty_task)
+    assert empty_task.status == SignStatus.FAILED
+    db_sign_task = await session.get(SignTask, sign_task["id"])
+    await session.delete(db_sign_task)
+    await session.delete(empty_task)
+    await session.commit()
+
+
+@pytest.mark.anyio
+async def test_get_available_sign_task_after_build_changes(
+    session: AsyncSession,
+    regular_build: Build,
+    build_done,
+    sign_key: SignKey,
+):
+    stale_packages = [
+        {
+            "id": 1,
+            "name": "stale.src.rpm",
+            "cas_hash": None,
+            "arch": "src",
+            "type": "rpm",
+            "download_url": "http://pulp/builds/Packages/s/stale.src.rpm",
+        }
+    ]
+    session.add(
+        SignTask(
+            status=SignStatus.IDLE,
+            build_id=regular_build.id,
+            sign_key_id=sign_key.id,
+            packages=stale_packages,
+        )
+    )
+    await session.commit()
+    await reset_sign_tasks_packages(session, regular_build.id)
+    await session.commit()
+    sign_task = await get_available_sign_task(session, [sign_key.keyid])
+    message = "Packages should be computed again after build changes"
+    assert sign_task["packages"], message
+    assert "stale.src.rpm" not in {
+        package["name"] for package in sign_task["packages"]
+    }, message
+    db_sign_task = await session.get(SignTask, sign_task["id"])
+    await session.delete(db_sign_task)
+    await session.commit()
+
+
+@pytest.mark.anyio
+async def test_complete_sign_task_updates_artifacts_in_bulk(
+    monkeypatch,
+    session: AsyncSession,
+    regular_build: Build,
+    build_done,
+    sign_key: SignKey,
+    modify_repository,
+):
+    signed_sha256 = "a" * 64
+    created_packages = {}
+
+    async def create_rpm_package(_, name: str, artifact_href: str):
+        created_packages[name] = (
+            f"/pulp/api/v3/content/rpm/packages/{uuid.uuid4()}/"
+        )
+        return created_packages[name]
+
+    async def get_rpm_packages_by_checksums_async(checksums):
+        return {}
+
+    async def get_content_checksums_by_ids_async(content_ids):
+        # the first package is missing in the Pulp DB lookup
+        return {content_id: signed_sha256 for content_id in content_ids[1:]}
+
+    fetched_packages = []
+
+    async def get_rpm_package(_, package_href: str, include_fields=None):
+        fetched_packages.append(package_href)
+        return {"sha256": signed_sha256}
+
+    monkeypatch.setattr(PulpClient, "create_rpm_package", create_rpm_package)
+    monkeypatch.setattr(PulpClient, "get_rpm_package", get_rpm_package)
+    monkeypatch.setattr(
+        "alws.crud.sign_task.get_rpm_packages_by_checksums_async",
+        get_rpm_packages_by_checksums_async,
+    )
+    monkeypatch.setattr(
+        "alws.crud.sign_task.get_content_checksums_by_ids_async",
+        get_content_checksums_by_ids_async,
+    )
+    sign_task = SignTask(
+        status=SignStatus.IN_PROGRESS,
+        build_id=regular_build.id,
+        sign_key_id=sign_key.id,
+    )
+    session.add(sign_task)
+    await session.commit()
+    artifacts = []
+    for rpm_model in (SourceRpm, BinaryRpm):
+        rpms = await session.execute(
+            select(rpm_model)
+            .where(rpm_model.build_id == regular_build.id)
+            .options(
+                selectinload(rpm_model.artifact).selectinload(
+                    BuildTaskArtifact.build_task
+                )
+            )
+        )
+        artifacts.extend(rpm.artifact for rpm in rpms.scalars().all())
+    payload = SignTaskComplete(
+        build_id=regular_build.id,
+        success=True,
+        packages=[
+            {
+                "id": artifact.id,
+                "name": artifact.name,
+                "arch": (
+                    "src"
+                    if artifact.name.endswith(".src.rpm")
+                    else artifact.build_task.arch
+                ),
+                "type": "rpm",
+                "href": f"/pulp/api/v3/artifacts/{artifact.id}/",
+                "fingerprint": sign_key.fingerprint,
+                "sha256": signed_sha256,
+                "cas_hash": f"cas-{artifact.name}",
+            }
+            for artifact in artifacts
+        ],
+    )
+    await session.close()
+    await complete_sign_task(sign_task.id, payload)
+
+    db_artifacts = await session.execute(
+        select(BuildTaskArtifact).where(
+            BuildTaskArtifact.id.in_([artifact.id for artifact in artifacts])
+        )
+    )
+    db_artifacts = db_artifacts.scalars().all()
+    assert db_artifacts
+    for artifact in db_artifacts:
+        assert artifact.href == created_packages[artifact.name]
+        assert artifact.cas_hash == f"cas-{artifact.name}"
+        assert artifact.sign_key_id == sign_key.id
+    db_sign_task = await session.get(SignTask, sign_task.id)
+    assert db_sign_task.status == SignStatus.COMPLETED
+    message = "Checksums missing in Pulp DB should be fetched from Pulp API"
+    assert len(fetched_packages) == 1, message
+    await session.execute(
+        update(BuildTaskArtifact)
+        .where(BuildTaskArtifact.sign_key_id == sign_key.id)
+        .values(sign_key_id=None)
+    )
+    await session.delete(db_sign_task)
+    await session.commit()
@@ -0,0 +1,13 @@
+from alws import dependencies
+
+
+def test_configure_db_pool_resizes_semaphore():
+    try:
+        dependencies.configure_db_pool(2, 3)
+        # sessions wait for the semaphore instead of the pool timeout
+        assert dependencies.DB_SEMAPHORE._value == 5
+        dependencies.configure_db_pool(100, 100)
+        assert dependencies.DB_SEMAPHORE._value == 90
+    finally:
+        dependencies.configure_db_pool(0, 0)
+    assert dependencies.DB_SEMAPHORE._value == 90
@@ -1,7 +1,17 @@
+import datetime
 from contextlib import nullcontext as does_not_raise
+from types import SimpleNamespace
 
+import aioredis
 import pytest
 
+from alws.crud.errata import (
+    OVAL_RECORDS_CACHE,
+    build_oval_xml,
+    get_oval_xml,
+    load_records_platform_packages,
+    release_errata_packages,
+)
 from alws.utils.errata import (
     debrand_affected_cpe_list,
     debrand_comment,
@@ -258,3 +268,331 @@ def test_debrand_oval_affected_cpe_list(
     assert (
         debrand_affected_cpe_list(cpe_list, distro_version) == expected_value
     ), message
+
+
+@pytest.mark.anyio
+async def test_load_records_platform_packages(monkeypatch):
+    def get_package(name: str, version: str) -> SimpleNamespace:
+        return SimpleNamespace(
+            name=name,
+            version=version,
+            epoch="0",
+            pulp_href=f"/pulp/api/v3/content/rpm/packages/{name}-{version}/",
+        )
+
+    queries = []
+
+    async def get_platform_repos_packages(platform, search_params):
+        queries.append(dict(search_params))
+        repo = SimpleNamespace(pulp_href="/pulp/api/v3/repositories/1/")
+        return [
+            (
+                repo,
+                [
+                    get_package("bash", "5.1"),
+                    get_package("bash", "5.2"),
+                    get_package("vim", "9.0"),
+                ],
+            )
+        ]
+
+    monkeypatch.setattr(
+        "alws.crud.errata.get_platform_repos_packages",
+        get_platform_repos_packages,
+    )
+    records = [
+        SimpleNamespace(
+            id=record_id,
+            platform_id=1,
+            platform=None,
+            packages=[
+                SimpleNamespace(name=name, version=version, epoch=0)
+                for name, version in packages
+            ],
+        )
+        for record_id, packages in (
+            ("ALSA-1", [("bash", "5.1")]),
+            ("ALSA-2", [("vim", "9.0"), ("bash", "5.2")]),
+        )
+    ]
+    records_packages = await load_records_platform_packages(records)
+    assert queries == [
+        {
+            "name": ["bash", "vim"],
+            "version": ["5.1", "9.0", "5.2"],
+            "epoch": ["0"],
+        }
+    ]
+    assert list(records_packages["ALSA-1"]) == [
+        "/pulp/api/v3/content/rpm/packages/bash-5.1/",
+    ]
+    assert sorted(records_packages["ALSA-2"]) == [
+        "/pulp/api/v3/content/rpm/packages/bash-5.2/",
+        "/pulp/api/v3/content/rpm/packages/vim-9.0/",
+    ]
+
+
+@pytest.mark.anyio
+async def test_release_errata_packages_uses_bulk_metadata(monkeypatch):
+    def get_metadata(name: str, arch: str) -> dict:
+        return {
+            "name": name,
+            "epoch": "0",
+            "version": "1.0",
+            "release": "1.module_el8",
+            "arch": arch,
+            "location_href": f"{name}-1.0-1.module_el8.{arch}.rpm",
+            "rpm_sourcerpm": f"{name}-1.0-1.module_el8.src.rpm",
+            "sha256": "0" * 64,
+        }
+
+    def get_package(href: str) -> SimpleNamespace:
+        return SimpleNamespace(
+            pulp_href=href,
+            albs_artifact_id=None,
+            get_pulp_href=lambda: href,
+            errata_package=SimpleNamespace(reboot_suggested=False),
+        )
+
+    pulp_packages = {
+        "bash-1": get_metadata("bash", "x86_64"),
+        # the same package from another build is released only once
+        "bash-2": get_metadata("bash", "x86_64"),
+        "bash-doc": get_metadata("bash-doc", "noarch"),
+    }
+    modular_packages = []
+
+    async def get_errata_packages_module(session, packages):
+        modular_packages.extend(pkg.pulp_href for pkg in packages)
+        return SimpleNamespace(
+            name="bash",
+            stream="1",
+            version="1",
+            context="abc",
+        )
+
+    class FakePulpClient:
+        records = []
+
+        async def get_by_href(self, href: str):
+            assert href == "repo", "packages must not be fetched from Pulp"
+            return {
+                "name": "almalinux-8-appstream-x86_64",
+                "latest_version_href": "repo/versions/1/",
+            }
+
+        async def list_updateinfo_records(self, **kwargs):
+            return []
+
+        async def add_errata_record(self, record: dict, repo_href: str):
+            self.records.append(record)
+
+    monkeypatch.setattr(
+        "alws.crud.errata.get_errata_packages_module",
+        get_errata_packages_module,
+    )
+    pulp_client = FakePulpClient()
+    record = SimpleNamespace(
+        id="ALSA-1",
+        get_title=lambda: "Important: bash security update",
+        get_description=lambda: "",
+        get_type=lambda: "security",
+        severity="Important",
+        issued_date=datetime.datetime(2024, 1, 1),
+        contact_mail="",
+        status="final",
+        summary=None,
+        version="1",
+        solution=None,
+        rights="",
+        references=[],
+    )
+    platform = SimpleNamespace(
+        name="AlmaLinux-8",
+        modularity={"versions": [{"name": "8.9"}]},
+    )
+    await release_errata_packages(
+        None,
+        pulp_client,
+        record,
+        [get_package(href) for href in pulp_packages],
+        platform,
+        "repo",
+        publish=False,
+        pulp_packages=pulp_packages,
+    )
+    assert modular_packages == ["bash-1", "bash-doc"]
+    collection = pulp_client.records[0]["pkglist"][0]
+    assert collection["module"]["arch"] == "x86_64"
+    assert [pkg["name"] for pkg in collection["packages"]] == [
+        "bash",
+        "bash-doc",
+    ]
+
+
+@pytest.mark.anyio
+async def test_build_oval_xml_converts_only_changed_records(monkeypatch):
+    records = {
+        record_id: SimpleNamespace(id=record_id)
+        for record_id in ("ALSA-1", "ALSA-2")
+    }
+    queried_records = []
+
+    class FakeResult:
+        def __init__(self, items: list):
+            self._items = items
+
+        def scalars(self):
+            return self
+
+        def all(self):
+            return self._items
+
+    class FakeSession:
+        def __init__(self, outdated_ids: list):
+            self._results = [
+                list(records),
+                [records[record_id] for record_id in outdated_ids],
+            ]
+
+        async def execute(self, *args, **kwargs):
+            result = self._results.pop(0)
+            if not self._results:
+                queried_records.append([record.id for record in result])
+            return FakeResult(result)
+
+    def errata_record_to_oval_objects(record):
+        return [(f"oval:{record.id}", record.id)]
+
+    def compose_oval(records_objects):
+        return ",".join(
+            oval_object
+            for oval_objects in records_objects
+            for _, oval_object in oval_objects
+        )
+
+    monkeypatch.setattr(
+        "alws.crud.errata.errata_record_to_oval_objects",
+        errata_record_to_oval_objects,
+    )
+    monkeypatch.setattr("alws.crud.errata.compose_oval", compose_oval)
+    OVAL_RECORDS_CACHE.clear()
+    platform = SimpleNamespace(id=1, name="AlmaLinux-8")
+    oval = await build_oval_xml(
+        FakeSession(["ALSA-1", "ALSA-2"]),
+        platform,
+        {},
+        "epoch",
+    )
+    assert oval == "ALSA-1,ALSA-2"
+    oval = await build_oval_xml(FakeSession([]), platform, {}, "epoch")
+    assert oval == "ALSA-1,ALSA-2"
+    # only the invalidated record is converted again
+    oval = await build_oval_xml(
+        FakeSession(["ALSA-2"]),
+        platform,
+        {"ALSA-2": 1},
+        "epoch",
+    )
+    assert oval == "ALSA-1,ALSA-2"
+    # revisions are reset along with the epoch when Redis loses them
+    oval = await build_oval_xml(
+        FakeSession(["ALSA-1", "ALSA-2"]),
+        platform,
+        {},
+        "new-epoch",
+    )
+    assert oval == "ALSA-1,ALSA-2"
+    assert queried_records == [
+        ["ALSA-1", "ALSA-2"],
+        ["ALSA-2"],
+        ["ALSA-1", "ALSA-2"],
+    ]
+
+
+@pytest.mark.anyio
+async def test_get_oval_xml_without_redis(monkeypatch):
+    platform = SimpleNamespace(id=1, name="AlmaLinux-8")
+    built_revisions = []
+
+    class FakeResult:
+        def scalars(self):
+            return self
+
+        def first(self):
+            return platform
+
+    class FakeSession:
+        async def execute(self, *args, **kwargs):
+            return FakeResult()
+
+    class FakeRedis:
+        async def get(self, *args, **kwargs):
+            raise aioredis.ConnectionError("Redis is unavailable")
+
+    async def build_oval_xml(db, platform, revisions):
+        built_revisions.append(revisions)
+        return "oval"
+
+    monkeypatch.setattr("alws.crud.errata.build_oval_xml", build_oval_xml)
+    oval, etag = await get_oval_xml(FakeSession(), platform.name, FakeRedis())
+    assert b"".join([chunk async for chunk in oval]) == b'"oval"'
+    message = "Cached records shouldn't be used without known revisions"
+    assert built_revisions == [None], message
+    oval, _ = await get_oval_xml(
+        FakeSession(),
+        platform.name,
+        FakeRedis(),
+        if_none_match=etag,
+    )
+    assert oval is None
+
+
+@pytest.mark.anyio
+async def test_get_oval_xml_streams_cached_document(monkeypatch):
+    platform = SimpleNamespace(id=1, name="AlmaLinux-8")
+    document = b'"oval document"'
+    requested_ranges = []
+
+    class FakeResult:
+        def scalars(self):
+            return self
+
+        def first(self):
+            return platform
+
+    class FakeSession:
+        async def execute(self, *args, **kwargs):
+            return FakeResult()
+
+    class FakeRedis:
+        async def get(self, key):
+            return b'"etag"'
+
+        async def strlen(self, key):
+            assert key == "errata:oval:1:document:etag"
+            return len(document)
+
+        async def getrange(self, key, start, end):
+            requested_ranges.append((start, end))
+            return document[start : end + 1]
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr("alws.crud.errata.OVAL_DOCUMENT_CHUNK_SIZE", 4)
+    monkeypatch.setattr(
+        "alws.crud.errata.aioredis.from_url",
+        lambda *args, **kwargs: FakeRedis(),
+    )
+    oval, etag = await get_oval_xml(FakeSession(), platform.name, FakeRedis())
+    assert etag == '"etag"'
+    assert b"".join([chunk async for chunk in oval]) == document
+    assert len(requested_ranges) == 4
+    oval, _ = await get_oval_xml(
+        FakeSession(),
+        platform.name,
+        FakeRedis(),
+        if_none_match='"other", "etag"',
+    )
+    assert oval is None
@@ -0,0 +1,146 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from alws import release_planner
+from alws.release_planner import AlmaLinuxReleasePlanner
+
+
+@pytest.mark.anyio
+async def test_authenticate_package_in_threads_with_cache(monkeypatch):
+    calls = []
+
+    def authenticate_checksum(package_checksum: str) -> bool:
+        calls.append((package_checksum, threading.current_thread().name))
+        return package_checksum == "notarized"
+
+    monkeypatch.setattr(
+        release_planner, "authenticate_checksum", authenticate_checksum
+    )
+    planner = AlmaLinuxReleasePlanner(None)
+    planner.codenotary_enabled = True
+    for _ in range(2):
+        assert await planner.authenticate_package("notarized") == (
+            "notarized",
+            True,
+        )
+        assert await planner.authenticate_package("unknown") == (
+            "unknown",
+            False,
+        )
+    # only notarized checksums are cached
+    assert [checksum for checksum, _ in calls] == [
+        "notarized",
+        "unknown",
+        "unknown",
+    ]
+    assert all(thread.startswith("immudb") for _, thread in calls)
+
+
+def _get_plan_package(full_name: str, build_id: int, task_id: int) -> dict:
+    return {
+        "package": {
+            "full_name": full_name,
+            "build_id": build_id,
+            "task_id": task_id,
+        },
+        "repositories": [],
+    }
+
+
+@pytest.mark.anyio
+async def test_incremental_release_plan(monkeypatch):
+    generated = []
+
+    async def get_release_plan(_, **kwargs):
+        generated.append(kwargs)
+        return {
+            "packages": [
+                _get_plan_package("bash-5.1-1.el9.x86_64.rpm", 1, 12),
+                _get_plan_package("zsh-5.8-1.el9.x86_64.rpm", 3, 31),
+            ],
+            "packages_from_repos": {},
+            "packages_in_repos": {"zsh-5.8-1.el9.x86_64.rpm": [1]},
+            "modules": [],
+            "repositories": [],
+        }
+
+    monkeypatch.setattr(
+        AlmaLinuxReleasePlanner, "get_release_plan", get_release_plan
+    )
+    release = SimpleNamespace(
+        build_ids=[1, 2],
+        build_task_ids=[11, 21],
+        platform=None,
+        product=None,
+        plan={
+            "packages": [
+                _get_plan_package("bash-5.1-1.el9.x86_64.rpm", 1, 11),
+                _get_plan_package("vim-9.0-1.el9.x86_64.rpm", 2, 21),
+            ],
+            "packages_from_repos": {"vim-9.0-1.el9.x86_64.rpm": 1},
+            "packages_in_repos": {},
+            "modules": [],
+            "repositories": [],
+        },
+    )
+    planner = AlmaLinuxReleasePlanner(None)
+    plan = await planner.get_incremental_release_plan(
+        release,
+        build_ids=[1, 3],
+        build_tasks=[11, 12, 31],
+    )
+    # only packages of added build tasks are planned again
+    assert [kwargs["build_tasks"] for kwargs in generated] == [[12, 31]]
+    assert [pkg["package"]["full_name"] for pkg in plan["packages"]] == [
+        "bash-5.1-1.el9.x86_64.rpm",
+        "zsh-5.8-1.el9.x86_64.rpm",
+    ]
+    assert plan["packages_from_repos"] == {}
+    assert plan["packages_in_repos"] == {"zsh-5.8-1.el9.x86_64.rpm": [1]}
+
+
+@pytest.mark.anyio
+async def test_incremental_release_plan_removes_modular_build(monkeypatch):
+    async def get_release_plan(_, **kwargs):
+        raise AssertionError("No build tasks were added")
+
+    monkeypatch.setattr(
+        AlmaLinuxReleasePlanner, "get_release_plan", get_release_plan
+    )
+    module = {
+        "name": "go-toolset",
+        "stream": "rhel8",
+        "version": 8070020220101,
+        "context": "a1b2c3d4",
+        "arch": "x86_64",
+        "build_id": 2,
+    }
+    release = SimpleNamespace(
+        build_ids=[1, 2],
+        build_task_ids=[11, 21],
+        platform=None,
+        product=None,
+        plan={
+            "packages": [
+                _get_plan_package("bash-5.1-1.el9.x86_64.rpm", 1, 11),
+                _get_plan_package("go-1.19-1.el9.x86_64.rpm", 2, 21),
+            ],
+            "packages_from_repos": {},
+            "packages_in_repos": {},
+            "modules": [{"module": module, "repositories": []}],
+            "repositories": [],
+        },
+    )
+    planner = AlmaLinuxReleasePlanner(None)
+    plan = await planner.get_incremental_release_plan(
+        release,
+        build_ids=[1],
+        build_tasks=[11],
+    )
+    assert [pkg["package"]["full_name"] for pkg in plan["packages"]] == [
+        "bash-5.1-1.el9.x86_64.rpm",
+    ]
+    message = "Modules of the removed build shouldn't stay in the plan"
+    assert plan["modules"] == [], message
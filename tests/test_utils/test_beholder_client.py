@@ -0,0 +1,40 @@
+import pytest
+
+from alws.utils.beholder_client import BeholderClient
+
+
+class FakeResponse:
+    def __init__(self, content: bytes):
+        self._content = content
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def read(self):
+        return self._content
+
+
+@pytest.mark.anyio
+async def test_beholder_responses_are_cached(monkeypatch):
+    requests = []
+
+    class FakeSession:
+        def request(self, method: str, url: str, json: dict = None, **kwargs):
+            requests.append((method, url))
+            return FakeResponse(b'{"packages": []}')
+
+    monkeypatch.setattr(
+        "alws.utils.beholder_client.get_beholder_session", FakeSession
+    )
+    client = BeholderClient("http://beholder-cache-test")
+    endpoint = "/api/v1/distros/AlmaLinux/8/projects/"
+    first = await client.post(endpoint, {"source_rpms": ["bash"]})
+    # cached responses are parsed again, so callers can't modify the cache
+    first["priority"] = 10
+    second = await client.post(endpoint, {"source_rpms": ["bash"]})
+    assert second == {"packages": []}
+    await client.post(endpoint, {"source_rpms": ["zsh"]})
+    assert len(requests) == 2
@@ -0,0 +1,25 @@
+from alws.utils.cache import LRUCache, TTLCache
+
+
+def test_lru_cache_counts_hits_and_misses():
+    cache = LRUCache(1)
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("a", validate=lambda entry: entry == 2) is None
+    cache.put("b", 2)
+    assert cache.get("a") is None
+    assert cache.get_stats() == {
+        "size": 1,
+        "max_size": 1,
+        "hits": 1,
+        "misses": 3,
+    }
+
+
+def test_ttl_cache_counts_expired_entries_as_misses():
+    cache = TTLCache(1, ttl=-1)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert cache.hits == 0
+    assert cache.misses == 1
@@ -0,0 +1,118 @@
+import asyncio
+
+import aioredis
+import pytest
+
+from alws.utils.long_poll import wait_for_task
+
+
+class FakePubSub:
+    def __init__(self, messages: asyncio.Queue, available: bool = True):
+        self.messages = messages
+        self.available = available
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, *channels):
+        if not self.available:
+            raise aioredis.ConnectionError("Redis is unavailable")
+        self.channels.extend(channels)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0):
+        try:
+            return await asyncio.wait_for(self.messages.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeRedis:
+    def __init__(self, available: bool = True):
+        self.messages = asyncio.Queue()
+        self.available = available
+        self.pubsubs = []
+
+    def pubsub(self):
+        pubsub = FakePubSub(self.messages, self.available)
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+
+@pytest.mark.anyio
+async def test_wait_for_task_retries_on_notification():
+    redis = FakeRedis()
+    tasks = [{}, {}, {"id": 1}]
+    calls = []
+
+    async def get_task():
+        calls.append(len(calls))
+        return tasks.pop(0)
+
+    waiter = asyncio.create_task(
+        wait_for_task(redis, ["sign_tasks:key"], get_task, timeout=5)
+    )
+    await asyncio.sleep(0.01)
+    # nothing is fetched without notifications
+    assert len(calls) == 1
+    await redis.messages.put({"data": b"1"})
+    await redis.messages.put({"data": b"2"})
+    assert await waiter == {"id": 1}
+    assert len(calls) == 3
+    assert redis.pubsubs[0].channels == ["sign_tasks:key"]
+    assert redis.pubsubs[0].closed
+
+
+@pytest.mark.anyio
+async def test_wait_for_task_timeout():
+    redis = FakeRedis()
+
+    async def get_task():
+        return {}
+
+    assert await wait_for_task(redis, ["channel"], get_task, 0.05) == {}
+    assert redis.pubsubs[0].closed
+    # without timeout nodes aren't subscribed at all
+    assert await wait_for_task(redis, ["channel"], get_task, 0) == {}
+    assert len(redis.pubsubs) == 1
+
+
+@pytest.mark.anyio
+async def test_wait_for_task_retries_periodically():
+    redis = FakeRedis()
+    tasks = [{}, {}, {"id": 1}]
+
+    async def get_task():
+        return tasks.pop(0)
+
+    # the task becomes available without any notification
+    task = await wait_for_task(
+        redis,
+        ["build_tasks:x86_64"],
+        get_task,
+        timeout=5,
+        retry_interval=0.01,
+    )
+    assert task == {"id": 1}
+    assert not tasks
+
+
+@pytest.mark.anyio
+async def test_wait_for_task_without_redis():
+    redis = FakeRedis(available=False)
+    tasks = [{}, {}, {"id": 1}]
+
+    async def get_task():
+        return tasks.pop(0)
+
+    task = await wait_for_task(
+        redis,
+        ["build_tasks:x86_64"],
+        get_task,
+        timeout=5,
+        retry_interval=0.01,
+    )
+    assert task == {"id": 1}
+    assert not tasks
+    assert redis.pubsubs[0].closed
@@ -0,0 +1,250 @@
+import asyncio
+import typing
+
+import pytest
+
+from alws.config import settings
+from alws.schemas.build_node_schema import BuildDoneArtifact
+from alws.utils.pulp_client import (
+    PULP_CONTENT_OPERATION,
+    PULP_READ_OPERATION,
+    PULP_REPOSITORY_OPERATION,
+    PULP_TASK_POLL_OPERATION,
+    PulpClient,
+    PulpLimiter,
+    get_pulp_operation,
+)
+
+
+@pytest.mark.anyio
+async def test_wait_for_tasks_polls_in_batch(monkeypatch):
+    task_hrefs = [f"/pulp/api/v3/tasks/{i}/" for i in range(3)]
+    polls = []
+
+    async def request(
+        _,
+        method: str,
+        endpoint: str,
+        params: typing.Optional[dict] = None,
+        **kwargs,
+    ):
+        polls.append(params["pulp_href__in"].split(","))
+        # every task finishes on the second poll
+        state = "completed" if len(polls) > 1 else "running"
+        return {
+            "count": len(polls[-1]),
+            "next": None,
+            "results": [
+                {"pulp_href": href, "state": state}
+                for href in params["pulp_href__in"].split(",")
+            ],
+        }
+
+    monkeypatch.setattr(PulpClient, "request", request)
+    monkeypatch.setattr(settings, "pulp_task_poll_min_interval", 0)
+    pulp_client = PulpClient("http://pulp", "user", "password")
+    tasks = await pulp_client.wait_for_tasks(list(reversed(task_hrefs)))
+    assert polls == [list(reversed(task_hrefs))] * 2
+    assert [task["pulp_href"] for task in tasks] == list(reversed(task_hrefs))
+
+
+@pytest.mark.anyio
+async def test_wait_for_tasks_raises_on_failed_task(monkeypatch):
+    async def request(_, *args, params: dict = None, **kwargs):
+        return {
+            "count": 1,
+            "next": None,
+            "results": [{
+                "pulp_href": params["pulp_href__in"],
+                "state": "failed",
+                "error": {"description": "broken"},
+            }],
+        }
+
+    monkeypatch.setattr(PulpClient, "request", request)
+    pulp_client = PulpClient("http://pulp", "user", "password")
+    with pytest.raises(Exception, match="has failed\nDescription: broken"):
+        await pulp_client.wait_for_tasks(["/pulp/api/v3/tasks/1/"])
+
+
+@pytest.mark.anyio
+async def test_wait_for_tasks_raises_on_missing_task(monkeypatch):
+    async def request(_, *args, params: dict = None, **kwargs):
+        return {
+            "count": 1,
+            "next": None,
+            "results": [{
+                "pulp_href": "/pulp/api/v3/tasks/1/",
+                "state": "running",
+            }],
+        }
+
+    monkeypatch.setattr(PulpClient, "request", request)
+    pulp_client = PulpClient("http://pulp", "user", "password")
+    with pytest.raises(Exception, match="tasks/2/ are not found"):
+        await pulp_client.wait_for_tasks(
+            ["/pulp/api/v3/tasks/1/", "/pulp/api/v3/tasks/2/"]
+        )
+
+
+@pytest.mark.parametrize(
+    "method, endpoint, operation",
+    [
+        ("GET", "pulp/api/v3/tasks/1/", PULP_TASK_POLL_OPERATION),
+        ("GET", "pulp/api/v3/content/rpm/packages/", PULP_READ_OPERATION),
+        ("POST", "pulp/api/v3/content/rpm/packages/", PULP_CONTENT_OPERATION),
+        ("PUT", "pulp/api/v3/uploads/1/", PULP_CONTENT_OPERATION),
+        (
+            "POST",
+            "pulp/api/v3/repositories/rpm/rpm/1/modify/",
+            PULP_REPOSITORY_OPERATION,
+        ),
+        (
+            "DELETE",
+            "pulp/api/v3/distributions/rpm/rpm/1/",
+            PULP_REPOSITORY_OPERATION,
+        ),
+    ],
+)
+def test_get_pulp_operation(method: str, endpoint: str, operation: str):
+    assert get_pulp_operation(method, endpoint) == operation
+
+
+@pytest.mark.anyio
+async def test_pulp_limiter_stats():
+    limiter = PulpLimiter(PULP_READ_OPERATION, 1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter:
+            await release.wait()
+
+    holders = [asyncio.create_task(hold()) for _ in range(3)]
+    await asyncio.sleep(0)
+    stats = limiter.get_stats()
+    assert stats["in_flight"] == 1
+    assert stats["queue_depth"] == 2
+    release.set()
+    await asyncio.gather(*holders)
+    stats = limiter.get_stats()
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["max_queue_depth"] == 2
+    assert stats["acquired"] == 3
+
+
+@pytest.mark.anyio
+async def test_transaction_coalesces_modifications(monkeypatch):
+    modifications = []
+
+    async def start_modification(_, repo_to, add=None, remove=None):
+        modifications.append((repo_to, sorted(add), sorted(remove)))
+        return {"task": f"/pulp/api/v3/tasks/{len(modifications)}/"}
+
+    async def wait_for_tasks(_, task_hrefs):
+        return task_hrefs
+
+    monkeypatch.setattr(
+        PulpClient, "_start_repository_modification", start_modification
+    )
+    monkeypatch.setattr(PulpClient, "wait_for_tasks", wait_for_tasks)
+    pulp_client = PulpClient("http://pulp", "user", "password")
+    async with pulp_client.begin():
+        await pulp_client.modify_repository("repo", add=["a", "b"])
+        await pulp_client.modify_repository("repo", remove=["b", "c"])
+        await pulp_client.modify_repository("repo", add=["c"])
+        assert modifications == []
+    assert modifications == [("repo", ["a", "c"], ["b", "c"])]
+    modifications.clear()
+    async with pulp_client.begin():
+        await pulp_client.modify_repository("repo", add=["a"])
+        await pulp_client.commit()
+        assert modifications == [("repo", ["a"], [])]
+    message = "Committed modifications shouldn't be sent twice"
+    assert modifications == [("repo", ["a"], [])], message
+
+
+@pytest.mark.anyio
+async def test_create_entity_without_sha256(monkeypatch):
+    artifact = BuildDoneArtifact(
+        name="test.src.rpm",
+        type="rpm",
+        href="/pulp/api/v3/artifacts/1/",
+        sha256="0" * 64,
+    )
+
+    async def create_rpm_package(*args, **kwargs):
+        return "/pulp/api/v3/content/rpm/packages/1/"
+
+    async def get_artifact(*args, **kwargs):
+        raise AssertionError("sha256 must not be requested from Pulp")
+
+    monkeypatch.setattr(PulpClient, "create_rpm_package", create_rpm_package)
+    monkeypatch.setattr(PulpClient, "get_artifact", get_artifact)
+    pulp_client = PulpClient("http://pulp", "user", "password")
+    href, sha256, _ = await pulp_client.create_entity(
+        artifact,
+        include_sha256=False,
+    )
+    assert href == "/pulp/api/v3/content/rpm/packages/1/"
+    assert sha256 is None
+
+
+class FakeResponse:
+    def __init__(self, status: int, text: str = "", headers: dict = None):
+        self.status = status
+        self._text = text
+        self.headers = headers or {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def text(self):
+        return self._text
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.mark.anyio
+async def test_get_repo_modules_yaml_is_cached(monkeypatch):
+    repo_url = "http://pulp/pulp/content/builds/test-repo/"
+    repomd = {"path": "repodata/abc-modules.yaml", "etag": '"1"'}
+    requests = []
+
+    class FakeSession:
+        def get(self, url: str, headers: dict = None, **kwargs):
+            requests.append(url)
+            if url.endswith("repomd.xml"):
+                if (headers or {}).get("If-None-Match") == repomd["etag"]:
+                    return FakeResponse(304)
+                return FakeResponse(
+                    200,
+                    f'<location href="{repomd["path"]}"/>',
+                    {"ETag": repomd["etag"]},
+                )
+            return FakeResponse(200, f"modules of {url}")
+
+    monkeypatch.setattr(
+        "alws.utils.pulp_client.get_pulp_session", FakeSession
+    )
+    pulp_client = PulpClient("http://pulp", "user", "password")
+    modules_url = f"{repo_url}repodata/abc-modules.yaml"
+    assert await pulp_client.get_repo_modules_yaml(repo_url) == (
+        f"modules of {modules_url}"
+    )
+    # not modified repomd.xml
+    await pulp_client.get_repo_modules_yaml(repo_url)
+    # repomd.xml is changed, but modules.yaml is the same
+    repomd["etag"] = '"2"'
+    await pulp_client.get_repo_modules_yaml(repo_url)
+    assert requests.count(modules_url) == 1
+    repomd["path"] = "repodata/def-modules.yaml"
+    repomd["etag"] = '"3"'
+    assert await pulp_client.get_repo_modules_yaml(repo_url) == (
+        f"modules of {repo_url}repodata/def-modules.yaml"
+    )
+    assert len(requests) == 6
@@ -0,0 +1,18 @@
+import uuid
+
+from alws.pulp_models import RpmPackage
+from alws.utils import pulp_utils
+
+
+def test_rpm_packages_by_ids_queries_are_chunked(monkeypatch):
+    monkeypatch.setattr(pulp_utils, "RPM_PACKAGES_BY_IDS_CHUNK_SIZE", 2)
+    pulp_pkg_ids = [uuid.uuid4() for _ in range(5)]
+    queries = list(
+        pulp_utils._iter_rpm_packages_by_ids_queries(
+            pulp_pkg_ids + pulp_pkg_ids[:1],
+            [RpmPackage.name],
+        )
+    )
+    assert [
+        len(query.compile().params["content_ptr_id_1"]) for query in queries
+    ] == [2, 2, 1]